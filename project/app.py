@@ -5,30 +5,33 @@ Streamlit Dashboard Application
 import streamlit as st
 import plotly.graph_objects as go
 import plotly.express as px
+from collections import deque
 from datetime import datetime
 import pandas as pd
 import config
 from workflow import analyze_stock
 from utils import generate_pdf_report
-from database import DBManager
-from tools import (
-    get_stock_summary, 
-    get_portfolio_analysis, 
+from tools import chat_with_ai, analyze_stock_for_chat
+from app_cache import (
+    get_db,
+    get_user_document_store,
+    get_ingest_executor,
+    get_stock_summary,
+    get_quotes,
+    get_price_history,
+    get_portfolio_analysis,
     normalize_ticker,
-    chat_with_ai,
-    analyze_stock_for_chat,
-    get_stock_news
+    get_trades,
+    get_holdings_as_of,
+    get_equity_curve,
+    invalidate_portfolio
 )
 from tools_agent import chat_with_tools_streaming
-from rag_utils import DocumentStore, answer_with_rag, summarize_document
+from rag_utils import DocumentStore, answer_with_rag_streaming, summarize_document
+from snapshot_job import start_snapshot_scheduler, take_snapshot, utc_today
 from voice_utils import text_to_speech, get_audio_player_html
-import yfinance as yf
 
-# DB Manager 초기화
-if 'db' not in st.session_state:
-    st.session_state.db = DBManager()
-
-# 페이지 설정
+# 페이지 설정 (다른 Streamlit 호출보다 먼저 실행)
 st.set_page_config(
     page_title="Finsearcher - AI 투자 어드바이저",
     page_icon="🔍",
@@ -36,6 +39,14 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# DB Manager (프로세스당 하나, 모든 세션이 연결 풀 공유)
+if 'db' not in st.session_state:
+    st.session_state.db = get_db()
+
+# 일별 포트폴리오 스냅샷 (프로세스당 한 번 시작)
+if config.SNAPSHOT_SCHEDULER:
+    start_snapshot_scheduler()
+
 # 커스텀 CSS
 st.markdown("""
 <style>
@@ -99,15 +110,18 @@ def initialize_session_state():
         st.session_state.user_profile = 'moderate'
     if 'portfolio' not in st.session_state:
         st.session_state.portfolio = []
-    if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
     if 'chat_messages' not in st.session_state:
-        st.session_state.chat_messages = []
+        reset_chat_state()
     if 'show_chat' not in st.session_state:
         st.session_state.show_chat = False
     # RAG 문서 저장소 초기화
     if 'document_store' not in st.session_state:
         st.session_state.document_store = DocumentStore()
+    # 백그라운드 문서 추가 작업과 끝난 작업의 결과
+    if 'ingest_job' not in st.session_state:
+        st.session_state.ingest_job = None
+    if 'ingest_result' not in st.session_state:
+        st.session_state.ingest_result = None
     # 음성 출력 활성화 여부
     if 'tts_enabled' not in st.session_state:
         st.session_state.tts_enabled = False
@@ -115,6 +129,111 @@ def initialize_session_state():
     if 'rag_mode' not in st.session_state:
         st.session_state.rag_mode = False
 
+# 챗봇 도구 표시 이름
+TOOL_DISPLAY_NAMES = {
+    "get_stock_quote": "💹 현재가 조회",
+    "get_stock_analysis": "📊 실시간 종목 분석",
+    "get_technical_indicators": "📈 기술적 지표",
+    "get_fundamentals": "🏢 기본적 분석",
+    "get_stock_news": "📰 뉴스 검색",
+    "get_portfolio": "💼 포트폴리오 조회",
+    "get_market_status": "🌐 시장 현황"
+}
+
+def new_chat_buffer(messages=()):
+    """최근 메시지만 유지하는 세션 링 버퍼 (넘치면 가장 오래된 메시지부터 빠짐)"""
+    return deque(messages, maxlen=config.CHAT_MAX_MESSAGES)
+
+def reset_chat_state(messages=(), has_older=False):
+    """대화 세션 상태 초기화 (chat_messages: 화면 표시용, chat_history: LLM 전달용)"""
+    st.session_state.chat_messages = new_chat_buffer(messages)
+    st.session_state.chat_history = new_chat_buffer(messages)
+    st.session_state.chat_has_older = has_older  # 버퍼 밖에 이전 대화가 있는지
+    st.session_state.chat_older = None           # 불러온 이전 대화 페이지 {"messages", "cursor"}
+
+def to_chat_message(log):
+    """DB 대화 기록 -> 세션 메시지 (cursor: 이 메시지보다 이전 페이지를 조회할 때 쓰는 키)"""
+    return {"role": log.role, "content": log.content, "cursor": (log.timestamp, log.id)}
+
+def load_chat_messages(user_id):
+    """최근 대화 한 페이지를 세션에 적재"""
+    logs, cursor = st.session_state.db.get_chat_page(user_id)
+    reset_chat_state([to_chat_message(log) for log in logs], has_older=cursor is not None)
+
+def append_chat_message(role, content, persist=True):
+    """대화 메시지 추가 - persist면 LLM 대화 기록에도 넣고 DB에 저장 (오류 메시지는 화면에만 표시)"""
+    message = {"role": role, "content": content, "cursor": None}
+    if persist:
+        timestamp = st.session_state.db.add_chat_message(st.session_state.user.id, role, content)
+        message["cursor"] = (timestamp, None)
+        st.session_state.chat_history.append(message)
+    if len(st.session_state.chat_messages) == st.session_state.chat_messages.maxlen:
+        st.session_state.chat_has_older = True
+    st.session_state.chat_messages.append(message)
+
+def get_chat_history_for_llm():
+    """방금 추가한 사용자 메시지를 뺀 대화 기록"""
+    return list(st.session_state.chat_history)[:-1]
+
+def render_older_chat_messages():
+    """세션 버퍼 밖의 이전 대화를 커서로 한 페이지씩 조회 (한 번에 한 페이지만 보관)"""
+    older = st.session_state.chat_older
+    if older is None:
+        if not st.session_state.chat_has_older:
+            return
+        before = next((m["cursor"] for m in st.session_state.chat_messages if m["cursor"]), None)
+    else:
+        before = older["cursor"]
+        with st.expander(f"📜 이전 대화 ({len(older['messages'])}개)", expanded=True):
+            for message in older["messages"]:
+                with st.chat_message(message["role"]):
+                    st.markdown(message["content"])
+    
+    if before is not None and st.button("⏫ 이전 대화 불러오기", key="load_older_chat"):
+        logs, cursor = st.session_state.db.get_chat_page(st.session_state.user.id, before=before)
+        st.session_state.chat_older = {"messages": [to_chat_message(log) for log in logs], "cursor": cursor}
+        st.rerun()
+
+def get_portfolio_for_chat():
+    """챗봇 get_portfolio 도구에 전달할 보유 종목 목록"""
+    return [
+        {"ticker": item.ticker, "shares": item.shares, "avg_price": item.avg_price}
+        for item in st.session_state.portfolio
+    ]
+
+def stream_rag_answer(prompt, message_placeholder):
+    """RAG 답변을 스트리밍으로 표시하고 출처/지연 시간을 보여준 뒤 전체 응답 반환"""
+    message_placeholder.markdown("▌")
+    response_generator, rag_info = answer_with_rag_streaming(
+        prompt,
+        st.session_state.document_store,
+        get_chat_history_for_llm()
+    )
+    
+    full_response = ""
+    for chunk in response_generator:
+        full_response += chunk
+        message_placeholder.markdown(full_response + "▌")
+    message_placeholder.markdown(full_response)
+    
+    # 사용된 기능 표시 (출처 페이지 + 단계별 지연 시간)
+    with st.expander("🔧 사용된 기능: 📚 RAG 문서 검색"):
+        st.info("업로드된 문서에서 관련 내용을 검색하여 답변했습니다.")
+        if rag_info["sources"]:
+            st.markdown("\n".join(
+                f"- 📄 {source['filename']} p.{source['page']}" for source in rag_info["sources"]
+            ))
+        timings = [
+            ("검색", rag_info["retrieval_ms"]),
+            ("프롬프트 구성", rag_info["prompt_ms"]),
+            ("첫 토큰", rag_info["ttft_ms"]),
+            ("전체", rag_info["total_ms"]),
+        ]
+        st.caption(" | ".join(f"{label} {ms:.0f}ms" for label, ms in timings if ms is not None))
+    
+    return full_response
+
+
 def login_page():
     """로그인/회원가입 페이지"""
     st.markdown('<div class="main-header">🔍 Finsearcher</div>', unsafe_allow_html=True)
@@ -135,6 +254,9 @@ def login_page():
                     st.session_state.user_profile = user.settings.get('profile', 'moderate')
                     # Load data from DB
                     st.session_state.portfolio = st.session_state.db.get_portfolio(user.id)
+                    load_chat_messages(user.id)
+                    # 사용자 문서는 영구 저장소에서 필요할 때 읽음
+                    st.session_state.document_store = get_user_document_store(user.id)
                     st.success("로그인 성공!")
                     st.rerun()
                 else:
@@ -160,6 +282,39 @@ def login_page():
                     else:
                         st.success("회원가입이 완료되었습니다! 로그인해주세요.")
 
+def start_document_ingest(filename: str, file_bytes: bytes):
+    """문서 추가를 색인 스레드 풀에서 시작 (진행률은 작업 스레드가 dict에 기록)"""
+    progress = {"done": 0, "total": 0}
+    
+    def report(done, total):
+        progress["done"], progress["total"] = done, total
+    
+    future = get_ingest_executor().submit(
+        st.session_state.document_store.add_document, filename, file_bytes, report
+    )
+    st.session_state.ingest_job = {"filename": filename, "future": future, "progress": progress}
+
+
+@st.fragment(run_every=1.0)
+def render_ingest_status():
+    """문서 추가 진행 상황 (1초마다 이 부분만 다시 그리고, 끝나면 전체 화면을 갱신)"""
+    job = st.session_state.ingest_job
+    if job is None:
+        return
+    if job["future"].done():
+        try:
+            st.session_state.ingest_result = job["future"].result()
+        except Exception as e:
+            st.session_state.ingest_result = (False, f"문서 처리 중 오류: {str(e)}")
+        st.session_state.ingest_job = None
+        st.rerun()
+    done, total = job["progress"]["done"], job["progress"]["total"]
+    if total:
+        st.progress(done / total, text=f"'{job['filename']}' 처리 중... ({done}/{total} 페이지)")
+    else:
+        st.progress(0.0, text=f"'{job['filename']}' 처리 중...")
+
+
 def render_chat_page():
     """독립된 AI 챗봇 페이지"""
     # 페이지 설정
@@ -192,8 +347,8 @@ def render_chat_page():
         
         # 대화 초기화
         if st.button("🗑️ 대화 기록 삭제", width='stretch'):
-            st.session_state.chat_messages = []
-            st.session_state.chat_history = []
+            st.session_state.db.clear_chat_history(st.session_state.user.id)
+            reset_chat_state()
             st.rerun()
         
         st.markdown("---")
@@ -233,7 +388,7 @@ def render_chat_page():
         
         if st.session_state.rag_mode:
             doc_count = len(st.session_state.document_store.get_document_list())
-            chunk_count = len(st.session_state.document_store.get_all_chunks())
+            chunk_count = st.session_state.document_store.get_chunk_count()
             if doc_count > 0:
                 st.success(f"✅ RAG 모드 활성화됨 | 📄 문서 {doc_count}개 | 📑 청크 {chunk_count}개")
             else:
@@ -247,17 +402,19 @@ def render_chat_page():
         )
         
         if uploaded_file is not None:
-            if st.button("📤 문서 추가", width='stretch'):
-                with st.spinner("문서 처리 중..."):
-                    file_bytes = uploaded_file.read()
-                    success, message = st.session_state.document_store.add_document(
-                        uploaded_file.name,
-                        file_bytes
-                    )
-                    if success:
-                        st.success(message)
-                    else:
-                        st.error(message)
+            # 색인은 백그라운드에서 진행되고, 커밋된 청크는 처리 중에도 검색됨
+            if st.button("📤 문서 추가", width='stretch', disabled=st.session_state.ingest_job is not None):
+                start_document_ingest(uploaded_file.name, uploaded_file.read())
+        
+        if st.session_state.ingest_job is not None:
+            render_ingest_status()
+        if st.session_state.ingest_result is not None:
+            success, message = st.session_state.ingest_result
+            st.session_state.ingest_result = None
+            if success:
+                st.success(message)
+            else:
+                st.error(message)
         
         # 업로드된 문서 목록
         doc_list = st.session_state.document_store.get_document_list()
@@ -320,7 +477,8 @@ def render_chat_page():
             무엇을 도와드릴까요? 😊
             """)
     
-    # 이전 메시지들 표시
+    # 이전 메시지들 표시 (세션 버퍼 밖의 대화는 요청할 때만 조회)
+    render_older_chat_messages()
     for message in st.session_state.chat_messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
@@ -348,8 +506,7 @@ def render_chat_page():
     # 채팅 입력 (하단 고정)
     if prompt := st.chat_input("메시지를 입력하세요...", key="chat_input_main"):
         # 사용자 메시지 처리
-        st.session_state.chat_messages.append({"role": "user", "content": prompt})
-        st.session_state.chat_history.append({"role": "user", "content": prompt})
+        append_chat_message("user", prompt)
         
         with st.chat_message("user"):
             st.markdown(prompt)
@@ -362,37 +519,17 @@ def render_chat_page():
             
             try:
                 # RAG 모드인 경우 문서 기반 답변
-                if st.session_state.rag_mode and st.session_state.document_store.get_all_chunks():
-                    with st.spinner("📚 문서에서 검색 중..."):
-                        full_response = answer_with_rag(
-                            prompt,
-                            st.session_state.document_store,
-                            st.session_state.chat_history[:-1]
-                        )
-                        message_placeholder.markdown(full_response)
-                        
-                        # 사용된 기능 표시
-                        with st.expander("🔧 사용된 기능: 📚 RAG 문서 검색"):
-                            st.info("업로드된 문서에서 관련 내용을 검색하여 답변했습니다.")
+                if st.session_state.rag_mode and st.session_state.document_store.get_chunk_count():
+                    full_response = stream_rag_answer(prompt, message_placeholder)
                 else:
-                    # 일반 모드: 도구를 사용하는 AI 호출
-                    with st.spinner("분석 중..."):
-                        response_generator, used_tools = chat_with_tools_streaming(
-                            prompt,
-                            st.session_state.chat_history[:-1],
-                            st.session_state.user_profile
-                        )
-                    
-                    # 사용된 도구 표시 (Expander로 깔끔하게)
-                    if used_tools:
-                        tool_names = {
-                            "get_stock_analysis": "📊 실시간 종목 분석",
-                            "get_stock_news": "📰 뉴스 검색",
-                            "get_market_status": "🌐 시장 현황"
-                        }
-                        tool_display = " • ".join([tool_names.get(t, t) for t in used_tools])
-                        with st.expander(f"🔧 사용된 도구: {tool_display}"):
-                            st.json(used_tools)
+                    # 일반 모드: 도구를 사용하는 AI 호출 (스트리밍 한 번으로 도구 판단 + 답변)
+                    response_generator, used_tools = chat_with_tools_streaming(
+                        prompt,
+                        get_chat_history_for_llm(),
+                        st.session_state.user_profile,
+                        portfolio=get_portfolio_for_chat()
+                    )
+                    message_placeholder.markdown("▌")
 
                     # 스트리밍 응답
                     for chunk in response_generator:
@@ -401,10 +538,15 @@ def render_chat_page():
                     
                     # 최종 응답 표시 (커서 제거)
                     message_placeholder.markdown(full_response)
+                    
+                    # 사용된 도구 표시 (Expander로 깔끔하게, 스트리밍이 끝나야 확정됨)
+                    if used_tools:
+                        tool_display = " • ".join([TOOL_DISPLAY_NAMES.get(t, t) for t in used_tools])
+                        with st.expander(f"🔧 사용된 도구: {tool_display}"):
+                            st.json(used_tools)
                 
                 # 응답 저장
-                st.session_state.chat_messages.append({"role": "assistant", "content": full_response})
-                st.session_state.chat_history.append({"role": "assistant", "content": full_response})
+                append_chat_message("assistant", full_response)
                 
                 # TTS 음성 출력
                 if st.session_state.tts_enabled and full_response:
@@ -419,7 +561,7 @@ def render_chat_page():
             except Exception as e:
                 error_msg = f"❌ 오류가 발생했습니다: {str(e)}"
                 message_placeholder.error(error_msg)
-                st.session_state.chat_messages.append({"role": "assistant", "content": error_msg})
+                append_chat_message("assistant", error_msg, persist=False)
 
     # 예시 버튼 처리 (pending_input)
     if 'pending_input' in st.session_state and st.session_state.pending_input:
@@ -427,8 +569,7 @@ def render_chat_page():
         st.session_state.pending_input = None
         
         # 사용자 메시지 추가
-        st.session_state.chat_messages.append({"role": "user", "content": prompt})
-        st.session_state.chat_history.append({"role": "user", "content": prompt})
+        append_chat_message("user", prompt)
         
         with st.chat_message("user"):
             st.markdown(prompt)
@@ -440,33 +581,17 @@ def render_chat_page():
             
             try:
                 # RAG 모드인 경우 문서 기반 답변
-                if st.session_state.rag_mode and st.session_state.document_store.get_all_chunks():
-                    with st.spinner("📚 문서에서 검색 중..."):
-                        full_response = answer_with_rag(
-                            prompt,
-                            st.session_state.document_store,
-                            st.session_state.chat_history[:-1]
-                        )
-                        message_placeholder.markdown(full_response)
+                if st.session_state.rag_mode and st.session_state.document_store.get_chunk_count():
+                    full_response = stream_rag_answer(prompt, message_placeholder)
                 else:
                     # 일반 모드: 도구를 사용하는 AI 호출
-                    with st.spinner("분석 중..."):
-                        response_generator, used_tools = chat_with_tools_streaming(
-                            prompt,
-                            st.session_state.chat_history[:-1],
-                            st.session_state.user_profile
-                        )
-                    
-                    # 사용된 도구 표시
-                    if used_tools:
-                        tool_names = {
-                            "get_stock_analysis": "📊 실시간 종목 분석",
-                            "get_stock_news": "📰 뉴스 검색",
-                            "get_market_status": "🌐 시장 현황"
-                        }
-                        tool_display = " • ".join([tool_names.get(t, t) for t in used_tools])
-                        with st.expander(f"🔧 사용된 도구: {tool_display}"):
-                            st.json(used_tools)
+                    response_generator, used_tools = chat_with_tools_streaming(
+                        prompt,
+                        get_chat_history_for_llm(),
+                        st.session_state.user_profile,
+                        portfolio=get_portfolio_for_chat()
+                    )
+                    message_placeholder.markdown("▌")
 
                     # 스트리밍 응답
                     for chunk in response_generator:
@@ -474,10 +599,15 @@ def render_chat_page():
                         message_placeholder.markdown(full_response + "▌")
                     
                     message_placeholder.markdown(full_response)
+                    
+                    # 사용된 도구 표시
+                    if used_tools:
+                        tool_display = " • ".join([TOOL_DISPLAY_NAMES.get(t, t) for t in used_tools])
+                        with st.expander(f"🔧 사용된 도구: {tool_display}"):
+                            st.json(used_tools)
                 
                 # 응답 저장
-                st.session_state.chat_messages.append({"role": "assistant", "content": full_response})
-                st.session_state.chat_history.append({"role": "assistant", "content": full_response})
+                append_chat_message("assistant", full_response)
                 
                 # TTS 음성 출력
                 if st.session_state.tts_enabled and full_response:
@@ -490,14 +620,13 @@ def render_chat_page():
             except Exception as e:
                 error_msg = f"❌ 오류가 발생했습니다: {str(e)}"
                 message_placeholder.error(error_msg)
-                st.session_state.chat_messages.append({"role": "assistant", "content": error_msg})
+                append_chat_message("assistant", error_msg, persist=False)
 
 
 def plot_stock_chart(ticker: str, period: str = "1mo", chart_key: str = "main"):
     """주가 차트 생성"""
     try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period=period)
+        hist = get_price_history(ticker, period)
         
         if hist.empty:
             st.warning("차트 데이터를 가져올 수 없습니다.")
@@ -735,8 +864,8 @@ def main():
         if st.button("🚪 로그아웃", width='stretch'):
             st.session_state.user = None
             st.session_state.portfolio = []
-            st.session_state.chat_history = []
-            st.session_state.chat_messages = []
+            reset_chat_state()
+            st.session_state.document_store = DocumentStore()
             st.rerun()
         
         st.markdown("---")
@@ -879,15 +1008,21 @@ def main():
     with tabs[1]:
         st.markdown("## 📊 나의 포트폴리오")
         
-        col1, col2 = st.columns([2, 1])
+        col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
         
         with col1:
             new_ticker = st.text_input("종목 추가", placeholder="종목명 또는 코드 입력 (예: 삼성전자, AAPL)")
         
         with col2:
-            new_shares = st.number_input("보유 수량", min_value=1, value=1)
+            new_shares = st.number_input("수량", min_value=1, value=1)
+        
+        with col3:
+            new_price = st.number_input("단가 (0이면 현재가)", min_value=0.0, value=0.0, step=1.0)
         
-        if st.button("➕ 포트폴리오에 추가"):
+        with col4:
+            trade_side = st.radio("거래", ["매수", "매도"], horizontal=True)
+        
+        if st.button("➕ 거래 기록"):
             if new_ticker:
                 with st.spinner("종목 확인 중..."):
                     # 사용자 입력을 종목 코드로 변환
@@ -896,17 +1031,31 @@ def main():
                     if "error" in normalized:
                         st.error(f"❌ {normalized['error']}")
                     else:
-                        # DB에 추가
-                        st.session_state.db.add_to_portfolio(
-                            st.session_state.user.id,
-                            normalized['ticker'],
-                            new_shares
-                        )
-                        # 포트폴리오 새로고침
-                        st.session_state.portfolio = st.session_state.db.get_portfolio(st.session_state.user.id)
+                        price = new_price
+                        if not price:
+                            quote = get_quotes([normalized['ticker']]).get(normalized['ticker'])
+                            price = quote["price"] if quote else 0
                         
-                        st.success(f"✅ **{normalized['name']}** ({normalized['ticker']}) 종목이 포트폴리오에 추가되었습니다!")
-                        st.rerun()
+                        if not price:
+                            st.error("❌ 현재가를 가져오지 못했습니다. 단가를 직접 입력해주세요.")
+                        else:
+                            try:
+                                # 거래 원장에 기록 (보유 현황은 같은 트랜잭션에서 갱신)
+                                st.session_state.db.record_trade(
+                                    st.session_state.user.id,
+                                    normalized['ticker'],
+                                    new_shares if trade_side == "매수" else -new_shares,
+                                    price
+                                )
+                            except ValueError as e:
+                                st.error(f"❌ {e}")
+                            else:
+                                invalidate_portfolio(st.session_state.user.id)
+                                # 포트폴리오 새로고침
+                                st.session_state.portfolio = st.session_state.db.get_portfolio(st.session_state.user.id)
+                                
+                                st.success(f"✅ **{normalized['name']}** ({normalized['ticker']}) {new_shares}주 {trade_side} 기록 완료 (단가 {price:,.2f})")
+                                st.rerun()
         
         if st.session_state.portfolio:
             st.markdown("### 보유 종목")
@@ -1008,8 +1157,7 @@ def main():
                             for item in st.session_state.portfolio:
                                 if item.ticker.endswith(".KS") or item.ticker.endswith(".KQ"):
                                     try:
-                                        stock = yf.Ticker(item.ticker)
-                                        hist = stock.history(period="1y")
+                                        hist = get_price_history(item.ticker, "1y")
                                         if not hist.empty:
                                             total_initial += hist['Close'].iloc[0] * item.shares
                                             total_current += hist['Close'].iloc[-1] * item.shares
@@ -1054,8 +1202,7 @@ def main():
                             for item in st.session_state.portfolio:
                                 if not (item.ticker.endswith(".KS") or item.ticker.endswith(".KQ")):
                                     try:
-                                        stock = yf.Ticker(item.ticker)
-                                        hist = stock.history(period="1y")
+                                        hist = get_price_history(item.ticker, "1y")
                                         if not hist.empty:
                                             total_initial += hist['Close'].iloc[0] * item.shares
                                             total_current += hist['Close'].iloc[-1] * item.shares
@@ -1094,10 +1241,71 @@ def main():
             with col_clear:
                 if st.button("🗑️ 포트폴리오 초기화", width='stretch'):
                     st.session_state.db.clear_portfolio(st.session_state.user.id)
+                    invalidate_portfolio(st.session_state.user.id)
                     st.session_state.portfolio = []
                     st.rerun()
         else:
             st.info("포트폴리오가 비어있습니다. 종목을 추가해보세요!")
+        
+        # 거래 원장 / 기준일 보유 현황
+        trades = get_trades(st.session_state.user.id, limit=50)
+        if trades:
+            with st.expander("📒 거래 내역 및 기준일 보유 현황"):
+                # 거래 시각이 UTC로 저장되므로 기준일도 UTC 날짜 (그날 끝까지 포함)
+                as_of = st.date_input("기준일 (UTC)", value=utc_today(), key="holdings_as_of")
+                holdings = get_holdings_as_of(st.session_state.user.id, as_of)
+                if holdings:
+                    st.dataframe(pd.DataFrame(holdings).rename(
+                        columns={"ticker": "종목코드", "shares": "보유수량", "avg_price": "평균단가"}
+                    ), width='stretch')
+                else:
+                    st.info("기준일에 보유한 종목이 없습니다.")
+                
+                st.markdown("##### 최근 거래 (최대 50건)")
+                st.dataframe(pd.DataFrame([
+                    {
+                        "거래일시": trade["traded_at"].strftime("%Y-%m-%d %H:%M"),
+                        "종목코드": trade["ticker"],
+                        "구분": "매수" if trade["quantity"] > 0 else "매도",
+                        "수량": abs(trade["quantity"]),
+                        "단가": trade["price"],
+                    }
+                    for trade in trades
+                ]), width='stretch')
+        
+        # 평가금액 추이 (일별 스냅샷, 네트워크 호출 없이 인덱스 조회 한 번, 결과는 수정 전까지 캐시)
+        with st.expander("📈 평가금액 추이"):
+            snapshots = get_equity_curve(st.session_state.user.id)
+            if snapshots:
+                df_curve = pd.DataFrame([
+                    {"날짜": s["snapshot_date"], "통화": s["currency"], "평가금액": s["total_value"], "매입금액": s["total_cost"]}
+                    for s in snapshots
+                ])
+                for currency, df_currency in df_curve.groupby("통화"):
+                    symbol = "₩" if currency == "KRW" else "$"
+                    latest = df_currency.iloc[-1]
+                    first = df_currency.iloc[0]
+                    profit_rate = (latest["평가금액"] / latest["매입금액"] - 1) * 100 if latest["매입금액"] else 0
+                    period_change = (latest["평가금액"] / first["평가금액"] - 1) * 100 if first["평가금액"] else 0
+                    
+                    col_value, col_profit, col_period = st.columns(3)
+                    col_value.metric(f"{currency} 평가금액", f"{symbol}{latest['평가금액']:,.2f}")
+                    col_profit.metric("평가손익률", f"{profit_rate:+.2f}%")
+                    col_period.metric(f"기간 변동 ({first['날짜']} ~)", f"{period_change:+.2f}%")
+                    
+                    fig_curve = go.Figure()
+                    fig_curve.add_trace(go.Scatter(x=df_currency["날짜"], y=df_currency["평가금액"], name="평가금액", mode="lines+markers"))
+                    fig_curve.add_trace(go.Scatter(x=df_currency["날짜"], y=df_currency["매입금액"], name="매입금액", line=dict(dash="dash")))
+                    fig_curve.update_layout(height=300, margin=dict(l=10, r=10, t=30, b=10), title=f"{currency} 평가금액 추이")
+                    st.plotly_chart(fig_curve, width='stretch', key=f"equity_curve_{currency}")
+            else:
+                st.info("아직 기록된 스냅샷이 없습니다. 스냅샷은 하루 한 번 자동으로 기록됩니다.")
+            
+            if st.session_state.portfolio and st.button("📸 오늘 평가금액 기록", key="take_snapshot"):
+                with st.spinner("현재가 조회 중..."):
+                    take_snapshot(st.session_state.db, user_ids=[st.session_state.user.id])
+                invalidate_portfolio(st.session_state.user.id)
+                st.rerun()
     
     # 탭 3: 분석 기록
     with tabs[2]:
@@ -0,0 +1,225 @@
+"""
+Streamlit 캐시 계층
+- 공유 리소스 (DB 연결 풀, 사용자 문서 저장소, 문서 색인 스레드 풀)는 st.cache_resource로 프로세스당 하나만 생성
+- 외부 데이터 조회 (시세, 가격 이력, 뉴스, 분석)는 st.cache_data로 TTL 동안 세션 간 공유
+- 오류 결과는 캐시하지 않아 일시적 실패가 TTL 동안 남지 않음
+- 거래 내역/평가 추이 조회는 사용자별 버전을 키에 넣어, 포트폴리오 수정 후 invalidate_portfolio()로 바로 갱신
+  (평가 추이는 마지막 스냅샷 저장 시각도 키에 넣어 스케줄러/cron이 저장한 스냅샷도 바로 반영)
+- 챗봇 도구(tools.*_for_chat)도 set_chat_fetchers()로 이 캐시를 거치도록 등록
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import streamlit as st
+import yfinance as yf
+
+import config
+import tools
+from database import DBManager
+from rag_store import get_document_store
+
+
+# ---------------------------------------------------------------------------
+# 공유 리소스
+# ---------------------------------------------------------------------------
+@st.cache_resource
+def get_db() -> DBManager:
+    """DB 매니저 (엔진/연결 풀은 모든 세션이 공유)"""
+    return DBManager()
+
+
+@st.cache_resource(max_entries=256)
+def get_user_document_store(user_id: int):
+    """로그인 사용자 문서 저장소 (같은 사용자의 여러 세션이 벡터 색인을 공유)"""
+    return get_document_store(user_id)
+
+
+@st.cache_resource
+def get_ingest_executor() -> ThreadPoolExecutor:
+    """문서 색인 스레드 풀 (업로드한 문서를 스크립트 스레드 밖에서 처리)"""
+    return ThreadPoolExecutor(max_workers=config.DOCUMENT_INGEST_WORKERS, thread_name_prefix="ingest")
+
+
+# ---------------------------------------------------------------------------
+# 외부 데이터 (TTL 캐시)
+# ---------------------------------------------------------------------------
+class _Uncached(Exception):
+    """캐시하지 않을 결과 - st.cache_data는 예외로 끝난 호출을 저장하지 않음"""
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+
+def _skip_cache(value):
+    raise _Uncached(value)
+
+
+def _call(cached_func, *args):
+    try:
+        return cached_func(*args)
+    except _Uncached as e:
+        return e.value
+
+
+@st.cache_data(ttl=config.CACHE_QUOTE_TTL, show_spinner=False)
+def _stock_summary(ticker: str, period: str):
+    summary = tools.get_stock_summary(ticker, period)
+    return _skip_cache(summary) if "error" in summary else summary
+
+
+@st.cache_data(ttl=config.CACHE_QUOTE_TTL, show_spinner=False)
+def _quotes(tickers: tuple):
+    quotes = tools.get_quotes(list(tickers))
+    return quotes if quotes else _skip_cache(quotes)
+
+
+@st.cache_data(ttl=config.CACHE_HISTORY_TTL, show_spinner=False)
+def _price_history(ticker: str, period: str):
+    hist = yf.Ticker(ticker).history(period=period)
+    return _skip_cache(hist) if hist.empty else hist
+
+
+@st.cache_data(ttl=config.CACHE_HISTORY_TTL, show_spinner=False)
+def _technical_indicators(ticker: str, period: str):
+    indicators = tools.get_technical_indicators(ticker, period)
+    return _skip_cache(indicators) if "error" in indicators else indicators
+
+
+@st.cache_data(ttl=config.CACHE_ANALYSIS_TTL, show_spinner=False)
+def _fundamental_analysis(ticker: str):
+    fundamentals = tools.get_fundamental_analysis(ticker)
+    return _skip_cache(fundamentals) if "error" in fundamentals else fundamentals
+
+
+@st.cache_data(ttl=config.CACHE_NEWS_TTL, show_spinner=False)
+def _stock_news(stock_name: str, max_results: int):
+    news = tools.get_stock_news(stock_name, max_results)
+    return _skip_cache(news) if not news or "error" in news[0] else news
+
+
+@st.cache_data(ttl=config.CACHE_ANALYSIS_TTL, show_spinner=False)
+def _portfolio_analysis(holdings: tuple):
+    analysis = tools.get_portfolio_analysis([{"ticker": ticker, "shares": shares} for ticker, shares in holdings])
+    return _skip_cache(analysis) if "error" in analysis else analysis
+
+
+@st.cache_data(ttl=config.CACHE_TICKER_TTL, show_spinner=False)
+def _normalized_ticker(user_input: str):
+    normalized = tools.normalize_ticker(user_input)
+    return _skip_cache(normalized) if "error" in normalized else normalized
+
+
+def get_stock_summary(ticker: str, period: str = "1mo"):
+    """tools.get_stock_summary (CACHE_QUOTE_TTL초 캐시)"""
+    return _call(_stock_summary, ticker, period)
+
+
+def get_quotes(tickers):
+    """tools.get_quotes (종목 순서와 무관하게 같은 키, CACHE_QUOTE_TTL초 캐시)"""
+    return _call(_quotes, tuple(sorted(set(tickers))))
+
+
+def get_price_history(ticker: str, period: str = "1mo") -> pd.DataFrame:
+    """차트/백테스트용 일봉 (CACHE_HISTORY_TTL초 캐시)"""
+    return _call(_price_history, ticker, period)
+
+
+def get_technical_indicators(ticker: str, period: str = "6mo"):
+    """tools.get_technical_indicators (일봉 기반이므로 CACHE_HISTORY_TTL초 캐시)"""
+    return _call(_technical_indicators, ticker, period)
+
+
+def get_fundamental_analysis(ticker: str):
+    """tools.get_fundamental_analysis (CACHE_ANALYSIS_TTL초 캐시)"""
+    return _call(_fundamental_analysis, ticker)
+
+
+def get_stock_news(stock_name: str, max_results: int = 5):
+    """tools.get_stock_news (CACHE_NEWS_TTL초 캐시)"""
+    return _call(_stock_news, stock_name, max_results)
+
+
+def get_portfolio_analysis(portfolio):
+    """tools.get_portfolio_analysis (보유 종목/수량이 같으면 CACHE_ANALYSIS_TTL초 동안 재사용)"""
+    holdings = tuple(sorted((item["ticker"], item.get("shares", 1)) for item in portfolio))
+    return _call(_portfolio_analysis, holdings)
+
+
+def normalize_ticker(user_input: str):
+    """tools.normalize_ticker (LLM 호출 포함, 성공한 변환만 CACHE_TICKER_TTL초 캐시)"""
+    return _call(_normalized_ticker, user_input.strip())
+
+
+# ---------------------------------------------------------------------------
+# 포트폴리오 조회 (수정 시 무효화)
+# ---------------------------------------------------------------------------
+@st.cache_resource
+def _portfolio_versions() -> dict:
+    """사용자별 포트폴리오 버전 (모든 세션이 공유)"""
+    return {}
+
+
+def portfolio_version(user_id: int) -> int:
+    return _portfolio_versions().get(user_id, 0)
+
+
+def invalidate_portfolio(user_id: int):
+    """거래 기록, 초기화, 스냅샷 저장 후 호출 - 해당 사용자의 캐시된 조회를 다음 요청에서 다시 읽음"""
+    _portfolio_versions()[user_id] = time.monotonic_ns()
+
+
+@st.cache_data(ttl=config.CACHE_PORTFOLIO_TTL, max_entries=1024, show_spinner=False)
+def _trades(user_id: int, limit: int, version: int):
+    return [
+        {"ticker": trade.ticker, "quantity": trade.quantity, "price": trade.price, "traded_at": trade.traded_at}
+        for trade in get_db().get_trades(user_id, limit=limit)
+    ]
+
+
+@st.cache_data(ttl=config.CACHE_PORTFOLIO_TTL, max_entries=1024, show_spinner=False)
+def _holdings_as_of(user_id: int, as_of, version: int):
+    return get_db().get_holdings_as_of(user_id, as_of)
+
+
+@st.cache_data(ttl=config.CACHE_PORTFOLIO_TTL, max_entries=1024, show_spinner=False)
+def _equity_curve(user_id: int, version: int, last_snapshot_at):
+    return [
+        {
+            "snapshot_date": snapshot.snapshot_date,
+            "currency": snapshot.currency,
+            "total_value": snapshot.total_value,
+            "total_cost": snapshot.total_cost,
+        }
+        for snapshot in get_db().get_equity_curve(user_id)
+    ]
+
+
+def get_trades(user_id: int, limit: int = 100):
+    """최근 거래 목록 [{"ticker", "quantity", "price", "traded_at"}] (최신 순)"""
+    return _trades(user_id, limit, portfolio_version(user_id))
+
+
+def get_holdings_as_of(user_id: int, as_of):
+    """기준일 보유 현황 [{"ticker", "shares", "avg_price"}]"""
+    return _holdings_as_of(user_id, as_of, portfolio_version(user_id))
+
+
+def get_equity_curve(user_id: int):
+    """
+    일별 평가금액 추이 [{"snapshot_date", "currency", "total_value", "total_cost"}]
+    
+    스냅샷은 앱 밖(스케줄러 스레드, cron)에서도 저장되므로 마지막 저장 시각을 키에 넣어 확인합니다.
+    (user_id, snapshot_date 인덱스 범위의 MAX 한 번)
+    """
+    return _equity_curve(user_id, portfolio_version(user_id), get_db().get_last_snapshot_at(user_id))
+
+
+# 챗봇 도구의 시세/뉴스/지표 조회도 위 TTL 캐시를 사용 (도구 스레드에서 호출되어도 세션 간 공유)
+tools.set_chat_fetchers(
+    summary=get_stock_summary,
+    quotes=get_quotes,
+    news=get_stock_news,
+    technicals=get_technical_indicators,
+    fundamentals=get_fundamental_analysis,
+)
@@ -0,0 +1,37 @@
+"""
+오래된 대화 기록 압축 보관 작업
+FINSEARCHER_CHAT_ARCHIVE_AFTER_DAYS일보다 오래된 메시지를 사용자별 월 단위로 압축해 chat_archives로 옮깁니다.
+보관된 메시지도 get_chat_history/get_chat_page로 그대로 조회됩니다.
+
+사용법:
+    python archive_job.py                 # cron 등에서 하루 한 번
+    python archive_job.py --days 30 --codec zlib --vacuum
+"""
+import argparse
+import sys
+
+import config
+from database import DBManager, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finsearcher 대화 기록 압축 보관")
+    parser.add_argument("--days", type=int, default=config.CHAT_ARCHIVE_AFTER_DAYS, help="이보다 오래된 메시지를 보관")
+    parser.add_argument("--codec", choices=["zstd", "zlib"], default=config.CHAT_ARCHIVE_CODEC)
+    parser.add_argument("--vacuum", action="store_true", help="보관 후 SQLite 파일 크기 줄이기 (VACUUM)")
+    args = parser.parse_args()
+    
+    stats = DBManager().archive_chat_logs(older_than_days=args.days, codec=args.codec)
+    ratio = stats["compressed_bytes"] / stats["raw_bytes"] if stats["raw_bytes"] else 0
+    print(f"✅ 메시지 {stats['messages']}개 -> 보관본 {stats['archives']}개 "
+          f"({stats['raw_bytes'] / 1024:.1f} KB -> {stats['compressed_bytes'] / 1024:.1f} KB, {ratio:.1%})")
+    
+    if args.vacuum and engine.dialect.name == "sqlite":
+        with engine.connect() as connection:
+            connection.exec_driver_sql("VACUUM")
+        print("🧹 VACUUM 완료")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""
+Async database layer for Finsearcher
+DBManager와 같은 메서드를 async로 제공합니다 (SQLAlchemy asyncio + aiosqlite/asyncpg).
+스키마 생성/마이그레이션은 database 모듈을 import할 때 동기 엔진으로 처리됩니다.
+
+사용 예:
+    db = AsyncDBManager()
+    user = await db.login_user("alice", "pw")
+    await db.add_chat_message(user.id, "assistant", answer)
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import bcrypt
+from sqlalchemy import event, select, delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+import config
+from database import (
+    DATABASE_URL, User, Portfolio, Trade, ChatLog, ChatArchive, PortfolioSnapshot,
+    auth_metrics, chat_log_writer, submit_password_task, password_needs_rehash, dummy_password_hash,
+    position_buy_stmt, position_sell_stmts, holdings_as_of_stmt, holdings_from_rows,
+    chat_page_stmt, chat_page_result, merge_pending, archive_index_stmt, select_archive_ids, archived_messages,
+    _set_sqlite_pragmas,
+)
+
+# 동기 드라이버 URL -> async 드라이버 URL
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    """sqlite:///x.db -> sqlite+aiosqlite:///x.db (이미 async 드라이버면 그대로)"""
+    scheme, sep, rest = url.partition("://")
+    return _ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def create_async_db_engine(url: str = None):
+    """async 엔진 생성 (SQLite는 동기 엔진과 같은 WAL/busy_timeout 적용)"""
+    url = url or config.ASYNC_DATABASE_URL or to_async_url(DATABASE_URL)
+    if url.startswith("sqlite"):
+        db_engine = create_async_engine(
+            url, echo=False, connect_args={"timeout": config.DB_BUSY_TIMEOUT_MS / 1000}
+        )
+        event.listen(db_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        return db_engine
+    return create_async_engine(
+        url,
+        echo=False,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
+
+
+async def async_hash_password(password: str) -> str:
+    salt = bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS)
+    hashed = await asyncio.wrap_future(submit_password_task("hash", bcrypt.hashpw, password.encode('utf-8'), salt))
+    return hashed.decode('utf-8')
+
+
+async def async_verify_password(password: str, password_hash: str) -> bool:
+    return await asyncio.wrap_future(
+        submit_password_task("verify", bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+    )
+
+
+class AsyncDBManager:
+    """
+    비동기 데이터 접근 계층 (DBManager와 같은 메서드, 모두 코루틴)
+    
+    이벤트 루프를 막지 않도록 DB I/O는 async 드라이버로, bcrypt는 database의 해시 전용 풀에서 처리합니다.
+    채팅 메시지는 지연 쓰기 큐를 거치지 않고 바로 저장하며(드라이버 스레드에서 커밋),
+    조회할 때는 동기 DBManager 큐에 아직 저장되지 않은 메시지의 스냅샷(pending_for)을
+    DB 결과와 합쳐(merge_pending) 방금 쓴 메시지도 보이게 합니다. 큐를 직접 저장하지는 않습니다.
+    """
+    
+    def __init__(self, url: str = None):
+        self.engine = create_async_db_engine(url)
+        self.Session = async_sessionmaker(self.engine, expire_on_commit=False)
+    
+    @asynccontextmanager
+    async def session_scope(self):
+        """작업 단위 세션 - 성공하면 커밋, 예외가 나면 롤백 후 다시 발생"""
+        async with self.Session() as session:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+    
+    async def close(self):
+        await self.engine.dispose()
+    
+    # User Methods
+    async def create_user(self, username, password, initial_profile="moderate"):
+        started = time.perf_counter()
+        try:
+            if await self.get_user(username):
+                return None, "이미 존재하는 사용자명입니다."
+            
+            new_user = User(username=username, settings={"profile": initial_profile})
+            new_user.password_hash = await async_hash_password(password)
+            try:
+                async with self.session_scope() as session:
+                    session.add(new_user)
+                return new_user, None
+            except IntegrityError:
+                # 동시에 같은 이름으로 가입한 경우
+                return None, "이미 존재하는 사용자명입니다."
+            except Exception as e:
+                return None, str(e)
+        finally:
+            auth_metrics.record("signup", (time.perf_counter() - started) * 1000)
+    
+    async def login_user(self, username, password):
+        started = time.perf_counter()
+        try:
+            user = await self.get_user(username)
+            if user is None:
+                # 없는 사용자도 같은 만큼 시간이 걸리도록 (사용자명 노출 방지)
+                await async_verify_password(password, await asyncio.to_thread(dummy_password_hash))
+                return None
+            if not await async_verify_password(password, user.password_hash):
+                return None
+            
+            if password_needs_rehash(user.password_hash):
+                user.password_hash = await async_hash_password(password)
+                async with self.session_scope() as session:
+                    await session.execute(
+                        update(User).where(User.id == user.id).values(password_hash=user.password_hash)
+                    )
+            return user
+        finally:
+            auth_metrics.record("login", (time.perf_counter() - started) * 1000)
+    
+    def get_auth_metrics(self):
+        return auth_metrics.summary()
+    
+    async def get_user(self, username):
+        async with self.session_scope() as session:
+            return (await session.execute(select(User).where(User.username == username))).scalars().first()
+    
+    async def update_user_profile(self, user_id, profile):
+        async with self.session_scope() as session:
+            user = await session.get(User, user_id)
+            if user:
+                settings = dict(user.settings) if user.settings else {}
+                settings['profile'] = profile
+                user.settings = settings
+                return True
+            return False
+    
+    # Portfolio Methods
+    async def get_portfolio(self, user_id):
+        async with self.session_scope() as session:
+            return (await session.execute(select(Portfolio).where(Portfolio.user_id == user_id))).scalars().all()
+    
+    async def add_to_portfolio(self, user_id, ticker, shares, avg_price=0, traded_at=None):
+        await self.record_trade(user_id, ticker, shares, avg_price, traded_at)
+    
+    async def record_trade(self, user_id, ticker, shares, price=0, traded_at=None):
+        """거래 기록 (DBManager.record_trade와 동일 - 매수 양수, 매도 음수, 보유 수량 초과 매도는 ValueError)"""
+        if not shares:
+            raise ValueError("거래 수량은 0이 될 수 없습니다.")
+        
+        async with self.session_scope() as session:
+            session.add(Trade(
+                user_id=user_id, ticker=ticker, quantity=shares, price=price or 0.0,
+                traded_at=traded_at or datetime.utcnow()
+            ))
+            if shares > 0:
+                await self._apply_buy(session, user_id, ticker, shares, price or 0.0)
+            else:
+                update_stmt, cleanup_stmt = position_sell_stmts(user_id, ticker, -shares)
+                if not (await session.execute(update_stmt)).rowcount:
+                    raise ValueError("보유 수량보다 많이 매도할 수 없습니다.")
+                await session.execute(cleanup_stmt)
+    
+    async def _apply_buy(self, session, user_id, ticker, shares, avg_price):
+        stmt = position_buy_stmt(self.engine.dialect.name, user_id, ticker, shares, avg_price)
+        if stmt is not None:
+            await session.execute(stmt)
+            return
+        
+        # upsert를 지원하지 않는 DB용 (조회 후 갱신)
+        item = (await session.execute(
+            select(Portfolio).where(Portfolio.user_id == user_id, Portfolio.ticker == ticker).with_for_update()
+        )).scalars().first()
+        if item:
+            total_cost = (item.shares * item.avg_price) + (shares * avg_price)
+            total_shares = item.shares + shares
+            item.shares = total_shares
+            item.avg_price = total_cost / total_shares if total_shares > 0 else 0
+        else:
+            session.add(Portfolio(user_id=user_id, ticker=ticker, shares=shares, avg_price=avg_price))
+    
+    async def remove_from_portfolio(self, user_id, ticker, price=None):
+        """보유 종목 전량 매도로 기록하고 삭제 (price가 없으면 평균 단가로 기록)"""
+        async with self.session_scope() as session:
+            item = (await session.execute(
+                select(Portfolio).where(Portfolio.user_id == user_id, Portfolio.ticker == ticker)
+            )).scalars().first()
+            if item is None:
+                return
+            if item.shares:
+                session.add(Trade(
+                    user_id=user_id, ticker=ticker, quantity=-item.shares,
+                    price=item.avg_price if price is None else price, traded_at=datetime.utcnow()
+                ))
+            await session.delete(item)
+    
+    async def clear_portfolio(self, user_id):
+        """보유 현황과 거래 원장 모두 삭제"""
+        async with self.session_scope() as session:
+            await session.execute(delete(Portfolio).where(Portfolio.user_id == user_id))
+            await session.execute(delete(Trade).where(Trade.user_id == user_id))
+    
+    async def get_trades(self, user_id, ticker=None, limit=100):
+        stmt = select(Trade).where(Trade.user_id == user_id)
+        if ticker:
+            stmt = stmt.where(Trade.ticker == ticker)
+        stmt = stmt.order_by(Trade.traded_at.desc(), Trade.id.desc()).limit(limit)
+        async with self.session_scope() as session:
+            return (await session.execute(stmt)).scalars().all()
+    
+    async def get_holdings_as_of(self, user_id, as_of):
+        async with self.session_scope() as session:
+            rows = (await session.execute(holdings_as_of_stmt(user_id, as_of))).all()
+        return holdings_from_rows(rows)
+    
+    async def get_equity_curve(self, user_id, start_date=None):
+        stmt = select(PortfolioSnapshot).where(PortfolioSnapshot.user_id == user_id)
+        if start_date is not None:
+            stmt = stmt.where(PortfolioSnapshot.snapshot_date >= start_date)
+        stmt = stmt.order_by(PortfolioSnapshot.snapshot_date, PortfolioSnapshot.currency)
+        async with self.session_scope() as session:
+            return (await session.execute(stmt)).scalars().all()
+    
+    # Chat History Methods
+    async def add_chat_message(self, user_id, role, content):
+        """메시지 저장 후 timestamp 반환"""
+        timestamp = datetime.utcnow()
+        async with self.session_scope() as session:
+            session.add(ChatLog(user_id=user_id, role=role, content=content, timestamp=timestamp))
+        return timestamp
+    
+    async def get_chat_history(self, user_id, limit=50):
+        """최근 메시지 limit개 (오래된 순)"""
+        messages, _ = await self.get_chat_page(user_id, limit=limit)
+        return messages
+    
+    async def get_chat_page(self, user_id, limit=config.CHAT_PAGE_SIZE, before=None):
+        """대화 기록 한 페이지 (키셋 페이지네이션, DBManager.get_chat_page와 같은 커서)"""
+        # 저장 대기 메시지는 flush를 기다리지 않고 조회 전 스냅샷으로 합침
+        pending = chat_log_writer.pending_for(user_id)
+        async with self.session_scope() as session:
+            rows = (await session.execute(chat_page_stmt(user_id, limit, before))).scalars().all()
+            # chat_logs로 페이지를 못 채우면 더 오래된 압축 보관본에서 이어서 읽음
+            archived = []
+            if len(rows) <= limit:
+                index_rows = (await session.execute(archive_index_stmt(user_id, before))).all()
+                archive_ids = select_archive_ids(index_rows, limit + 1 - len(rows))
+                if archive_ids:
+                    archives = (await session.execute(
+                        select(ChatArchive).where(ChatArchive.id.in_(archive_ids))
+                    )).scalars().all()
+                    archived = archived_messages(archives, before)
+        return chat_page_result(archived + merge_pending(list(rows)[::-1], pending, before), limit)
+    
+    async def clear_chat_history(self, user_id):
+        # 저장 중인 메시지가 있으면 커밋을 기다리므로 이벤트 루프 밖에서 실행
+        await asyncio.to_thread(chat_log_writer.discard, user_id)
+        async with self.session_scope() as session:
+            await session.execute(delete(ChatLog).where(ChatLog.user_id == user_id))
+            await session.execute(delete(ChatArchive).where(ChatArchive.user_id == user_id))
@@ -0,0 +1,227 @@
+"""
+RAG 검색 벤치마크 스크립트
+합성 한국어/영어 재무 문서로 검색기별 색인 처리량, 질의 지연(p50/p95), recall@k를 측정합니다.
+API 키나 인터넷 연결 없이 실행됩니다.
+
+사용법:
+    python bench_rag.py
+    python bench_rag.py --sizes 20,100,500 --queries 200 --top-k 3
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from rag_utils import DocumentStore, chunk_text, count_tokens, simple_retrieval
+
+COMPANIES = [
+    ("삼성전자", "Samsung Electronics"), ("SK하이닉스", "SK Hynix"), ("현대차", "Hyundai Motor"),
+    ("LG에너지솔루션", "LG Energy Solution"), ("NAVER", "Naver"), ("카카오", "Kakao"),
+    ("셀트리온", "Celltrion"), ("기아", "Kia"), ("POSCO홀딩스", "POSCO Holdings"),
+    ("삼성바이오로직스", "Samsung Biologics"), ("애플", "Apple"), ("엔비디아", "NVIDIA"),
+    ("테슬라", "Tesla"), ("마이크로소프트", "Microsoft"), ("아마존", "Amazon"),
+]
+METRICS = [
+    ("매출", "revenue"), ("영업이익", "operating income"), ("순이익", "net income"),
+    ("연구개발비", "R&D spending"), ("설비투자", "capital expenditure"), ("배당금", "dividends"),
+    ("잉여현금흐름", "free cash flow"), ("부채", "total debt"),
+]
+YEARS = list(range(2000, 2025))
+SEGMENTS = [("반도체", "semiconductor"), ("모바일", "mobile"), ("가전", "appliance"), ("해외", "overseas")]
+FILLER_KO = [
+    "회사는 글로벌 공급망 재편에 대응하기 위해 생산 거점을 다변화하고 있다.",
+    "경영진은 주주환원 정책을 유지하면서 신사업 투자를 확대할 계획이라고 밝혔다.",
+    "환율 변동과 원자재 가격 상승은 수익성에 부담 요인으로 작용했다.",
+    "사업부별 실적은 계절적 요인에 따라 분기마다 차이를 보였다.",
+    "위험 요인으로는 금리 인상, 경쟁 심화, 규제 강화가 언급되었다.",
+]
+FILLER_EN = [
+    "Management expects demand to normalize as inventory levels return to historical ranges.",
+    "The company continues to invest in data center capacity and supply chain resilience.",
+    "Foreign exchange movements weighed on reported margins during the period.",
+    "Risk factors include rising interest rates, competition, and regulatory changes.",
+]
+
+
+def build_corpus(num_docs: int, facts_per_doc: int = 24, seed: int = 42):
+    """
+    합성 재무 문서 생성
+
+    사실마다 (회사, 지표, 연도, 사업 부문) 조합이 달라 질의 하나에 정답 문장이 하나뿐입니다.
+    조합 수(len(COMPANIES) × len(METRICS) × len(YEARS) × len(SEGMENTS) = 12000)보다 많은 사실은 만들 수 없습니다.
+
+    Returns:
+        (문서 목록 [(파일명, 텍스트)], 사실 목록 [{"query", "answer"}])
+        answer는 해당 사실 문장에만 있는 고유 문자열로, 청크에 포함되면 정답으로 봅니다.
+    """
+    rng = random.Random(seed)
+    combos = [
+        (c, m, y, s)
+        for c in range(len(COMPANIES)) for m in range(len(METRICS)) for y in YEARS for s in range(len(SEGMENTS))
+    ]
+    if num_docs * facts_per_doc > len(combos):
+        raise ValueError(f"사실 수({num_docs * facts_per_doc})가 고유 조합 수({len(combos)})보다 많습니다.")
+    rng.shuffle(combos)
+    values = rng.sample(range(1000000, 10000000), num_docs * facts_per_doc)  # 같은 자릿수라 서로의 부분 문자열이 아님
+    documents, facts = [], []
+    cursor = 0
+
+    for doc_index in range(num_docs):
+        english = doc_index % 3 == 2  # 문서 3개 중 1개는 영어
+        paragraphs = []
+        for _ in range(facts_per_doc):
+            c, m, y, s = combos[cursor]
+            value = values[cursor]
+            cursor += 1
+            company_ko, company_en = COMPANIES[c]
+            metric_ko, metric_en = METRICS[m]
+            segment_ko, segment_en = SEGMENTS[s]
+            change = round(rng.uniform(-30, 30), 1)
+
+            if english:
+                answer = f"${value:,} million"
+                paragraphs.append(
+                    f"{company_en} reported {segment_en} segment {metric_en} of {answer} in fiscal {y}, "
+                    f"{'up' if change >= 0 else 'down'} {abs(change)}% year over year. "
+                    + rng.choice(FILLER_EN)
+                )
+                query = f"What was {company_en}'s {segment_en} segment {metric_en} in {y}?"
+            else:
+                answer = f"{value:,}억원"
+                paragraphs.append(
+                    f"{company_ko}의 {y}년 {segment_ko} 부문 {metric_ko}은 {answer}으로 전년 대비 "
+                    f"{abs(change)}% {'증가' if change >= 0 else '감소'}했다. "
+                    + rng.choice(FILLER_KO)
+                )
+                query = f"{company_ko} {y}년 {segment_ko} 부문 {metric_ko} 얼마야?"
+            facts.append({"query": query, "answer": answer})
+            if rng.random() < 0.3:
+                paragraphs.append(rng.choice(FILLER_EN if english else FILLER_KO))
+
+        documents.append((f"report_{doc_index:04d}.txt", "\n\n".join(paragraphs) + "\n"))
+
+    return documents, facts
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_queries(search, facts, top_k: int):
+    """질의별 지연 시간(ms)과 recall@k 계산 - search(query, top_k) -> [청크 텍스트]"""
+    latencies, hits = [], 0
+    for fact in facts:
+        started = time.perf_counter()
+        results = search(fact["query"], top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if any(fact["answer"] in chunk for chunk in results[:top_k]):
+            hits += 1
+    return latencies, hits / len(facts) if facts else 0.0
+
+
+def bench_size(num_docs: int, num_queries: int, top_k: int, max_simple_queries: int, seed: int):
+    documents, facts = build_corpus(num_docs, seed=seed)
+    rng = random.Random(seed)
+    queries = rng.sample(facts, min(num_queries, len(facts)))
+    total_bytes = sum(len(text.encode("utf-8")) for _, text in documents)
+
+    print("\n" + "=" * 70)
+    print(f"문서 {num_docs}개 | {total_bytes / 1e6:.2f} MB | 질의 {len(queries)}개 | top-{top_k}")
+    print("=" * 70)
+
+    rows = []
+
+    # 1. 기존 방식: 고정 길이 청킹 + simple_retrieval 전체 스캔
+    started = time.perf_counter()
+    simple_chunks = []
+    for _, text in documents:
+        simple_chunks.extend(chunk_text(text, chunk_size=800, overlap=100))
+    ingest = time.perf_counter() - started
+    latencies, recall = run_queries(
+        lambda q, k: simple_retrieval(q, simple_chunks, top_k=k), queries[:max_simple_queries], top_k
+    )
+    rows.append(("simple_retrieval", ingest, len(simple_chunks), latencies, recall))
+
+    # 2. 메모리 저장소: BM25 / 하이브리드(BM25 + 재정렬, 오프라인이라 임베딩 없음)
+    store = DocumentStore(use_embeddings=False, storage="memory")
+    started = time.perf_counter()
+    for filename, text in documents:
+        store.add_document(filename, text.encode("utf-8"))
+    ingest = time.perf_counter() - started
+    chunk_count = store.get_chunk_count()
+    latencies, recall = run_queries(
+        lambda q, k: [store.get_chunk(chunk_id) for chunk_id, _ in store.lexical_search(q, k)], queries, top_k
+    )
+    rows.append(("BM25 only (lexical_search)", ingest, chunk_count, latencies, recall))
+    latencies, recall = run_queries(lambda q, k: store.search(q, k), queries, top_k)
+    rows.append(("search (hybrid + rerank)", ingest, chunk_count, latencies, recall))
+
+    # 3. mmap 저장소
+    mmap_store = DocumentStore(use_embeddings=False, storage="mmap")
+    started = time.perf_counter()
+    for filename, text in documents:
+        mmap_store.add_document(filename, text.encode("utf-8"))
+    ingest = time.perf_counter() - started
+    latencies, recall = run_queries(lambda q, k: mmap_store.search(q, k), queries, top_k)
+    rows.append(("search (mmap)", ingest, mmap_store.get_chunk_count(), latencies, recall))
+    mmap_store.clear()
+
+    # 4. 영구 저장소 (SQLite FTS5)
+    try:
+        from rag_store import PersistentDocumentStore
+        db_dir = tempfile.mkdtemp(prefix="finsearcher_bench_")
+        fts_store = PersistentDocumentStore(1, db_path=os.path.join(db_dir, "bench.db"), use_embeddings=False)
+        started = time.perf_counter()
+        for filename, text in documents:
+            fts_store.add_document(filename, text.encode("utf-8"))
+        ingest = time.perf_counter() - started
+        latencies, recall = run_queries(lambda q, k: fts_store.search(q, k), queries, top_k)
+        rows.append(("search (FTS5 persistent)", ingest, fts_store.get_chunk_count(), latencies, recall))
+        fts_store.conn.close()
+        shutil.rmtree(db_dir, ignore_errors=True)
+    except Exception as e:
+        print(f"⚠️ FTS5 저장소 측정 건너뜀: {e}")
+
+    print(f"{'검색기':<32}{'색인 MB/s':>10}{'청크':>8}{'p50 ms':>10}{'p95 ms':>10}{f'recall@{top_k}':>11}")
+    print("-" * 81)
+    for name, ingest, chunks, latencies, recall in rows:
+        throughput = total_bytes / 1e6 / ingest if ingest > 0 else float("inf")
+        print(f"{name:<32}{throughput:>10.2f}{chunks:>8}"
+              f"{percentile(latencies, 50):>10.2f}{percentile(latencies, 95):>10.2f}{recall:>11.2%}")
+    if len(queries) > max_simple_queries:
+        print(f"※ simple_retrieval은 질의 {max_simple_queries}개만 측정 (전체 스캔이라 느림)")
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finsearcher RAG 검색 벤치마크")
+    parser.add_argument("--sizes", default="20,100,500", help="문서 수 목록 (쉼표 구분, 최대 500)")
+    parser.add_argument("--queries", type=int, default=400, help="크기별 질의 수")
+    parser.add_argument("--top-k", type=int, default=3, help="recall@k의 k")
+    parser.add_argument("--max-simple-queries", type=int, default=100, help="simple_retrieval 측정 질의 수 상한")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("Finsearcher RAG 검색 벤치마크 (오프라인, 임베딩 없음)")
+    print("=" * 70)
+
+    count_tokens("워밍업")  # 토크나이저 로딩 시간이 첫 색인 측정에 섞이지 않도록
+
+    for size in [int(value) for value in args.sizes.split(",") if value.strip()]:
+        bench_size(size, args.queries, args.top_k, args.max_simple_queries, args.seed)
+
+    print("\n✅ 벤치마크 완료")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -40,3 +41,74 @@ POPULAR_STOCKS = [
     {"ticker": "006400.KS", "name": "삼성SDI"},
     {"ticker": "207940.KS", "name": "삼성바이오로직스"},
 ]
+
+# 사용자/포트폴리오/대화 DB (비워두면 로컬 SQLite 파일, 예: postgresql+psycopg2://user:pw@host/finsearcher)
+DATABASE_URL = os.getenv("DATABASE_URL")
+# 비동기 DB 접근용 URL (비워두면 DATABASE_URL의 드라이버를 aiosqlite/asyncpg로 바꿔 사용)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+DB_POOL_SIZE = int(os.getenv("FINSEARCHER_DB_POOL_SIZE", "10"))            # 유지할 연결 수
+DB_MAX_OVERFLOW = int(os.getenv("FINSEARCHER_DB_MAX_OVERFLOW", "20"))      # 부하 시 추가로 열 수 있는 연결 수
+DB_BUSY_TIMEOUT_MS = int(os.getenv("FINSEARCHER_DB_BUSY_TIMEOUT_MS", "5000"))  # SQLite 잠금 대기 시간
+# 일별 포트폴리오 평가 스냅샷 (앱 프로세스에서 하루 한 번 기록, 외부 스케줄러를 쓰면 false)
+SNAPSHOT_SCHEDULER = os.getenv("FINSEARCHER_SNAPSHOT_SCHEDULER", "true").lower() == "true"
+SNAPSHOT_CHECK_MINUTES = int(os.getenv("FINSEARCHER_SNAPSHOT_CHECK_MINUTES", "60"))  # 오늘 스냅샷 여부 확인 주기
+
+# 비밀번호 해시 (bcrypt) - 비용을 바꾸면 기존 사용자는 다음 로그인 때 새 비용으로 다시 해시됨
+BCRYPT_ROUNDS = int(os.getenv("FINSEARCHER_BCRYPT_ROUNDS", "12"))
+AUTH_WORKERS = int(os.getenv("FINSEARCHER_AUTH_WORKERS", str(min(4, os.cpu_count() or 1))))  # 동시 해시 계산 수
+# 채팅 로그 지연 쓰기 (백그라운드 스레드가 모아서 한 트랜잭션으로 저장)
+CHAT_FLUSH_INTERVAL = float(os.getenv("FINSEARCHER_CHAT_FLUSH_INTERVAL", "0.5"))  # 저장 주기 (초)
+CHAT_FLUSH_BATCH_SIZE = int(os.getenv("FINSEARCHER_CHAT_FLUSH_BATCH_SIZE", "100"))  # 이만큼 쌓이면 주기 전에 저장
+# 오래된 대화 기록 압축 보관 (archive_job.py, 사용자별 월 단위 묶음) - zstd는 zstandard 패키지가 있을 때만, 없으면 zlib
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv("FINSEARCHER_CHAT_ARCHIVE_AFTER_DAYS", "90"))
+CHAT_ARCHIVE_CODEC = os.getenv("FINSEARCHER_CHAT_ARCHIVE_CODEC", "zstd")
+# 대화 기록 페이지 (최근 N개만 세션에 적재, 이전 대화는 커서로 한 페이지씩 조회)
+CHAT_PAGE_SIZE = int(os.getenv("FINSEARCHER_CHAT_PAGE_SIZE", "30"))        # 한 번에 불러올 메시지 수
+CHAT_MAX_MESSAGES = int(os.getenv("FINSEARCHER_CHAT_MAX_MESSAGES", "200"))  # 세션에 유지할 최대 메시지 수
+
+# Streamlit 데이터 캐시 유효 시간 (초, 사용자/세션 간 공유)
+CACHE_QUOTE_TTL = int(os.getenv("FINSEARCHER_CACHE_QUOTE_TTL", "60"))          # 시세, 종목 요약
+CACHE_HISTORY_TTL = int(os.getenv("FINSEARCHER_CACHE_HISTORY_TTL", "300"))     # 차트/백테스트용 가격 이력
+CACHE_NEWS_TTL = int(os.getenv("FINSEARCHER_CACHE_NEWS_TTL", "900"))           # 뉴스
+CACHE_ANALYSIS_TTL = int(os.getenv("FINSEARCHER_CACHE_ANALYSIS_TTL", "600"))   # 포트폴리오 분석
+CACHE_TICKER_TTL = int(os.getenv("FINSEARCHER_CACHE_TICKER_TTL", "86400"))     # 종목명 → 티커 변환
+CACHE_PORTFOLIO_TTL = int(os.getenv("FINSEARCHER_CACHE_PORTFOLIO_TTL", "3600"))  # 거래 내역/평가 추이 (수정 시 즉시 무효화)
+
+# LangGraph 체크포인트 저장소 (분석 워크플로우 재개/재사용)
+CHECKPOINT_DB = os.getenv("FINSEARCHER_CHECKPOINT_DB", "finsearcher_checkpoints.db")
+# 저장된 분석 결과를 재사용하는 시간 (분, 데이터 수집 시각 기준 - 지나면 새로 실행)
+WORKFLOW_CACHE_MINUTES = int(os.getenv("FINSEARCHER_WORKFLOW_CACHE_MINUTES", "30"))
+
+# RAG 임베딩 모델 (문서 의미 검색)
+EMBEDDING_MODEL = os.getenv("FINSEARCHER_EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_CACHE_SIZE = int(os.getenv("FINSEARCHER_EMBEDDING_CACHE_SIZE", "10000"))  # 프로세스 내 임베딩 캐시 항목 수 (1536차원 기준 약 60MB)
+
+# RAG 검색 설정 (후보 수를 늘리면 정확도↑, 지연↑)
+RAG_TOP_K = int(os.getenv("FINSEARCHER_RAG_TOP_K", "3"))                     # 프롬프트에 넣을 청크 수
+RAG_CANDIDATE_POOL = int(os.getenv("FINSEARCHER_RAG_CANDIDATE_POOL", "20"))  # 검색기별 후보 수
+RAG_RERANK = os.getenv("FINSEARCHER_RAG_RERANK", "true").lower() == "true"  # 로컬 재정렬 사용 여부
+RAG_MAX_CONTEXT_CHARS = int(os.getenv("FINSEARCHER_RAG_MAX_CONTEXT_CHARS", "2400"))  # 컨텍스트 최대 글자 수
+
+# RAG 청킹 (문장/문단 경계 기준, 토큰 예산)
+RAG_CHUNK_TOKENS = int(os.getenv("FINSEARCHER_RAG_CHUNK_TOKENS", "300"))                  # 청크 최대 토큰 수
+RAG_CHUNK_OVERLAP_TOKENS = int(os.getenv("FINSEARCHER_RAG_CHUNK_OVERLAP_TOKENS", "50"))  # 이웃 청크와 겹칠 토큰 수
+
+# 문서 요약 (map-reduce)
+SUMMARY_CHUNK_TOKENS = int(os.getenv("FINSEARCHER_SUMMARY_CHUNK_TOKENS", "3000"))    # map 단계 묶음 크기
+SUMMARY_REDUCE_TOKENS = int(os.getenv("FINSEARCHER_SUMMARY_REDUCE_TOKENS", "6000"))  # reduce/최종 단계 입력 예산
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("FINSEARCHER_SUMMARY_MAX_CONCURRENCY", "4"))  # 동시 LLM 호출 수
+SUMMARY_CACHE_SIZE = int(os.getenv("FINSEARCHER_SUMMARY_CACHE_SIZE", "2000"))          # 프로세스 내 요약 캐시 항목 수
+
+# RAG 문서 텍스트 보관 방식: memory(세션 메모리) 또는 mmap(문서별 파일 + 메모리 맵, 대용량 문서용)
+RAG_STORAGE = os.getenv("FINSEARCHER_RAG_STORAGE", "memory")
+RAG_MMAP_DIR = os.getenv("FINSEARCHER_RAG_MMAP_DIR", os.path.join(tempfile.gettempdir(), "finsearcher_docs"))
+
+# PDF 병렬 추출 (페이지가 많은 문서는 프로세스 풀에서 페이지 묶음 단위로 추출)
+PDF_WORKERS = int(os.getenv("FINSEARCHER_PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("FINSEARCHER_PDF_PAGES_PER_TASK", "8"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("FINSEARCHER_PDF_PARALLEL_MIN_PAGES", "16"))  # 이보다 적으면 직렬 추출
+
+# 사용자 문서 영구 저장소 (SQLite FTS5, 사용자 간 동일 문서 공유)
+DOCUMENT_DB = os.getenv("FINSEARCHER_DOCUMENT_DB", "finsearcher_documents.db")
+DOCUMENT_COMMIT_CHUNKS = int(os.getenv("FINSEARCHER_DOCUMENT_COMMIT_CHUNKS", "32"))  # 문서 추가 중 이만큼씩 커밋
+DOCUMENT_INGEST_WORKERS = int(os.getenv("FINSEARCHER_DOCUMENT_INGEST_WORKERS", "2"))  # 백그라운드 문서 색인 스레드 수
@@ -0,0 +1,10 @@
+"""pytest 설정"""
+import os
+import tempfile
+
+# 스크립트 형식 점검 파일 (네트워크/API 키 필요, 직접 실행)
+collect_ignore = ["test_setup.py", "test_pdf.py"]
+
+# database 모듈은 import 시점에 DATABASE_URL로 엔진을 만들므로 테스트용 임시 DB를 먼저 지정
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'finsearcher_test.db')}")
+os.environ.setdefault("FINSEARCHER_BCRYPT_ROUNDS", "4")
@@ -1,19 +1,170 @@
 """
 Database layer for Finsearcher
 Handles User, Portfolio, and Chat History persistence using SQLite and SQLAlchemy.
+Set DATABASE_URL to use PostgreSQL instead of the local SQLite file.
 """
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, DateTime, Text, JSON
+from sqlalchemy import create_engine, event, and_, or_, case, delete, exists, func, select, update, Column, Integer, String, Float, ForeignKey, Date, DateTime, Text, JSON, LargeBinary, Index
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
-from datetime import datetime
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import atexit
 import bcrypt
+import json
 import os
+import threading
+import time
+import zlib
+import config
+
+try:
+    import zstandard
+except ImportError:  # 대화 보관본은 zstandard가 없으면 zlib으로 압축
+    zstandard = None
 
 # Database Setup
 DB_FILE = "finsearcher.db"
-engine = create_engine(f"sqlite:///{DB_FILE}", echo=False)
+DATABASE_URL = config.DATABASE_URL or f"sqlite:///{DB_FILE}"
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """SQLite 연결마다 동시성 설정 적용 (WAL: 읽기와 쓰기가 서로 막지 않음, busy_timeout: 잠금 대기)"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={config.DB_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def create_db_engine(url: str = DATABASE_URL):
+    """DB 엔진 생성 (SQLite는 WAL/busy_timeout 적용, 그 외 DB는 연결 풀 점검/재활용)"""
+    pool_options = {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+    }
+    if url.startswith("sqlite"):
+        if url in ("sqlite://", "sqlite:///:memory:"):
+            # 메모리 DB는 연결마다 별도 DB가 되므로 풀 설정 없이 사용
+            return create_engine(url, echo=False)
+        db_engine = create_engine(
+            url,
+            echo=False,
+            connect_args={"check_same_thread": False, "timeout": config.DB_BUSY_TIMEOUT_MS / 1000},
+            **pool_options
+        )
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+        return db_engine
+    return create_engine(url, echo=False, pool_recycle=1800, **pool_options)
+
+
+engine = create_db_engine()
 Base = declarative_base()
-Session = sessionmaker(bind=engine)
+# 작업마다 새 세션을 열고 닫음 (커밋 후에도 읽어 둔 값을 그대로 쓸 수 있도록 expire_on_commit=False)
+Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+
+@contextmanager
+def session_scope():
+    """작업 단위 세션 - 성공하면 커밋, 예외가 나면 롤백 후 다시 발생"""
+    session = Session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+class AuthMetrics:
+    """인증 단계별 지연 시간 (단계별 최근 window개, ms)"""
+    
+    def __init__(self, window: int = 1000):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+    
+    def record(self, name: str, elapsed_ms: float):
+        with self._lock:
+            self._samples[name].append(elapsed_ms)
+    
+    def summary(self):
+        """{단계: {"count", "p50_ms", "p95_ms", "max_ms"}} - queue_wait은 해시 작업이 풀에서 기다린 시간"""
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items() if values}
+        return {
+            name: {
+                "count": len(values),
+                "p50_ms": values[(len(values) - 1) // 2],
+                "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max_ms": values[-1],
+            }
+            for name, values in samples.items()
+        }
+
+
+auth_metrics = AuthMetrics()
+# bcrypt는 계산 중 GIL을 풀기 때문에 전용 스레드 풀에서 돌리면 다른 세션이 막히지 않고,
+# 작업자 수로 동시 해시 수를 제한해 로그인이 몰려도 CPU를 과점하지 않음
+_password_executor = ThreadPoolExecutor(max_workers=config.AUTH_WORKERS, thread_name_prefix="bcrypt")
+_dummy_password_hash = None
+
+
+def submit_password_task(name, func, *args):
+    """해시 작업을 전용 풀에 제출하고 Future 반환 (비동기 코드는 asyncio.wrap_future로 기다림)"""
+    submitted = time.perf_counter()
+    
+    def task():
+        started = time.perf_counter()
+        auth_metrics.record("queue_wait", (started - submitted) * 1000)
+        try:
+            return func(*args)
+        finally:
+            auth_metrics.record(name, (time.perf_counter() - started) * 1000)
+    
+    return _password_executor.submit(task)
+
+
+def _run_password_task(name, func, *args):
+    return submit_password_task(name, func, *args).result()
+
+
+def hash_password(password: str, rounds: int = None) -> str:
+    """bcrypt 해시 (비용: rounds 또는 BCRYPT_ROUNDS)"""
+    salt = bcrypt.gensalt(rounds=rounds or config.BCRYPT_ROUNDS)
+    return _run_password_task("hash", bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    return _run_password_task("verify", bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def password_needs_rehash(password_hash: str) -> bool:
+    """저장된 해시의 비용이 현재 BCRYPT_ROUNDS와 다른지 ($2b$<비용>$...)"""
+    try:
+        return int(password_hash.split('$')[2]) != config.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+def dummy_password_hash() -> str:
+    """없는 사용자 로그인 검증용 임의 해시 (처음 한 번만 계산)"""
+    global _dummy_password_hash
+    if _dummy_password_hash is None:
+        _dummy_password_hash = hash_password(os.urandom(16).hex())
+    return _dummy_password_hash
+
+
+def _verify_dummy_password(password: str):
+    """없는 사용자로 로그인해도 같은 만큼 시간이 걸리도록 임의 해시로 검증 (사용자명 노출 방지)"""
+    verify_password(password, dummy_password_hash())
+
 
 class User(Base):
     __tablename__ = 'users'
@@ -25,17 +176,21 @@ class User(Base):
     settings = Column(JSON, default={})  # Investment profile, theme, etc.
     
     portfolios = relationship("Portfolio", back_populates="user", cascade="all, delete-orphan")
+    trades = relationship("Trade", back_populates="user", cascade="all, delete-orphan")
     chat_logs = relationship("ChatLog", back_populates="user", cascade="all, delete-orphan")
 
     def set_password(self, password):
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return verify_password(password, self.password_hash)
 
 class Portfolio(Base):
     __tablename__ = 'portfolios'
+    __table_args__ = (
+        # 사용자당 종목 하나 (upsert 충돌 기준, user_id 조회도 이 인덱스 사용)
+        Index('uq_portfolios_user_ticker', 'user_id', 'ticker', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -46,8 +201,61 @@ class Portfolio(Base):
     
     user = relationship("User", back_populates="portfolios")
 
+class Trade(Base):
+    """매매 원장 - portfolios(현재 보유 현황)는 거래를 기록하는 트랜잭션에서 함께 갱신됨"""
+    __tablename__ = 'trades'
+    __table_args__ = (
+        # 기준일 보유 현황 집계 (사용자별 거래 시각 범위 조회)
+        Index('ix_trades_user_traded_at', 'user_id', 'traded_at'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    ticker = Column(String, nullable=False)
+    quantity = Column(Integer, nullable=False)  # 매수 +, 매도 -
+    price = Column(Float, nullable=False, default=0.0)
+    traded_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    user = relationship("User", back_populates="trades")
+
+class PortfolioSnapshot(Base):
+    """사용자별 일별 평가금액 (통화별 합계, 스냅샷 작업이 기록)"""
+    __tablename__ = 'portfolio_snapshots'
+    __table_args__ = (
+        # 사용자별 기간 조회 (평가금액 추이), 하루 한 행
+        Index('uq_portfolio_snapshots_user_date_currency', 'user_id', 'snapshot_date', 'currency', unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    snapshot_date = Column(Date, nullable=False)
+    currency = Column(String, nullable=False)
+    total_value = Column(Float, default=0.0)  # 평가금액
+    total_cost = Column(Float, default=0.0)   # 매입금액 (수량 x 평균 단가)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class PositionSnapshot(Base):
+    """사용자별 일별 종목 평가 (수량, 종가, 평균 단가)"""
+    __tablename__ = 'position_snapshots'
+    __table_args__ = (
+        Index('uq_position_snapshots_user_date_ticker', 'user_id', 'snapshot_date', 'ticker', unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    snapshot_date = Column(Date, nullable=False)
+    ticker = Column(String, nullable=False)
+    shares = Column(Integer, default=0)
+    price = Column(Float, default=0.0)
+    avg_price = Column(Float, default=0.0)
+    currency = Column(String, nullable=False)
+
 class ChatLog(Base):
     __tablename__ = 'chat_logs'
+    __table_args__ = (
+        # 사용자별 시간순 조회
+        Index('ix_chat_logs_user_timestamp', 'user_id', 'timestamp'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -57,91 +265,752 @@ class ChatLog(Base):
     
     user = relationship("User", back_populates="chat_logs")
 
+class ChatArchive(Base):
+    """오래된 대화 기록 보관본 - 사용자별 월 단위 메시지 묶음을 압축해 한 행에 저장"""
+    __tablename__ = 'chat_archives'
+    __table_args__ = (
+        # 사용자별 최근 보관본부터 조회 (대화 기록 페이지가 chat_logs에서 모자랄 때)
+        Index('ix_chat_archives_user_last_timestamp', 'user_id', 'last_timestamp'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    month = Column(String, nullable=False)  # 'YYYY-MM'
+    codec = Column(String, nullable=False)  # 'zstd' or 'zlib'
+    message_count = Column(Integer, nullable=False)
+    first_timestamp = Column(DateTime, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+    payload = Column(LargeBinary, nullable=False)  # [[id, role, content, timestamp], ...] JSON 압축
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+def compress_archive(data: bytes, codec: str = None):
+    """(사용한 codec, 압축 데이터) - zstd를 요청했지만 zstandard가 없으면 zlib 사용"""
+    codec = codec or config.CHAT_ARCHIVE_CODEC
+    if codec == "zstd" and zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+
+def decompress_archive(codec: str, payload: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(payload)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd로 압축된 대화 보관본을 읽으려면 zstandard 패키지가 필요합니다.")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    raise ValueError(f"알 수 없는 압축 방식: {codec}")
+
+
+def encode_chat_archive(logs) -> bytes:
+    return json.dumps(
+        [[log.id, log.role, log.content, log.timestamp.isoformat()] for log in logs], ensure_ascii=False
+    ).encode('utf-8')
+
+
+def decode_chat_archive(archive):
+    """보관본 -> ChatLog 객체 목록 (원래 id/timestamp 유지, 세션에 속하지 않음)"""
+    return [
+        ChatLog(id=log_id, user_id=archive.user_id, role=role, content=content,
+                timestamp=datetime.fromisoformat(timestamp))
+        for log_id, role, content, timestamp in json.loads(decompress_archive(archive.codec, archive.payload))
+    ]
+
+# 충돌 시 갱신(upsert)을 지원하는 dialect별 insert
+_UPSERT_INSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+
+# 동기/비동기 DBManager가 함께 쓰는 쿼리
+def position_buy_stmt(dialect_name, user_id, ticker, shares, avg_price):
+    """보유 현황 매수 반영 upsert (수량 합산, 평균 단가 가중 평균) - upsert 미지원 dialect면 None"""
+    insert = _UPSERT_INSERTS.get(dialect_name)
+    if insert is None:
+        return None
+    
+    stmt = insert(Portfolio).values(
+        user_id=user_id, ticker=ticker, shares=shares, avg_price=avg_price, updated_at=datetime.utcnow()
+    )
+    total_shares = Portfolio.shares + stmt.excluded.shares
+    return stmt.on_conflict_do_update(
+        index_elements=[Portfolio.user_id, Portfolio.ticker],
+        set_={
+            "shares": total_shares,
+            "avg_price": case(
+                (total_shares > 0,
+                 (Portfolio.shares * Portfolio.avg_price + stmt.excluded.shares * stmt.excluded.avg_price)
+                 / total_shares),
+                else_=0.0
+            ),
+            "updated_at": stmt.excluded.updated_at,
+        }
+    )
+
+
+def position_sell_stmts(user_id, ticker, shares):
+    """
+    보유 현황 매도 반영 (조건부 UPDATE, 수량이 0이 된 행 DELETE)
+    UPDATE의 영향 행 수가 0이면 보유 수량 부족
+    """
+    position = and_(Portfolio.user_id == user_id, Portfolio.ticker == ticker)
+    return (
+        update(Portfolio)
+        .where(position, Portfolio.shares >= shares)
+        .values(shares=Portfolio.shares - shares, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False),
+        delete(Portfolio).where(position, Portfolio.shares <= 0).execution_options(synchronize_session=False),
+    )
+
+
+def holdings_as_of_stmt(user_id, as_of):
+    """
+    기준일 보유 현황 집계 (as_of: datetime 또는 date, date면 그날 끝까지 포함)
+    
+    평균 단가는 portfolios와 같은 이동 평균 방식으로 종목별 거래를 시간순으로 따라가며 계산합니다.
+    (재귀 CTE) 매수는 가중 평균으로 단가를 갱신하고 매도는 단가를 바꾸지 않으며,
+    전량 매도로 수량이 0이 되면 다음 매수부터 단가를 새로 잡습니다.
+    """
+    if not isinstance(as_of, datetime):
+        as_of = datetime.combine(as_of, datetime.max.time())
+    ordered = (
+        select(
+            Trade.ticker, Trade.quantity, Trade.price,
+            func.row_number().over(partition_by=Trade.ticker, order_by=(Trade.traded_at, Trade.id)).label("n"),
+        )
+        .where(Trade.user_id == user_id, Trade.traded_at <= as_of)
+        .cte("ordered")
+    )
+    position = (
+        select(
+            ordered.c.ticker, ordered.c.n, ordered.c.quantity.label("shares"),
+            case((ordered.c.quantity > 0, ordered.c.price), else_=0.0).label("avg_price"),
+        )
+        .where(ordered.c.n == 1)
+        .cte("position", recursive=True)
+    )
+    previous = position.alias("previous")
+    shares = previous.c.shares + ordered.c.quantity
+    position = position.union_all(
+        select(
+            ordered.c.ticker, ordered.c.n, shares,
+            case(
+                (ordered.c.quantity > 0,
+                 (previous.c.shares * previous.c.avg_price + ordered.c.quantity * ordered.c.price) / shares),
+                (shares <= 0, 0.0),
+                else_=previous.c.avg_price
+            ),
+        )
+        .select_from(previous.join(
+            ordered, and_(ordered.c.ticker == previous.c.ticker, ordered.c.n == previous.c.n + 1)
+        ))
+    )
+    last = select(ordered.c.ticker, func.max(ordered.c.n).label("n")).group_by(ordered.c.ticker).subquery("last")
+    return (
+        select(position.c.ticker, position.c.shares, position.c.avg_price)
+        .join(last, and_(last.c.ticker == position.c.ticker, last.c.n == position.c.n))
+        .where(position.c.shares > 0)
+        .order_by(position.c.ticker)
+    )
+
+
+def holdings_from_rows(rows):
+    return [
+        {"ticker": row.ticker, "shares": int(row.shares), "avg_price": float(row.avg_price or 0.0)}
+        for row in rows
+    ]
+
+
+def chat_page_stmt(user_id, limit, before=None):
+    """before 커서보다 오래된 메시지 중 최근 limit + 1개 (최신 순, 한 개 더 읽어 이전 페이지 여부 판단)"""
+    conditions = [ChatLog.user_id == user_id]
+    if before is not None:
+        before_timestamp, before_id = before
+        if before_id is None:
+            conditions.append(ChatLog.timestamp < before_timestamp)
+        else:
+            conditions.append(or_(
+                ChatLog.timestamp < before_timestamp,
+                and_(ChatLog.timestamp == before_timestamp, ChatLog.id < before_id)
+            ))
+    return (
+        select(ChatLog).where(*conditions)
+        .order_by(ChatLog.timestamp.desc(), ChatLog.id.desc())
+        .limit(limit + 1)
+    )
+
+
+def _is_before(message, before):
+    before_timestamp, before_id = before
+    if before_id is None:
+        return message.timestamp < before_timestamp
+    return (message.timestamp, message.id) < (before_timestamp, before_id)
+
+
+def archive_index_stmt(user_id, before=None):
+    """before 커서 이전 메시지가 있는 보관본 목록 (최신 순, 압축 본문 제외)"""
+    stmt = select(ChatArchive.id, ChatArchive.message_count).where(ChatArchive.user_id == user_id)
+    if before is not None:
+        stmt = stmt.where(ChatArchive.first_timestamp <= before[0])
+    return stmt.order_by(ChatArchive.last_timestamp.desc(), ChatArchive.id.desc())
+
+
+def select_archive_ids(index_rows, needed):
+    """
+    메시지 needed개를 채우는 데 필요한 최근 보관본 id
+    첫 보관본은 커서에 걸쳐 일부만 쓰일 수 있으므로 개수에 넣지 않음
+    """
+    archive_ids, collected = [], 0
+    for position, (archive_id, message_count) in enumerate(index_rows):
+        if collected >= needed:
+            break
+        archive_ids.append(archive_id)
+        if position > 0:
+            collected += message_count
+    return archive_ids
+
+
+def archived_messages(archives, before=None):
+    """보관본을 풀어 before 이전 메시지만 오래된 순으로 반환"""
+    messages = [message for archive in archives for message in decode_chat_archive(archive)]
+    if before is not None:
+        messages = [message for message in messages if _is_before(message, before)]
+    return sorted(messages, key=lambda message: (message.timestamp, message.id))
+
+
+def merge_pending(rows, pending, before=None):
+    """
+    DB에서 읽은 메시지(오래된 순)와 조회 전에 찍어 둔 저장 대기 스냅샷을 합침
+    
+    스냅샷 이후 조회 사이에 저장된 메시지는 양쪽에 다 있으므로 DB 쪽만 남깁니다.
+    """
+    if before is not None:
+        pending = [message for message in pending if message.timestamp < before[0]]
+    stored = {(message.timestamp, message.role, message.content) for message in rows}
+    pending = [message for message in pending if (message.timestamp, message.role, message.content) not in stored]
+    if not pending:
+        return list(rows)
+    return sorted(list(rows) + pending, key=lambda message: message.timestamp)
+
+
+def chat_page_result(messages, limit):
+    """오래된 순 메시지(limit + 1개까지)를 (페이지, 이전 페이지 커서)로 변환"""
+    has_older = len(messages) > limit
+    messages = messages[-limit:] if limit > 0 else []
+    cursor = (messages[0].timestamp, messages[0].id) if has_older and messages else None
+    return messages, cursor
+
 # Initialize Database
 def init_db():
     Base.metadata.create_all(engine)
+    migrate_db()
+
+
+def migrate_db():
+    """
+    기존 DB 스키마 보강 (여러 번 실행해도 안전)
+    
+    - 중복된 (user_id, ticker) 포트폴리오 행을 수량 합계/가중 평균 단가로 합친 뒤
+    - 거래 원장이 없는 보유 종목은 시작 거래로 원장에 기록 (원장 합계 = 보유 현황)
+    - create_all이 기존 테이블에는 만들지 않는 인덱스(고유 인덱스 포함)를 생성
+    """
+    with session_scope() as session:
+        duplicates = (
+            session.query(Portfolio.user_id, Portfolio.ticker)
+            .group_by(Portfolio.user_id, Portfolio.ticker)
+            .having(func.count(Portfolio.id) > 1)
+            .all()
+        )
+        for user_id, ticker in duplicates:
+            items = session.query(Portfolio).filter_by(user_id=user_id, ticker=ticker).order_by(Portfolio.id).all()
+            keep = items[0]
+            total_shares = sum(item.shares or 0 for item in items)
+            total_cost = sum((item.shares or 0) * (item.avg_price or 0) for item in items)
+            keep.shares = total_shares
+            keep.avg_price = total_cost / total_shares if total_shares > 0 else 0
+            for item in items[1:]:
+                session.delete(item)
+    
+    with session_scope() as session:
+        untracked = session.query(Portfolio).filter(
+            ~exists().where(and_(Trade.user_id == Portfolio.user_id, Trade.ticker == Portfolio.ticker))
+        ).all()
+        for item in untracked:
+            if item.shares:
+                session.add(Trade(
+                    user_id=item.user_id, ticker=item.ticker, quantity=item.shares,
+                    price=item.avg_price or 0.0, traded_at=item.updated_at or datetime.utcnow()
+                ))
+    
+    for table in (Portfolio.__table__, Trade.__table__, PortfolioSnapshot.__table__,
+                  PositionSnapshot.__table__, ChatLog.__table__, ChatArchive.__table__):
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+class ChatLogWriter:
+    """
+    채팅 로그 지연 쓰기(write-behind) 큐
+    
+    add()는 메모리 큐에 넣고 바로 반환하며, 백그라운드 스레드가 CHAT_FLUSH_INTERVAL마다
+    (또는 CHAT_FLUSH_BATCH_SIZE개가 쌓이면) 모아서 한 트랜잭션으로 저장합니다.
+    아직 저장되지 않은 메시지는 pending_for()로 조회해 방금 쓴 내용을 바로 읽을 수 있고,
+    프로세스 종료 시 atexit에서 남은 메시지를 저장합니다.
+    
+    DB 쓰기 중에는 잠금을 잡지 않습니다. flush는 대기 행을 저장 중 목록으로 옮겨 쓰고, 커밋한 뒤에
+    목록에서 지우므로 행은 언제나 대기/저장 중 목록이나 DB 중 한 곳 이상에 있습니다.
+    읽는 쪽은 pending_for() 스냅샷을 먼저 찍고 DB를 조회한 뒤 merge_pending()으로 합치면 됩니다.
+    """
+    
+    def __init__(self, interval: float = config.CHAT_FLUSH_INTERVAL, batch_size: int = config.CHAT_FLUSH_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._pending = []   # 저장 대기 중인 행 (추가 순서 유지)
+        self._inflight = []  # flush가 가져가 저장 중인 행 (커밋 후 제거)
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+    
+    def add(self, user_id, role, content):
+        """메시지를 대기 목록에 추가하고 저장될 timestamp 반환"""
+        row = {"user_id": user_id, "role": role, "content": content, "timestamp": datetime.utcnow()}
+        with self._condition:
+            self._pending.append(row)
+            if self._thread is None:
+                self._start()
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+        return row["timestamp"]
+    
+    def pending_for(self, user_id):
+        """아직 커밋되지 않은 사용자 메시지 (저장 중 포함, ChatLog 객체, 오래된 순)"""
+        with self._condition:
+            return [ChatLog(**row) for row in self._inflight + self._pending if row["user_id"] == user_id]
+    
+    def discard(self, user_id):
+        """
+        사용자의 저장 대기 메시지 버리기 (대화 기록 삭제 시)
+        
+        이미 저장 중인 행은 커밋이 끝날 때까지 기다려, 이후의 DB 삭제보다 늦게 써지지 않게 합니다.
+        """
+        with self._condition:
+            self._pending = [row for row in self._pending if row["user_id"] != user_id]
+            self._condition.wait_for(lambda: all(row["user_id"] != user_id for row in self._inflight))
+            # 저장에 실패해 대기 목록으로 돌아온 행도 버림
+            self._pending = [row for row in self._pending if row["user_id"] != user_id]
+    
+    def flush(self):
+        """대기 중인 메시지를 한 트랜잭션으로 저장하고 저장한 개수 반환 (DB 쓰기 중에는 잠금을 잡지 않음)"""
+        with self._condition:
+            batch, self._pending = self._pending, []
+            self._inflight.extend(batch)
+        if not batch:
+            return 0
+        try:
+            try:
+                self._write(batch)
+            except IntegrityError:
+                # 잘못된 행 하나 때문에 묶음 전체가 계속 실패하지 않도록 행 단위로 다시 저장하고 실패한 행은 버림
+                for row in batch:
+                    try:
+                        self._write([row])
+                    except IntegrityError as e:
+                        print(f"⚠️ 채팅 로그 저장 불가로 버림 (user_id={row['user_id']}): {e.orig}")
+        except Exception:
+            # 일시적 오류면 다음 flush에서 다시 저장하도록 대기 목록 앞에 되돌림
+            with self._condition:
+                self._pending[:0] = batch
+            raise
+        finally:
+            written = {id(row) for row in batch}
+            with self._condition:
+                self._inflight = [row for row in self._inflight if id(row) not in written]
+                self._condition.notify_all()
+        return len(batch)
+    
+    def _write(self, rows):
+        with session_scope() as session:
+            session.execute(ChatLog.__table__.insert(), rows)
+    
+    def close(self):
+        """백그라운드 스레드를 멈추고 남은 메시지 저장"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=max(5.0, self.interval * 2))
+        self.flush()
+    
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="chat-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._stopped or len(self._pending) >= self.batch_size, timeout=self.interval
+                )
+                if self._stopped:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                # 일시적 오류(잠금 등)면 대기 목록에 남아 다음 주기에 다시 시도
+                print(f"⚠️ 채팅 로그 저장 실패: {e}")
+
+
+chat_log_writer = ChatLogWriter()
 
 # Data Access Layer
 class DBManager:
-    def __init__(self):
-        self.session = Session()
+    """
+    데이터 접근 계층
     
+    세션을 오래 들고 있지 않고 메서드 호출마다 session_scope()로 열고 닫습니다.
+    반환하는 ORM 객체는 세션과 분리된 상태이며, 읽어 둔 컬럼 값은 그대로 사용할 수 있습니다.
+    """
     def close(self):
-        self.session.close()
+        """하위 호환용 (세션은 작업마다 닫히므로 할 일 없음)"""
 
     # User Methods
     def create_user(self, username, password, initial_profile="moderate"):
-        if self.get_user(username):
-            return None, "이미 존재하는 사용자명입니다."
-        
-        new_user = User(username=username, settings={"profile": initial_profile})
-        new_user.set_password(password)
-        self.session.add(new_user)
+        started = time.perf_counter()
         try:
-            self.session.commit()
-            return new_user, None
-        except Exception as e:
-            self.session.rollback()
-            return None, str(e)
+            if self.get_user(username):
+                return None, "이미 존재하는 사용자명입니다."
+            
+            new_user = User(username=username, settings={"profile": initial_profile})
+            new_user.set_password(password)
+            try:
+                with session_scope() as session:
+                    session.add(new_user)
+                return new_user, None
+            except IntegrityError:
+                # 동시에 같은 이름으로 가입한 경우
+                return None, "이미 존재하는 사용자명입니다."
+            except Exception as e:
+                return None, str(e)
+        finally:
+            auth_metrics.record("signup", (time.perf_counter() - started) * 1000)
 
     def login_user(self, username, password):
-        user = self.get_user(username)
-        if user and user.check_password(password):
+        started = time.perf_counter()
+        try:
+            user = self.get_user(username)
+            if user is None:
+                _verify_dummy_password(password)
+                return None
+            if not user.check_password(password):
+                return None
+            
+            # 해시 비용 설정이 바뀌었으면 평문 비밀번호를 알고 있는 지금 다시 해시
+            if password_needs_rehash(user.password_hash):
+                user.set_password(password)
+                with session_scope() as session:
+                    session.query(User).filter_by(id=user.id).update({"password_hash": user.password_hash})
             return user
-        return None
+        finally:
+            auth_metrics.record("login", (time.perf_counter() - started) * 1000)
+
+    def get_auth_metrics(self):
+        """로그인/가입/해시 단계별 지연 시간 요약 (AuthMetrics.summary)"""
+        return auth_metrics.summary()
 
     def get_user(self, username):
-        return self.session.query(User).filter_by(username=username).first()
+        with session_scope() as session:
+            return session.query(User).filter_by(username=username).first()
 
     def update_user_profile(self, user_id, profile):
-        user = self.session.query(User).filter_by(id=user_id).first()
-        if user:
-            settings = dict(user.settings) if user.settings else {}
-            settings['profile'] = profile
-            user.settings = settings
-            self.session.commit()
-            return True
-        return False
+        with session_scope() as session:
+            user = session.query(User).filter_by(id=user_id).first()
+            if user:
+                settings = dict(user.settings) if user.settings else {}
+                settings['profile'] = profile
+                user.settings = settings
+                return True
+            return False
 
     # Portfolio Methods
     def get_portfolio(self, user_id):
-        return self.session.query(Portfolio).filter_by(user_id=user_id).all()
+        with session_scope() as session:
+            return session.query(Portfolio).filter_by(user_id=user_id).all()
+
+    def add_to_portfolio(self, user_id, ticker, shares, avg_price=0, traded_at=None):
+        """종목 매수 기록 - 이미 있으면 수량을 더하고 평균 단가를 가중 평균으로 갱신"""
+        self.record_trade(user_id, ticker, shares, avg_price, traded_at)
+
+    def record_trade(self, user_id, ticker, shares, price=0, traded_at=None):
+        """
+        거래 기록 - 원장 추가와 보유 현황 갱신을 한 트랜잭션으로 처리
+        
+        Args:
+            shares: 매수는 양수, 매도는 음수
+            price: 체결 단가 (매도는 평균 단가를 바꾸지 않음)
+            traded_at: 거래 시각 (기본: 지금)
+        
+        Raises:
+            ValueError: 수량이 0이거나 보유 수량보다 많이 매도하는 경우
+        """
+        if not shares:
+            raise ValueError("거래 수량은 0이 될 수 없습니다.")
+        
+        with session_scope() as session:
+            session.add(Trade(
+                user_id=user_id, ticker=ticker, quantity=shares, price=price or 0.0,
+                traded_at=traded_at or datetime.utcnow()
+            ))
+            if shares > 0:
+                self._apply_buy(session, user_id, ticker, shares, price or 0.0)
+            else:
+                self._apply_sell(session, user_id, ticker, -shares)
 
-    def add_to_portfolio(self, user_id, ticker, shares, avg_price=0):
+    def _apply_buy(self, session, user_id, ticker, shares, avg_price):
+        """보유 현황에 매수 반영 (INSERT ... ON CONFLICT DO UPDATE 한 문장으로 원자적 처리)"""
+        stmt = position_buy_stmt(engine.dialect.name, user_id, ticker, shares, avg_price)
+        if stmt is None:
+            return self._apply_buy_fallback(session, user_id, ticker, shares, avg_price)
+        session.execute(stmt)
+
+    def _apply_buy_fallback(self, session, user_id, ticker, shares, avg_price):
+        """upsert를 지원하지 않는 DB용 (조회 후 갱신)"""
         # Check if exists
-        item = self.session.query(Portfolio).filter_by(user_id=user_id, ticker=ticker).first()
+        item = session.query(Portfolio).filter_by(user_id=user_id, ticker=ticker).with_for_update().first()
         if item:
-            # Update average price logic could be complex, simple implementation for now
             total_cost = (item.shares * item.avg_price) + (shares * avg_price)
             total_shares = item.shares + shares
             item.shares = total_shares
             item.avg_price = total_cost / total_shares if total_shares > 0 else 0
         else:
             item = Portfolio(user_id=user_id, ticker=ticker, shares=shares, avg_price=avg_price)
-            self.session.add(item)
-        
-        self.session.commit()
+            session.add(item)
 
-    def remove_from_portfolio(self, user_id, ticker):
-        self.session.query(Portfolio).filter_by(user_id=user_id, ticker=ticker).delete()
-        self.session.commit()
+    def _apply_sell(self, session, user_id, ticker, shares):
+        """보유 현황에 매도 반영 - 조건부 UPDATE로 보유 수량 확인과 차감을 원자적으로 처리"""
+        update_stmt, cleanup_stmt = position_sell_stmts(user_id, ticker, shares)
+        if not session.execute(update_stmt).rowcount:
+            raise ValueError("보유 수량보다 많이 매도할 수 없습니다.")
+        session.execute(cleanup_stmt)
+
+    def remove_from_portfolio(self, user_id, ticker, price=None):
+        """보유 종목 전량 매도로 기록하고 삭제 (price가 없으면 평균 단가로 기록)"""
+        with session_scope() as session:
+            item = session.query(Portfolio).filter_by(user_id=user_id, ticker=ticker).first()
+            if item is None:
+                return
+            if item.shares:
+                session.add(Trade(
+                    user_id=user_id, ticker=ticker, quantity=-item.shares,
+                    price=item.avg_price if price is None else price, traded_at=datetime.utcnow()
+                ))
+            session.delete(item)
         
     def clear_portfolio(self, user_id):
-        self.session.query(Portfolio).filter_by(user_id=user_id).delete()
-        self.session.commit()
+        """보유 현황과 거래 원장 모두 삭제"""
+        with session_scope() as session:
+            session.query(Portfolio).filter_by(user_id=user_id).delete()
+            session.query(Trade).filter_by(user_id=user_id).delete()
+
+    def get_trades(self, user_id, ticker=None, limit=100):
+        """최근 거래 목록 (최신 순)"""
+        with session_scope() as session:
+            query = session.query(Trade).filter_by(user_id=user_id)
+            if ticker:
+                query = query.filter_by(ticker=ticker)
+            return query.order_by(Trade.traded_at.desc(), Trade.id.desc()).limit(limit).all()
+
+    def get_holdings_as_of(self, user_id, as_of):
+        """
+        기준일 시점 보유 현황 - 원장을 SQL 한 문장으로 계산 (Python에서 거래를 재생하지 않음)
+        
+        Args:
+            as_of: datetime 또는 date (date면 그날 장 마감까지 포함)
+        
+        Returns:
+            [{"ticker", "shares", "avg_price"}] - avg_price는 기준일 시점 portfolios와 같은 이동 평균 단가
+        """
+        with session_scope() as session:
+            rows = session.execute(holdings_as_of_stmt(user_id, as_of)).all()
+        return holdings_from_rows(rows)
+
+    # Snapshot Methods
+    def get_all_positions(self):
+        """전체 사용자 보유 종목 (스냅샷 작업용)"""
+        with session_scope() as session:
+            return session.query(Portfolio).filter(Portfolio.shares > 0).all()
+
+    def get_last_snapshot_prices(self, tickers):
+        """종목별 가장 최근 스냅샷 종가 (현재가 조회에 실패한 종목 평가용)"""
+        if not tickers:
+            return {}
+        latest = (
+            select(PositionSnapshot.ticker, func.max(PositionSnapshot.snapshot_date).label("snapshot_date"))
+            .where(PositionSnapshot.ticker.in_(tickers))
+            .group_by(PositionSnapshot.ticker)
+            .subquery()
+        )
+        with session_scope() as session:
+            rows = (
+                session.query(PositionSnapshot.ticker, PositionSnapshot.price)
+                .join(latest, and_(PositionSnapshot.ticker == latest.c.ticker,
+                                   PositionSnapshot.snapshot_date == latest.c.snapshot_date))
+                .all()
+            )
+        return {ticker: price for ticker, price in rows}
+
+    def save_snapshots(self, snapshot_date, positions, user_ids=None):
+        """
+        일별 스냅샷 저장 - 같은 날짜를 다시 저장하면 덮어씀 (한 트랜잭션)
+        
+        Args:
+            snapshot_date: 기준일 (date)
+            positions: [{"user_id", "ticker", "shares", "price", "avg_price", "currency"}]
+            user_ids: 덮어쓸 사용자 (기본: positions에 있는 사용자)
+        """
+        user_ids = set(user_ids) if user_ids is not None else {position["user_id"] for position in positions}
+        totals = {}
+        for position in positions:
+            key = (position["user_id"], position["currency"])
+            value, cost = totals.get(key, (0.0, 0.0))
+            totals[key] = (
+                value + position["shares"] * position["price"],
+                cost + position["shares"] * position["avg_price"],
+            )
+        
+        with session_scope() as session:
+            for model in (PositionSnapshot, PortfolioSnapshot):
+                session.query(model).filter(
+                    model.snapshot_date == snapshot_date, model.user_id.in_(user_ids)
+                ).delete(synchronize_session=False)
+            if positions:
+                session.execute(PositionSnapshot.__table__.insert(), [
+                    dict(position, snapshot_date=snapshot_date) for position in positions
+                ])
+            if totals:
+                session.execute(PortfolioSnapshot.__table__.insert(), [
+                    {"user_id": user_id, "currency": currency, "snapshot_date": snapshot_date,
+                     "total_value": value, "total_cost": cost, "created_at": datetime.utcnow()}
+                    for (user_id, currency), (value, cost) in totals.items()
+                ])
+
+    def get_latest_snapshot_date(self):
+        with session_scope() as session:
+            return session.query(func.max(PortfolioSnapshot.snapshot_date)).scalar()
+
+    def get_last_snapshot_at(self, user_id):
+        """사용자 스냅샷이 마지막으로 저장된 시각 (없으면 None) - 스케줄러/cron이 저장한 스냅샷 감지용"""
+        with session_scope() as session:
+            return session.query(func.max(PortfolioSnapshot.created_at)).filter(
+                PortfolioSnapshot.user_id == user_id
+            ).scalar()
+
+    def get_equity_curve(self, user_id, start_date=None):
+        """일별 평가금액 추이 (날짜 순, 통화별 행) - (user_id, snapshot_date) 인덱스 조회 한 번"""
+        with session_scope() as session:
+            query = session.query(PortfolioSnapshot).filter(PortfolioSnapshot.user_id == user_id)
+            if start_date is not None:
+                query = query.filter(PortfolioSnapshot.snapshot_date >= start_date)
+            return query.order_by(PortfolioSnapshot.snapshot_date, PortfolioSnapshot.currency).all()
 
     # Chat History Methods
     def add_chat_message(self, user_id, role, content):
-        msg = ChatLog(user_id=user_id, role=role, content=content)
-        self.session.add(msg)
-        self.session.commit()
+        """메시지를 저장 큐에 넣고 바로 반환 (디스크 쓰기는 chat_log_writer가 모아서 처리)"""
+        return chat_log_writer.add(user_id, role, content)
 
     def get_chat_history(self, user_id, limit=50):
-        return self.session.query(ChatLog).filter_by(user_id=user_id).order_by(ChatLog.timestamp.asc()).limit(limit).all()
+        """최근 메시지 limit개 (오래된 순)"""
+        messages, _ = self.get_chat_page(user_id, limit=limit)
+        return messages
+
+    def get_chat_page(self, user_id, limit=config.CHAT_PAGE_SIZE, before=None):
+        """
+        대화 기록 한 페이지 조회 (키셋 페이지네이션)
+        
+        (timestamp, id) 순서로 before 커서보다 오래된 메시지 중 최근 limit개를 가져오므로
+        OFFSET 없이 (user_id, timestamp) 인덱스만 타고, 앞 페이지가 아무리 길어도 비용이 같습니다.
+        
+        Args:
+            before: 이전 페이지가 돌려준 커서 (timestamp, id), None이면 가장 최근 페이지
+                    id가 None이면 timestamp만 비교 (아직 저장되지 않은 메시지 기준 커서)
+        
+        Returns:
+            (메시지 목록 [ChatLog] 오래된 순, 더 이전 페이지 커서 또는 None)
+        """
+        # 저장 대기 중인 메시지(가장 최근)도 합쳐서 방금 추가한 메시지가 바로 보이도록 함
+        # (스냅샷을 조회보다 먼저 찍어야 그 사이 저장된 메시지가 빠지지 않음)
+        pending = chat_log_writer.pending_for(user_id)
+        with session_scope() as session:
+            rows = session.execute(chat_page_stmt(user_id, limit, before)).scalars().all()
+            # chat_logs로 페이지를 못 채우면 더 오래된 압축 보관본에서 이어서 읽음
+            archived = []
+            if len(rows) <= limit:
+                index_rows = session.execute(archive_index_stmt(user_id, before)).all()
+                archive_ids = select_archive_ids(index_rows, limit + 1 - len(rows))
+                if archive_ids:
+                    archives = session.query(ChatArchive).filter(ChatArchive.id.in_(archive_ids)).all()
+                    archived = archived_messages(archives, before)
+        return chat_page_result(archived + merge_pending(rows[::-1], pending, before), limit)
 
     def clear_chat_history(self, user_id):
-        self.session.query(ChatLog).filter_by(user_id=user_id).delete()
-        self.session.commit()
+        chat_log_writer.discard(user_id)
+        with session_scope() as session:
+            session.query(ChatLog).filter_by(user_id=user_id).delete()
+            session.query(ChatArchive).filter_by(user_id=user_id).delete()
+
+    def archive_chat_logs(self, older_than_days=config.CHAT_ARCHIVE_AFTER_DAYS, codec=None):
+        """
+        older_than_days보다 오래된 대화 기록을 사용자별 월 단위로 압축해 chat_archives로 옮김
+        
+        사용자/월마다 한 트랜잭션으로 보관본 추가와 원본 삭제를 함께 처리하므로
+        중간에 실패해도 메시지가 빠지거나 중복되지 않습니다. 보관된 메시지는 get_chat_history/
+        get_chat_page에서 그대로 조회됩니다.
+        
+        Returns:
+            {"archives", "messages", "raw_bytes", "compressed_bytes"}
+        """
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        stats = {"archives": 0, "messages": 0, "raw_bytes": 0, "compressed_bytes": 0}
+        
+        with session_scope() as session:
+            user_ids = [
+                user_id for (user_id,) in
+                session.query(ChatLog.user_id).filter(ChatLog.timestamp < cutoff).distinct().all()
+            ]
+        
+        for user_id in user_ids:
+            while True:
+                with session_scope() as session:
+                    oldest = session.query(func.min(ChatLog.timestamp)).filter(
+                        ChatLog.user_id == user_id, ChatLog.timestamp < cutoff
+                    ).scalar()
+                    if oldest is None:
+                        break
+                    month_start = oldest.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+                    month_end = min((month_start + timedelta(days=32)).replace(day=1), cutoff)
+                    logs = (
+                        session.query(ChatLog)
+                        .filter(ChatLog.user_id == user_id, ChatLog.timestamp >= month_start,
+                                ChatLog.timestamp < month_end)
+                        .order_by(ChatLog.timestamp, ChatLog.id)
+                        .all()
+                    )
+                    raw = encode_chat_archive(logs)
+                    used_codec, payload = compress_archive(raw, codec)
+                    session.add(ChatArchive(
+                        user_id=user_id, month=month_start.strftime("%Y-%m"), codec=used_codec,
+                        message_count=len(logs), first_timestamp=logs[0].timestamp,
+                        last_timestamp=logs[-1].timestamp, payload=payload
+                    ))
+                    log_ids = [log.id for log in logs]
+                    for start in range(0, len(log_ids), 500):
+                        session.query(ChatLog).filter(ChatLog.id.in_(log_ids[start:start + 500])).delete(
+                            synchronize_session=False
+                        )
+                
+                stats["archives"] += 1
+                stats["messages"] += len(logs)
+                stats["raw_bytes"] += len(raw)
+                stats["compressed_bytes"] += len(payload)
+        return stats
 
 # Initialize on import
 init_db()
@@ -0,0 +1,27 @@
+"""
+LLM 클라이언트 공유
+같은 모델/설정의 클라이언트를 프로세스 안에서 재사용해 호출마다 새 HTTP 연결 풀을 만들지 않습니다.
+Streamlit 밖(스크립트, 백그라운드 작업)에서도 쓰이므로 st.cache_resource 대신 lru_cache로 공유합니다.
+"""
+from functools import lru_cache
+
+import config
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(model: str, temperature: float = None):
+    """ChatOpenAI 클라이언트 (temperature를 지원하지 않는 모델은 None으로 호출)"""
+    from langchain_openai import ChatOpenAI
+    
+    options = {"model": model, "api_key": config.OPENAI_API_KEY}
+    if temperature is not None:
+        options["temperature"] = temperature
+    return ChatOpenAI(**options)
+
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    """OpenAI SDK 클라이언트 (음성 인식/합성용)"""
+    from openai import OpenAI
+    
+    return OpenAI(api_key=config.OPENAI_API_KEY)
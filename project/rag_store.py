@@ -0,0 +1,456 @@
+"""
+Persistent Document Store for Finsearcher
+SQLite FTS5 기반 사용자 문서 영구 저장소 - 동일한 파일은 내용 해시로 사용자 간 공유합니다.
+"""
+import sqlite3
+import hashlib
+import threading
+from typing import List, Dict, Optional, Tuple
+import config
+from rag_utils import (
+    BaseDocumentStore, DocumentStore, VectorIndex, ProgressCallback,
+    ChunkSpan, TextBuffer, NO_TEXT_MESSAGE, iter_document_pages, iter_structured_chunks,
+    tokenize, embed_texts, embeddings_available, np
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    content_hash TEXT PRIMARY KEY,
+    chunk_count INTEGER NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS document_pages (
+    doc_hash TEXT NOT NULL REFERENCES documents(content_hash),
+    page INTEGER NOT NULL,
+    start_offset INTEGER NOT NULL,
+    end_offset INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (doc_hash, page)
+);
+CREATE INDEX IF NOT EXISTS ix_document_pages_end ON document_pages(doc_hash, end_offset);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    doc_hash TEXT NOT NULL REFERENCES documents(content_hash),
+    idx INTEGER NOT NULL,
+    page INTEGER,
+    start_offset INTEGER,
+    end_offset INTEGER,
+    byte_start INTEGER,
+    byte_end INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_chunks_doc ON chunks(doc_hash, idx);
+CREATE TABLE IF NOT EXISTS chunk_embeddings (
+    chunk_id INTEGER PRIMARY KEY REFERENCES chunks(id),
+    vector BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_documents (
+    user_id INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    doc_hash TEXT NOT NULL REFERENCES documents(content_hash),
+    added_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, filename)
+);
+CREATE INDEX IF NOT EXISTS ix_user_documents_hash ON user_documents(doc_hash);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunk_fts USING fts5(tokens, tokenize='unicode61');
+"""
+
+# DB 파일별 공유 연결 (Streamlit 세션 스레드 간 공유, 쓰기는 락으로 직렬화)
+_connections: Dict[str, Tuple[sqlite3.Connection, threading.RLock]] = {}
+_connections_lock = threading.Lock()
+
+# 이 프로세스에서 색인 중인 문서 해시 (complete = 0인데 여기에 없으면 중단된 색인)
+_ingesting: set = set()
+_ingesting_lock = threading.Lock()
+
+
+def _get_connection(db_path: str) -> Tuple[sqlite3.Connection, threading.RLock]:
+    """DB 파일별 연결을 한 번만 열고 스키마를 준비"""
+    with _connections_lock:
+        if db_path not in _connections:
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            _connections[db_path] = (conn, threading.RLock())
+        return _connections[db_path]
+
+
+def _slice_pages(pages: List[Tuple[int, str]], start: int, end: int) -> str:
+    """연속된 페이지 [(시작 오프셋, 텍스트), ...]에서 [start, end) 구간 텍스트"""
+    if not pages:
+        return ""
+    base = pages[0][0]
+    return "".join(text for _, text in pages)[start - base:end - base]
+
+
+def content_hash(file_bytes: bytes) -> str:
+    """파일 내용 해시 (중복 업로드 판별용)"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def _fts_query(query: str) -> Optional[str]:
+    """검색어를 FTS5 OR 질의로 변환 (토큰마다 따옴표로 감싸 연산자 해석 방지)"""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return None
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+class PersistentDocumentStore(BaseDocumentStore):
+    """
+    사용자별 영구 문서 저장소
+    
+    - 문서 본문/청크/FTS5 색인은 내용 해시 기준으로 한 번만 저장 (사용자 간 공유)
+    - 본문은 document_pages에 페이지 단위로 한 벌만 두고, 청크는 본문 오프셋만 저장해 필요할 때 잘라 읽음
+    - 사용자는 (파일명 → 내용 해시) 참조만 가지며, 청크는 검색 시 필요한 것만 DB에서 읽음
+    - 임베딩 벡터 색인은 첫 의미 검색 때 DB에 저장된 벡터로 구성
+    - 새 문서는 청크가 만들어지는 대로 config.DOCUMENT_COMMIT_CHUNKS개씩 커밋하므로 색인 중에도 검색됨
+    """
+    def __init__(self, user_id: int, db_path: str = None, use_embeddings: Optional[bool] = None):
+        """
+        Args:
+            user_id: 사용자 ID
+            db_path: SQLite 파일 경로 (기본: config.DOCUMENT_DB)
+            use_embeddings: 임베딩 벡터 색인 사용 여부 (None이면 numpy와 API 키가 있을 때 사용)
+        """
+        self.user_id = user_id
+        self.conn, self._lock = _get_connection(db_path or config.DOCUMENT_DB)
+        self.use_embeddings = embeddings_available() if use_embeddings is None else use_embeddings
+        # 벡터 색인은 지연 로딩하고 문서가 바뀌면 버림 (st.cache_resource로 여러 세션/색인 스레드가 공유하므로 락 사용)
+        self._vector_index: Optional[VectorIndex] = None
+        self._vector_index_version = 0
+        self._vector_index_lock = threading.Lock()
+    
+    def _user_hashes_sql(self) -> str:
+        return "SELECT DISTINCT doc_hash FROM user_documents WHERE user_id = ?"
+    
+    def _fetch(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """읽기 질의 (다른 세션의 쓰기 트랜잭션과 겹치지 않도록 락 사용)"""
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+    
+    def _fetch_one(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        rows = self._fetch(sql, params)
+        return rows[0] if rows else None
+    
+    def add_document(self, filename: str, file_bytes: bytes,
+                     progress: ProgressCallback = None) -> Tuple[bool, str]:
+        """
+        문서 추가 (이미 저장된 내용이면 파싱/청킹/색인 없이 참조만 추가)
+        
+        새 문서는 먼저 미완료(complete = 0)로 등록해 사용자에게 연결한 뒤, 청크가 만들어지는 대로
+        config.DOCUMENT_COMMIT_CHUNKS개씩 커밋합니다. 처리 중 실패하면 그때까지 저장한 내용을 지웁니다.
+        
+        Returns:
+            (성공여부, 메시지)
+        """
+        try:
+            doc_hash = content_hash(file_bytes)
+            with _ingesting_lock, self._lock, self.conn:
+                row = self.conn.execute(
+                    "SELECT chunk_count, complete FROM documents WHERE content_hash = ?", (doc_hash,)
+                ).fetchone()
+                if row is not None and not row[1] and doc_hash not in _ingesting:
+                    # 이전 프로세스에서 색인 도중 중단된 문서는 지우고 다시 색인
+                    self._purge_document(doc_hash)
+                    row = None
+                if row is None:
+                    self.conn.execute(
+                        "INSERT INTO documents (content_hash, chunk_count, complete) VALUES (?, 0, 0)", (doc_hash,)
+                    )
+                    _ingesting.add(doc_hash)
+                self._link(filename, doc_hash)
+            self._invalidate_vector_index()
+            
+            if row is not None:
+                # 같은 파일을 다른 세션이 색인 중이면 완료되는 대로 함께 보임
+                return True, f"'{filename}' 문서가 추가되었습니다. ({row[0]}개 청크, 기존 색인 재사용)"
+            
+            try:
+                chunk_count = self._ingest(doc_hash, iter_document_pages(filename, file_bytes, progress))
+            except Exception as e:
+                with self._lock, self.conn:
+                    self._purge_document(doc_hash)
+                self._invalidate_vector_index()
+                if isinstance(e, ValueError):
+                    return False, str(e)
+                raise
+            finally:
+                with _ingesting_lock:
+                    _ingesting.discard(doc_hash)
+            return True, f"'{filename}' 문서가 추가되었습니다. ({chunk_count}개 청크)"
+        
+        except Exception as e:
+            return False, f"문서 처리 중 오류: {str(e)}"
+    
+    def _link(self, filename: str, doc_hash: str):
+        """사용자 파일명 → 문서 해시 연결 (호출자가 트랜잭션을 잡고 있어야 함)"""
+        previous = self.conn.execute(
+            "SELECT doc_hash FROM user_documents WHERE user_id = ? AND filename = ?",
+            (self.user_id, filename)
+        ).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO user_documents (user_id, filename, doc_hash) VALUES (?, ?, ?)",
+            (self.user_id, filename, doc_hash)
+        )
+        if previous and previous[0] != doc_hash:
+            self._delete_if_orphan(previous[0])
+    
+    def _ingest(self, doc_hash: str, pages) -> int:
+        """
+        페이지를 청킹하면서 config.DOCUMENT_COMMIT_CHUNKS개마다 저장/커밋하고 전체 청크 수 반환
+        
+        Raises:
+            ValueError: 텍스트가 없는 문서
+        """
+        buffer = TextBuffer()
+        batch: List[ChunkSpan] = []
+        stored_pages = stored_chunks = 0
+        for span in iter_structured_chunks(pages, buffer):
+            batch.append(span)
+            if len(batch) >= config.DOCUMENT_COMMIT_CHUNKS:
+                stored_pages = self._store_batch(doc_hash, buffer, stored_pages, stored_chunks, batch)
+                stored_chunks += len(batch)
+                batch = []
+        if not stored_chunks and not batch:
+            raise ValueError(NO_TEXT_MESSAGE)
+        self._store_batch(doc_hash, buffer, stored_pages, stored_chunks, batch, complete=True)
+        return stored_chunks + len(batch)
+    
+    def _store_batch(self, doc_hash: str, buffer: TextBuffer, stored_pages: int, first_idx: int,
+                     spans: List[ChunkSpan], complete: bool = False) -> int:
+        """
+        새 페이지와 청크 묶음(위치, FTS5 색인, 임베딩)을 한 트랜잭션으로 저장
+        
+        Returns:
+            지금까지 저장한 페이지 수
+        """
+        chunks = [buffer.slice(span.start, span.end) for span in spans]
+        vectors = None
+        if self.use_embeddings and chunks:
+            try:
+                vectors = embed_texts(chunks)
+            except Exception as e:
+                print(f"임베딩 생성 실패: {str(e)}")
+        
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO document_pages (doc_hash, page, start_offset, end_offset, text) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (doc_hash, i + 1, buffer.page_starts[i], buffer.page_starts[i] + len(buffer.pages[i]), buffer.pages[i])
+                    for i in range(stored_pages, len(buffer.pages))
+                ]
+            )
+            for i, (chunk, span) in enumerate(zip(chunks, spans)):
+                chunk_id = self.conn.execute(
+                    "INSERT INTO chunks (doc_hash, idx, page, start_offset, end_offset, byte_start, byte_end) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (doc_hash, first_idx + i, span.page, span.start, span.end, span.byte_start, span.byte_end)
+                ).lastrowid
+                self.conn.execute(
+                    "INSERT INTO chunk_fts (rowid, tokens) VALUES (?, ?)",
+                    (chunk_id, " ".join(tokenize(chunk)))
+                )
+                if vectors is not None:
+                    self.conn.execute(
+                        "INSERT INTO chunk_embeddings (chunk_id, vector) VALUES (?, ?)",
+                        (chunk_id, vectors[i].tobytes())
+                    )
+            self.conn.execute(
+                "UPDATE documents SET chunk_count = chunk_count + ?, complete = ? WHERE content_hash = ?",
+                (len(spans), int(complete), doc_hash)
+            )
+        self._invalidate_vector_index()
+        return len(buffer.pages)
+    
+    def _delete_if_orphan(self, doc_hash: str):
+        """어떤 사용자도 참조하지 않는 문서 삭제 (호출자가 트랜잭션을 잡고 있어야 함)"""
+        in_use = self.conn.execute(
+            "SELECT 1 FROM user_documents WHERE doc_hash = ? LIMIT 1", (doc_hash,)
+        ).fetchone()
+        if not in_use:
+            self._purge_document(doc_hash)
+    
+    def _purge_document(self, doc_hash: str):
+        """문서와 모든 사용자 연결 삭제 (색인 실패/중단 문서 정리용, 호출자가 트랜잭션을 잡고 있어야 함)"""
+        self.conn.execute("DELETE FROM user_documents WHERE doc_hash = ?", (doc_hash,))
+        chunk_filter = "(SELECT id FROM chunks WHERE doc_hash = ?)"
+        self.conn.execute(f"DELETE FROM chunk_fts WHERE rowid IN {chunk_filter}", (doc_hash,))
+        self.conn.execute(f"DELETE FROM chunk_embeddings WHERE chunk_id IN {chunk_filter}", (doc_hash,))
+        self.conn.execute("DELETE FROM chunks WHERE doc_hash = ?", (doc_hash,))
+        self.conn.execute("DELETE FROM document_pages WHERE doc_hash = ?", (doc_hash,))
+        self.conn.execute("DELETE FROM documents WHERE content_hash = ?", (doc_hash,))
+    
+    def remove_document(self, filename: str) -> bool:
+        """문서 제거 (다른 사용자가 참조하지 않으면 본문과 색인도 삭제)"""
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT doc_hash FROM user_documents WHERE user_id = ? AND filename = ?",
+                (self.user_id, filename)
+            ).fetchone()
+            if row is None:
+                return False
+            self.conn.execute(
+                "DELETE FROM user_documents WHERE user_id = ? AND filename = ?",
+                (self.user_id, filename)
+            )
+            self._delete_if_orphan(row[0])
+        self._invalidate_vector_index()
+        return True
+    
+    def get_chunk(self, chunk_id: int) -> str:
+        """청크 ID로 청크 텍스트 반환 (청크가 걸친 페이지만 읽어 오프셋으로 자름)"""
+        rows = self._fetch(
+            "SELECT p.start_offset, p.text, c.start_offset, c.end_offset FROM chunks c "
+            "JOIN document_pages p ON p.doc_hash = c.doc_hash "
+            "AND p.end_offset > c.start_offset AND p.start_offset < c.end_offset "
+            "WHERE c.id = ? ORDER BY p.page",
+            (chunk_id,)
+        )
+        if not rows:
+            return ""
+        return _slice_pages([(page_start, text) for page_start, text, _, _ in rows], rows[0][2], rows[0][3])
+    
+    def _document_text(self, doc_hash: str) -> str:
+        rows = self._fetch("SELECT text FROM document_pages WHERE doc_hash = ? ORDER BY page", (doc_hash,))
+        return "".join(row[0] for row in rows)
+    
+    def get_chunk_source(self, chunk_id: int) -> Optional[Dict]:
+        """청크 출처 {filename, page} (페이지 정보가 없는 이전 청크는 None)"""
+        row = self._fetch_one(
+            "SELECT MIN(u.filename), c.page FROM chunks c "
+            "JOIN user_documents u ON u.doc_hash = c.doc_hash AND u.user_id = ? "
+            "WHERE c.id = ?",
+            (self.user_id, chunk_id)
+        )
+        if not row or row[0] is None or row[1] is None:
+            return None
+        return {"filename": row[0], "page": row[1]}
+    
+    def get_chunk_count(self) -> int:
+        """전체 청크 수"""
+        row = self._fetch_one(
+            f"SELECT COALESCE(SUM(chunk_count), 0) FROM documents WHERE content_hash IN ({self._user_hashes_sql()})",
+            (self.user_id,)
+        )
+        return row[0]
+    
+    def get_all_chunks(self, limit: int = None) -> List[str]:
+        """모든 문서의 청크 반환 (limit 지정 시 앞에서부터 limit개)"""
+        rows = self._fetch(
+            f"SELECT doc_hash, start_offset, end_offset FROM chunks WHERE doc_hash IN ({self._user_hashes_sql()}) "
+            "ORDER BY doc_hash, idx LIMIT ?",
+            (self.user_id, -1 if limit is None else limit)
+        )
+        texts: Dict[str, str] = {}
+        chunks = []
+        for doc_hash, start, end in rows:
+            if doc_hash not in texts:
+                texts[doc_hash] = self._document_text(doc_hash)
+            chunks.append(texts[doc_hash][start:end])
+        return chunks
+    
+    def get_document_text(self, filename: str) -> Optional[str]:
+        """문서 전체 텍스트 반환 (없으면 None)"""
+        row = self._fetch_one(
+            "SELECT doc_hash FROM user_documents WHERE user_id = ? AND filename = ?",
+            (self.user_id, filename)
+        )
+        return self._document_text(row[0]) if row else None
+    
+    def lexical_search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """FTS5 BM25 검색 (사용자 문서로 한정)"""
+        match = _fts_query(query)
+        if match is None:
+            return []
+        rows = self._fetch(
+            "SELECT chunk_fts.rowid, -bm25(chunk_fts) AS score FROM chunk_fts "
+            "JOIN chunks c ON c.id = chunk_fts.rowid "
+            f"WHERE chunk_fts MATCH ? AND c.doc_hash IN ({self._user_hashes_sql()}) "
+            "ORDER BY bm25(chunk_fts) LIMIT ?",
+            (match, self.user_id, top_k)
+        )
+        return [(chunk_id, score) for chunk_id, score in rows]
+    
+    def _invalidate_vector_index(self):
+        """문서 추가/삭제 후 벡터 색인 버리기 (이미 만들고 있던 색인도 저장되지 않음)"""
+        with self._vector_index_lock:
+            self._vector_index = None
+            self._vector_index_version += 1
+    
+    def _load_vector_index(self) -> VectorIndex:
+        """
+        사용자 문서의 저장된 임베딩으로 벡터 색인 구성 (첫 의미 검색 때 한 번)
+        
+        만든 색인은 바꾸지 않고 통째로 교체하므로, 호출자는 받은 색인을 락 없이 검색해도 됩니다.
+        """
+        with self._vector_index_lock:
+            if self._vector_index is not None:
+                return self._vector_index
+            version = self._vector_index_version
+        rows = self._fetch(
+            "SELECT e.chunk_id, e.vector FROM chunk_embeddings e JOIN chunks c ON c.id = e.chunk_id "
+            f"WHERE c.doc_hash IN ({self._user_hashes_sql()})",
+            (self.user_id,)
+        )
+        index = VectorIndex()
+        if rows:
+            index.add(
+                [chunk_id for chunk_id, _ in rows],
+                np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+            )
+        with self._vector_index_lock:
+            # 만드는 동안 문서가 바뀌었으면 이번 결과만 쓰고 저장하지 않음
+            if version == self._vector_index_version:
+                self._vector_index = index
+        return index
+    
+    def vector_search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """
+        임베딩 유사도 검색
+        
+        Returns:
+            [(chunk_id, score), ...] - 저장된 임베딩이 없으면 빈 리스트
+        """
+        if not self.use_embeddings:
+            return []
+        index = self._load_vector_index()
+        if not len(index):
+            return []
+        try:
+            query_vector = embed_texts([query])[0]
+        except Exception as e:
+            print(f"질의 임베딩 실패: {str(e)}")
+            return []
+        return index.search(query_vector, top_k)
+    
+    def get_document_list(self) -> List[Dict]:
+        """문서 목록 반환"""
+        rows = self._fetch(
+            "SELECT u.filename, d.chunk_count FROM user_documents u "
+            "JOIN documents d ON d.content_hash = u.doc_hash "
+            "WHERE u.user_id = ? ORDER BY u.added_at, u.filename",
+            (self.user_id,)
+        )
+        return [{"filename": filename, "chunk_count": chunk_count} for filename, chunk_count in rows]
+    
+    def clear(self):
+        """사용자의 모든 문서 제거"""
+        for doc in self.get_document_list():
+            self.remove_document(doc["filename"])
+
+
+def get_document_store(user_id: Optional[int] = None) -> BaseDocumentStore:
+    """
+    사용자 문서 저장소 생성
+    
+    로그인 사용자는 영구 저장소를 사용하고, 비로그인이거나 FTS5를 쓸 수 없으면 세션 메모리 저장소를 사용합니다.
+    """
+    if user_id is None:
+        return DocumentStore()
+    try:
+        return PersistentDocumentStore(user_id)
+    except sqlite3.Error as e:
+        print(f"영구 문서 저장소 초기화 실패, 메모리 저장소 사용: {str(e)}")
+        return DocumentStore()
@@ -4,18 +4,114 @@ Handles document parsing (PDF, Text), embedding-based retrieval, and document QA
 """
 import pypdf
 import io
-from typing import List, Dict, Optional, Tuple
+import re
+import math
+import heapq
+import bisect
+import hashlib
+import threading
+import time
+import mmap
+import multiprocessing
+import uuid
+import weakref
+from array import array
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator, Callable, NamedTuple
 import os
 import config
+from llm_clients import get_chat_model
+
+try:
+    import numpy as np
+except ImportError:  # 벡터 검색은 numpy가 있을 때만 사용
+    np = None
+
+UNSUPPORTED_FORMAT_MESSAGE = "지원하지 않는 파일 형식입니다. (PDF, TXT, MD 지원)"
+NO_TEXT_MESSAGE = "문서에서 텍스트를 찾을 수 없습니다. (빈 파일이거나 이미지만 있는 PDF)"
+
+# 진행 상황 콜백: (처리한 페이지 수, 전체 페이지 수)
+ProgressCallback = Callable[[int, int], None]
+
+# 프로세스 풀 작업자가 공유하는 PDF (작업마다 파일 바이트를 다시 보내지 않도록 초기화 시 한 번 전달)
+_worker_pdf_reader = None
+
+
+def _init_pdf_worker(file_bytes: bytes):
+    global _worker_pdf_reader
+    _worker_pdf_reader = pypdf.PdfReader(io.BytesIO(file_bytes))
+
+
+def _extract_pdf_pages(start: int, end: int) -> List[str]:
+    """작업자 프로세스에서 [start, end) 페이지 텍스트 추출"""
+    return [(_worker_pdf_reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+def iter_pdf_pages(file_bytes: bytes, progress: ProgressCallback = None) -> Iterator[str]:
+    """
+    PDF 페이지 텍스트를 순서대로 생성 (각 페이지 끝에 줄바꿈 포함)
+    
+    페이지 수가 config.PDF_PARALLEL_MIN_PAGES 이상이면 프로세스 풀에서 페이지 묶음을 병렬 추출하고,
+    앞쪽 묶음이 끝나는 대로 바로 내보내므로 뒤쪽 페이지를 기다리지 않고 청킹/색인을 시작할 수 있습니다.
+    작업자는 spawn으로 시작합니다. (Streamlit처럼 스레드가 여러 개인 프로세스를 fork하면 잠긴 락이 복제될 수 있음)
+    """
+    reader = pypdf.PdfReader(io.BytesIO(file_bytes))
+    total = len(reader.pages)
+    done = 0
+    
+    if total >= config.PDF_PARALLEL_MIN_PAGES and config.PDF_WORKERS > 1:
+        batch = config.PDF_PAGES_PER_TASK
+        try:
+            with ProcessPoolExecutor(
+                max_workers=min(config.PDF_WORKERS, math.ceil(total / batch)),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_pdf_worker,
+                initargs=(file_bytes,)
+            ) as executor:
+                futures = [
+                    executor.submit(_extract_pdf_pages, start, min(start + batch, total))
+                    for start in range(0, total, batch)
+                ]
+                for future in futures:
+                    for page_text in future.result():
+                        done += 1
+                        yield page_text + "\n"
+                        if progress:
+                            progress(done, total)
+            return
+        except Exception as e:
+            # 프로세스 풀을 쓸 수 없는 환경이면 남은 페이지를 직렬로 추출
+            print(f"PDF 병렬 추출 실패, 직렬 처리로 전환: {str(e)}")
+    
+    for i in range(done, total):
+        yield (reader.pages[i].extract_text() or "") + "\n"
+        if progress:
+            progress(i + 1, total)
+
+
+def iter_document_pages(filename: str, file_bytes: bytes, progress: ProgressCallback = None) -> Iterator[str]:
+    """
+    파일 확장자에 따라 페이지(텍스트 파일은 전체) 단위로 텍스트 생성
+    
+    Raises:
+        ValueError: 지원하지 않는 파일 형식
+    """
+    if filename.lower().endswith('.pdf'):
+        return iter_pdf_pages(file_bytes, progress)
+    if filename.lower().endswith(('.txt', '.md')):
+        text = file_bytes.decode("utf-8")
+        if progress:
+            progress(1, 1)
+        return iter([text])
+    raise ValueError(UNSUPPORTED_FORMAT_MESSAGE)
+
 
 def parse_pdf(file_bytes: bytes) -> str:
     """PDF 파일에서 텍스트 추출"""
     try:
-        pdf_reader = pypdf.PdfReader(io.BytesIO(file_bytes))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        return "".join(iter_pdf_pages(file_bytes))
     except Exception as e:
         return f"Error parsing PDF: {str(e)}"
 
@@ -28,16 +124,315 @@ def parse_text(file_bytes: bytes) -> str:
 
 def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:
     """텍스트를 청크로 분할"""
-    chunks = []
-    start = 0
-    text_len = len(text)
-    
-    while start < text_len:
-        end = start + chunk_size
-        chunks.append(text[start:end])
-        start += chunk_size - overlap
-        
-    return chunks
+    return list(iter_chunk_text([text], chunk_size, overlap))
+
+
+def iter_chunk_text(parts: Iterable[str], chunk_size: int = 1000, overlap: int = 100) -> Iterator[str]:
+    """
+    이어지는 텍스트 조각(페이지)을 받아 청크를 순서대로 생성
+    
+    청크가 가득 차는 즉시 내보내므로 전체 텍스트를 기다리지 않으며, 결과는 chunk_text와 같습니다.
+    """
+    step = chunk_size - overlap
+    buffer = ""
+    for part in parts:
+        buffer += part
+        while len(buffer) >= chunk_size:
+            yield buffer[:chunk_size]
+            buffer = buffer[step:]
+    while buffer:
+        yield buffer[:chunk_size]
+        buffer = buffer[step:]
+
+# ---------------------------------------------------------------------------
+# 구조 인식 청킹 (문장/문단 경계, 토큰 예산, 페이지·오프셋 메타데이터)
+# ---------------------------------------------------------------------------
+
+# 문장/문단 경계: 문장부호 뒤 공백, 한국어 종결어미(다/요/음/함 등) 뒤 줄바꿈, 빈 줄
+_SENTENCE_BOUNDARY = re.compile(
+    r'\n[ \t]*\n\s*'
+    r'|(?:(?<=[.!?。…])|(?<=[.!?。…]["\'”’)\]])|(?<=[다요음함됨임까]))[ \t]*\n\s*'
+    r'|(?<=[.!?。…])[ \t]+(?=\S)'
+)
+
+_MAX_PENDING_CHARS = 20000  # 문장 경계를 기다리며 보류할 최대 글자 수
+
+_token_encoding = None
+_token_encoding_loaded = False
+
+
+def count_tokens(text: str) -> int:
+    """
+    LLM 토큰 수 (tiktoken이 있으면 cl100k_base, 없거나 인코딩을 받을 수 없으면 근사치)
+    
+    근사치: 한글 1음절 ≈ 1토큰, 그 외 문자 4자 ≈ 1토큰
+    """
+    global _token_encoding, _token_encoding_loaded
+    if not _token_encoding_loaded:
+        _token_encoding_loaded = True
+        try:
+            import tiktoken
+            _token_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _token_encoding = None
+    if _token_encoding is not None:
+        return len(_token_encoding.encode(text, disallowed_special=()))
+    hangul = sum(1 for ch in text if '가' <= ch <= '힣')
+    return hangul + (len(text) - hangul + 3) // 4
+
+
+class ChunkSpan(NamedTuple):
+    """문서 텍스트 버퍼 안의 청크 위치 (청크 텍스트를 따로 복사해 두지 않음)"""
+    start: int       # 문자 오프셋
+    end: int
+    byte_start: int  # UTF-8 바이트 오프셋
+    byte_end: int
+    page: int        # 청크가 시작하는 페이지 (1부터)
+
+
+class TextBuffer:
+    """
+    페이지 단위로 이어 붙이는 문서 텍스트
+    
+    청크는 이 버퍼의 오프셋(ChunkSpan)으로만 보관하고 필요할 때 잘라 씁니다.
+    """
+    def __init__(self):
+        self.pages: List[str] = []
+        self.page_starts: List[int] = []       # 페이지별 시작 문자 오프셋
+        self.page_byte_starts: List[int] = []  # 페이지별 시작 바이트 오프셋
+        self.length = 0
+        self.byte_length = 0
+    
+    def append(self, page: str):
+        self.pages.append(page)
+        self.page_starts.append(self.length)
+        self.page_byte_starts.append(self.byte_length)
+        self.length += len(page)
+        self.byte_length += len(page.encode("utf-8"))
+    
+    def _page(self, i: int) -> str:
+        return self.pages[i]
+    
+    def page_index(self, offset: int) -> int:
+        """오프셋이 속한 페이지 번호 (0부터)"""
+        return max(bisect.bisect_right(self.page_starts, offset) - 1, 0)
+    
+    def byte_offset(self, offset: int) -> int:
+        """문자 오프셋 → UTF-8 바이트 오프셋"""
+        i = self.page_index(offset)
+        if not self.pages:
+            return 0
+        return self.page_byte_starts[i] + len(self._page(i)[:offset - self.page_starts[i]].encode("utf-8"))
+    
+    def slice(self, start: int, end: int) -> str:
+        """[start, end) 텍스트 (페이지 경계를 넘어도 됨)"""
+        if start >= end or not self.pages:
+            return ""
+        first, last = self.page_index(start), self.page_index(max(end - 1, start))
+        if first == last:
+            base = self.page_starts[first]
+            return self._page(first)[start - base:end - base]
+        text = "".join(self._page(i) for i in range(first, last + 1))
+        base = self.page_starts[first]
+        return text[start - base:end - base]
+    
+    def chunk_text(self, span: ChunkSpan) -> str:
+        """청크 위치의 텍스트"""
+        return self.slice(span.start, span.end)
+    
+    def text(self) -> str:
+        return "".join(self.pages)
+    
+    def close(self):
+        """페이지 추가가 끝났음을 알림 (메모리 버퍼는 할 일 없음)"""
+    
+    def release(self):
+        """버퍼가 잡고 있는 자원 해제 (메모리 버퍼는 할 일 없음)"""
+
+
+class MappedTextBuffer(TextBuffer):
+    """
+    디스크 파일에 쓰고 메모리 맵으로 읽는 문서 텍스트 버퍼
+    
+    추출 중에는 최근 페이지 몇 개만 메모리에 두고, close() 뒤에는 mmap으로만 읽습니다.
+    청크는 (바이트 오프셋, 길이) 구간으로 필요할 때만 디코딩하므로 문서가 늘어도 상주 메모리가 거의 늘지 않습니다.
+    """
+    RESIDENT_PAGES = 4  # 추출 중 메모리에 유지할 최근 페이지 수 (청커가 되돌아보는 범위)
+    
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        # 파일/mmap은 가비지 컬렉션이나 종료 시에도 정리되도록 별도 dict로 보관
+        self._resources = {"file": open(path, "w+b"), "mmap": None}
+        weakref.finalize(self, MappedTextBuffer._cleanup, self._resources, path)
+    
+    @staticmethod
+    def _cleanup(resources: Dict, path: str):
+        if resources["mmap"] is not None:
+            resources["mmap"].close()
+            resources["mmap"] = None
+        if resources["file"] is not None:
+            resources["file"].close()
+            resources["file"] = None
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
+    def append(self, page: str):
+        super().append(page)
+        file = self._resources["file"]
+        file.seek(0, os.SEEK_END)
+        file.write(page.encode("utf-8"))
+        if len(self.pages) > self.RESIDENT_PAGES:
+            self.pages[-self.RESIDENT_PAGES - 1] = None  # 이후에는 파일에서 다시 읽음
+    
+    def _page(self, i: int) -> str:
+        page = self.pages[i]
+        if page is None:
+            end = self.page_byte_starts[i + 1] if i + 1 < len(self.page_byte_starts) else self.byte_length
+            page = self.read(self.page_byte_starts[i], end)
+        return page
+    
+    def read(self, byte_start: int, byte_end: int) -> str:
+        """[byte_start, byte_end) 바이트 구간을 디코딩"""
+        if self._resources["mmap"] is not None:
+            return self._resources["mmap"][byte_start:byte_end].decode("utf-8")
+        file = self._resources["file"]
+        if file is None:
+            return ""
+        file.flush()
+        file.seek(byte_start)
+        return file.read(byte_end - byte_start).decode("utf-8")
+    
+    def chunk_text(self, span: ChunkSpan) -> str:
+        return self.read(span.byte_start, span.byte_end)
+    
+    def text(self) -> str:
+        return self.read(0, self.byte_length)
+    
+    def close(self):
+        """쓰기를 마치고 메모리 맵으로 전환 (메모리의 페이지 텍스트는 버림)"""
+        file = self._resources["file"]
+        file.flush()
+        if self.byte_length and self._resources["mmap"] is None:
+            self._resources["mmap"] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.pages = [None] * len(self.pages)
+    
+    def release(self):
+        """mmap과 파일을 닫고 디스크 파일 삭제"""
+        MappedTextBuffer._cleanup(self._resources, self.path)
+
+
+def _split_oversized(text: str, start: int, end: int, max_tokens: int) -> List[Tuple[int, int, int]]:
+    """
+    토큰 예산보다 긴 구간(표, 줄바꿈 없는 긴 문단)을 줄 → 공백 → 글자 순으로 나눔
+    
+    Returns:
+        [(start, end, tokens), ...] - text 기준 오프셋
+    """
+    pieces = []
+    while start < end:
+        tokens = count_tokens(text[start:end])
+        if tokens <= max_tokens:
+            pieces.append((start, end, tokens))
+            break
+        # 예산에 맞는 대략의 글자 수를 잡고, 그 안에서 마지막 줄바꿈/공백에서 자름
+        limit = start + max(1, (end - start) * max_tokens // tokens)
+        cut = text.rfind("\n", start + 1, limit)
+        if cut <= start:
+            cut = text.rfind(" ", start + 1, limit)
+        if cut <= start:
+            cut = limit
+        pieces.append((start, cut, count_tokens(text[start:cut])))
+        start = cut
+        while start < end and text[start].isspace():
+            start += 1
+    return pieces
+
+
+def iter_structured_chunks(pages: Iterable[str], buffer: TextBuffer, max_tokens: int = None,
+                           overlap_tokens: int = None) -> Iterator[ChunkSpan]:
+    """
+    페이지를 buffer에 이어 붙이면서 문장/문단 경계에 맞춘 청크 위치를 순서대로 생성
+    
+    - 문장(한국어 종결어미 포함)과 문단 경계에서만 자르고, 표처럼 긴 구간은 줄 단위로 나눔
+    - 청크는 토큰 예산(max_tokens)을 넘지 않게 문장을 채우고, 뒤쪽 문장을 overlap_tokens만큼 다음 청크와 겹침
+      (예산은 문장 사이 공백/줄바꿈까지 포함해 계산 - 문장과 그 앞 공백의 토큰 수를 누적해 다시 토큰화하지 않음)
+    - 페이지가 들어오는 대로 완성된 청크를 바로 내보냄
+    - 페이지가 없거나 텍스트가 없으면(이미지만 있는 PDF 등) 청크를 만들지 않음
+    
+    Args:
+        pages: 페이지 텍스트 (iter_document_pages 결과)
+        buffer: 페이지를 쌓을 텍스트 버퍼 (청크 오프셋의 기준)
+        max_tokens: 청크 최대 토큰 수 (기본: config.RAG_CHUNK_TOKENS)
+        overlap_tokens: 이웃 청크와 겹칠 토큰 수 (기본: config.RAG_CHUNK_OVERLAP_TOKENS)
+    """
+    max_tokens = max_tokens or config.RAG_CHUNK_TOKENS
+    overlap_tokens = config.RAG_CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    
+    # 현재 청크에 담긴 문장 (start, end, tokens, 바로 앞 문장과의 사이 공백 토큰 수)
+    current: List[Tuple[int, int, int, int]] = []
+    current_tokens = 0  # 현재 청크 텍스트의 토큰 수 (첫 문장 + 이후 문장마다 사이 공백과 문장)
+    segment_start = 0  # 아직 경계를 확정하지 못한 구간의 시작
+    previous_end = None  # 직전 문장의 끝 (사이 공백 토큰 계산용)
+    
+    def make_span(segments):
+        start, end = segments[0][0], segments[-1][1]
+        return ChunkSpan(start, end, buffer.byte_offset(start), buffer.byte_offset(end), buffer.page_index(start) + 1)
+    
+    def add_segment(segment):
+        nonlocal current, current_tokens
+        _, _, tokens, gap = segment
+        if current and current_tokens + gap + tokens > max_tokens:
+            yield make_span(current)
+            # 뒤쪽 문장을 겹침 예산만큼 남김 (남긴 문장 + 새 문장도 예산 안에 들어야 함)
+            kept, kept_tokens = [], 0
+            for seg in reversed(current):
+                seg_tokens = seg[2] + (kept[0][3] + kept_tokens if kept else 0)
+                if seg_tokens > overlap_tokens or seg_tokens + gap + tokens > max_tokens:
+                    break
+                kept.insert(0, seg)
+                kept_tokens = seg_tokens
+            current, current_tokens = kept, kept_tokens
+        current_tokens = current_tokens + gap + tokens if current else tokens
+        current.append(segment)
+    
+    def feed(text, base, start, end):
+        nonlocal previous_end
+        # 앞뒤 공백을 제외한 문장 구간만 청크에 담음
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start >= end:
+            return
+        for piece_start, piece_end, tokens in _split_oversized(text, start, end, max_tokens):
+            piece_start += base
+            gap = count_tokens(buffer.slice(previous_end, piece_start)) if previous_end is not None else 0
+            previous_end = base + piece_end
+            yield from add_segment((piece_start, previous_end, tokens, gap))
+    
+    for page in pages:
+        buffer.append(page)
+        # 확정되지 않은 구간 + 새 페이지에서 경계 탐색 (마지막 구간은 다음 페이지로 이어질 수 있어 보류)
+        text = buffer.slice(segment_start, buffer.length)
+        last = 0
+        for match in _SENTENCE_BOUNDARY.finditer(text):
+            yield from feed(text, segment_start, last, match.start())
+            last = match.end()
+        segment_start += last
+        if buffer.length - segment_start > _MAX_PENDING_CHARS:
+            # 경계 없이 길게 이어지는 구간은 더 기다리지 않고 줄 단위로 나눔
+            text = buffer.slice(segment_start, buffer.length)
+            yield from feed(text, segment_start, 0, len(text))
+            segment_start = buffer.length
+    
+    text = buffer.slice(segment_start, buffer.length)
+    yield from feed(text, segment_start, 0, len(text))
+    if current:
+        yield make_span(current)
+
 
 def simple_retrieval(query: str, chunks: List[str], top_k: int = 3) -> List[str]:
     """
@@ -104,85 +499,758 @@ def simple_retrieval(query: str, chunks: List[str], top_k: int = 3) -> List[str]
     return result
 
 
-class DocumentStore:
+_TOKEN_PATTERN = re.compile(r'[가-힣]+|[a-zA-Z]+|[0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    검색용 토큰화
+    - 한글/영어/숫자 단위로 분리 (2글자 미만 제외)
+    - 한글 단어는 조사/어미가 붙어도 매칭되도록 2-gram을 함께 생성
+      (예: "삼성전자의" → "삼성전자의", "삼성", "성전", "전자", "자의")
+    """
+    tokens = []
+    for term in _TOKEN_PATTERN.findall(text.lower()):
+        if len(term) < 2:
+            continue
+        tokens.append(term)
+        if len(term) > 2 and '가' <= term[0] <= '힣':
+            tokens.extend(term[i:i + 2] for i in range(len(term) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    청크 단위 역색인 + BM25 점수 계산
+    
+    문서 추가 시점에 토큰화하여 색인하므로, 검색 시에는 질의 토큰의
+    포스팅 리스트만 순회합니다. 청크 단위로 추가/삭제할 수 있습니다.
+    청크별 토큰 순서를 토큰 ID 배열로 보관해, 재정렬 시 청크를 다시 토큰화하지 않고
+    질의 토큰의 위치를 찾습니다 (term_positions).
+    """
+    MIN_IDF = 0.05
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)  # term -> {chunk_id: tf}
+        self.chunk_lengths: Dict[int, int] = {}
+        self.chunk_tokens: Dict[int, array] = {}  # chunk_id -> 토큰 ID 순서 (위치 조회용)
+        self.vocabulary: Dict[str, int] = {}      # 토큰 -> 토큰 ID (고유 토큰 수만큼만 커짐)
+        self.terms: List[str] = []                # 토큰 ID -> 토큰
+        self.total_length = 0
+        self._norms: Optional[Dict[int, float]] = None  # 길이 정규화 값 캐시 (색인 변경 시 무효화)
+    
+    def __len__(self) -> int:
+        return len(self.chunk_lengths)
+    
+    def add(self, chunk_id: int, text: str):
+        """청크 색인"""
+        if chunk_id in self.chunk_lengths:
+            self.remove(chunk_id)
+        tokens = tokenize(text)
+        for term, freq in Counter(tokens).items():
+            self.postings[term][chunk_id] = freq
+        token_ids = array('I')
+        for term in tokens:
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                term_id = self.vocabulary[term] = len(self.terms)
+                self.terms.append(term)
+            token_ids.append(term_id)
+        self.chunk_lengths[chunk_id] = len(tokens)
+        self.chunk_tokens[chunk_id] = token_ids
+        self.total_length += len(tokens)
+        self._norms = None
+    
+    def remove(self, chunk_id: int):
+        """청크 색인 제거"""
+        if chunk_id not in self.chunk_lengths:
+            return
+        for term_id in set(self.chunk_tokens.pop(chunk_id)):
+            posting = self.postings[self.terms[term_id]]
+            posting.pop(chunk_id, None)
+            if not posting:
+                del self.postings[self.terms[term_id]]
+        self.total_length -= self.chunk_lengths.pop(chunk_id)
+        self._norms = None
+    
+    def clear(self):
+        """전체 색인 삭제"""
+        self.postings.clear()
+        self.chunk_lengths.clear()
+        self.chunk_tokens.clear()
+        self.vocabulary.clear()
+        self.terms.clear()
+        self.total_length = 0
+        self._norms = None
+    
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """
+        BM25 검색
+        
+        Returns:
+            [(chunk_id, score), ...] 점수 내림차순, 점수가 0보다 큰 청크만
+        """
+        chunk_count = len(self.chunk_lengths)
+        if not chunk_count:
+            return []
+        
+        k1 = self.k1
+        if self._norms is None:
+            avg_length = self.total_length / chunk_count or 1.0
+            self._norms = {
+                chunk_id: k1 * (1 - self.b + self.b * length / avg_length)
+                for chunk_id, length in self.chunk_lengths.items()
+            }
+        norms = self._norms
+        scores: Dict[int, float] = defaultdict(float)
+        
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (chunk_count - df + 0.5) / (df + 0.5))
+            if idf < self.MIN_IDF:
+                # 거의 모든 청크에 등장하는 토큰은 점수에 기여하지 않으므로 건너뜀
+                continue
+            weight = idf * (k1 + 1)
+            for chunk_id, freq in posting.items():
+                scores[chunk_id] += weight * freq / (freq + norms[chunk_id])
+        
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+    
+    def term_positions(self, chunk_id: int, terms: Iterable[str]) -> List[Tuple[int, str]]:
+        """청크에서 주어진 토큰들이 나오는 [(위치, 토큰), ...] (위치 오름차순, tokenize 결과 기준)"""
+        ids = {self.vocabulary[term] for term in terms if term in self.vocabulary}
+        terms_by_id = self.terms
+        return [
+            (position, terms_by_id[term_id])
+            for position, term_id in enumerate(self.chunk_tokens.get(chunk_id, ()))
+            if term_id in ids
+        ]
+
+
+class LRUCache:
     """
-    문서 저장소 클래스 - RAG를 위한 문서 관리
+    크기 제한 LRU 캐시 (가장 오래 쓰지 않은 항목부터 제거)
+    
+    스레드 안전하지 않으므로 호출하는 쪽의 잠금 안에서 사용합니다.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, object]" = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def __contains__(self, key) -> bool:
+        return key in self._data
+    
+    def get(self, key, default=None):
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+    
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def clear(self):
+        self._data.clear()
+
+
+_embedding_cache = LRUCache(config.EMBEDDING_CACHE_SIZE)  # 텍스트 해시 -> 정규화된 임베딩 (세션 간 공유)
+_embedding_cache_lock = threading.Lock()
+_embeddings_client = None
+EMBEDDING_BATCH_SIZE = 128  # 임베딩 API 한 번에 보내는 텍스트 수
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def embeddings_available() -> bool:
+    """임베딩 기반 검색 사용 가능 여부"""
+    return np is not None and bool(config.OPENAI_API_KEY) and config.OPENAI_API_KEY != "your_openai_api_key_here"
+
+
+def embed_texts(texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> "np.ndarray":
+    """
+    텍스트 목록을 임베딩 (배치 호출 + 해시 캐시)
+    
+    최근 임베딩한 텍스트(config.EMBEDDING_CACHE_SIZE개)는 캐시에서 가져오므로
+    같은 문서를 다시 올려도 API를 호출하지 않습니다.
+    
+    Returns:
+        (len(texts), dim) float32 행렬, 각 행은 L2 정규화됨
+    """
+    global _embeddings_client
+    hashes = [_text_hash(text) for text in texts]
+    with _embedding_cache_lock:
+        vectors_by_hash = {h: _embedding_cache.get(h) for h in hashes}
+    missing = {h: text for h, text in zip(hashes, texts) if vectors_by_hash[h] is None}
+    
+    if missing:
+        if _embeddings_client is None:
+            from langchain_openai import OpenAIEmbeddings
+            _embeddings_client = OpenAIEmbeddings(model=config.EMBEDDING_MODEL, api_key=config.OPENAI_API_KEY)
+        
+        missing_hashes = list(missing)
+        for start in range(0, len(missing_hashes), batch_size):
+            batch = missing_hashes[start:start + batch_size]
+            vectors = np.asarray(
+                _embeddings_client.embed_documents([missing[h] for h in batch]),
+                dtype=np.float32
+            )
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+            with _embedding_cache_lock:
+                for h, vector in zip(batch, vectors):
+                    _embedding_cache[h] = vectors_by_hash[h] = vector
+    
+    # 캐시 크기보다 많은 텍스트를 한 번에 임베딩해도 결과는 이 호출에서 모은 벡터로 만듦
+    return np.stack([vectors_by_hash[h] for h in hashes]) if hashes else np.zeros((0, 0), dtype=np.float32)
+
+
+class VectorIndex:
+    """
+    임베딩 벡터 색인 - 연속된 float32 행렬에 저장
+    
+    검색은 행렬-벡터 곱 한 번과 argpartition으로 top-k를 구합니다.
     """
     def __init__(self):
-        self.documents: Dict[str, Dict] = {}  # filename -> {text, chunks}
+        self.matrix = None                     # (capacity, dim) float32
+        self.size = 0
+        self.row_ids: List[int] = []           # 행 번호 -> chunk_id
+        self.id_rows: Dict[int, int] = {}      # chunk_id -> 행 번호
+    
+    def __len__(self) -> int:
+        return self.size
     
-    def add_document(self, filename: str, file_bytes: bytes) -> Tuple[bool, str]:
+    def add(self, chunk_ids: List[int], vectors: "np.ndarray"):
+        """벡터 추가 (용량이 부족하면 두 배로 확장)"""
+        if not chunk_ids:
+            return
+        needed = self.size + len(chunk_ids)
+        if self.matrix is None:
+            self.matrix = np.empty((max(needed, 256), vectors.shape[1]), dtype=np.float32)
+        elif needed > self.matrix.shape[0]:
+            grown = np.empty((max(needed, self.matrix.shape[0] * 2), self.matrix.shape[1]), dtype=np.float32)
+            grown[:self.size] = self.matrix[:self.size]
+            self.matrix = grown
+        
+        self.matrix[self.size:needed] = vectors
+        for offset, chunk_id in enumerate(chunk_ids):
+            self.id_rows[chunk_id] = self.size + offset
+            self.row_ids.append(chunk_id)
+        self.size = needed
+    
+    def remove(self, chunk_ids: List[int]):
+        """벡터 삭제 (마지막 행을 빈자리로 옮겨 행렬을 연속적으로 유지)"""
+        for chunk_id in chunk_ids:
+            row = self.id_rows.pop(chunk_id, None)
+            if row is None:
+                continue
+            last = self.size - 1
+            if row != last:
+                moved_id = self.row_ids[last]
+                self.matrix[row] = self.matrix[last]
+                self.row_ids[row] = moved_id
+                self.id_rows[moved_id] = row
+            self.row_ids.pop()
+            self.size -= 1
+    
+    def clear(self):
+        self.matrix = None
+        self.size = 0
+        self.row_ids.clear()
+        self.id_rows.clear()
+    
+    def search(self, query_vector: "np.ndarray", top_k: int = 5) -> List[Tuple[int, float]]:
+        """
+        코사인 유사도 top-k 검색
+        
+        Returns:
+            [(chunk_id, score), ...] 점수 내림차순
+        """
+        if not self.size:
+            return []
+        scores = self.matrix[:self.size] @ query_vector
+        k = min(top_k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.row_ids[row], float(scores[row])) for row in top]
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    여러 검색 결과 순위를 RRF(Reciprocal Rank Fusion)로 결합
+    
+    점수 스케일이 다른 검색기(BM25, 코사인 유사도)를 순위만으로 합칩니다.
+    
+    Args:
+        rankings: 검색기별 chunk_id 순위 리스트
+        k: 순위 완화 상수 (클수록 하위 순위 영향이 커짐)
+    
+    Returns:
+        [(chunk_id, fused_score), ...] 점수 내림차순
+    """
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            fused[chunk_id] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def _proximity_score(query_terms: set, hits: List[Tuple[int, str]], exact: bool) -> float:
+    """
+    재정렬 점수 - 질의 토큰 포함 비율 + 0.5 × 근접도 (+ 질의 문자열 전체 일치 시 1.0)
+    
+    Args:
+        query_terms: 질의 토큰 집합
+        hits: 청크에서 질의 토큰이 나오는 [(위치, 토큰), ...] (위치 오름차순)
+        exact: 청크에 질의 문자열 전체가 들어 있는지 여부
+    """
+    matched = {term for _, term in hits}
+    coverage = len(matched) / len(query_terms)
+    
+    # 매칭된 토큰을 모두 포함하는 최소 구간 (슬라이딩 윈도우)
+    proximity = 0.0
+    if matched:
+        counts: Dict[str, int] = defaultdict(int)
+        covered = 0
+        left = 0
+        best = hits[-1][0] - hits[0][0] + 1
+        for position, term in hits:
+            counts[term] += 1
+            if counts[term] == 1:
+                covered += 1
+            while covered == len(matched):
+                left_position, left_term = hits[left]
+                best = min(best, position - left_position + 1)
+                counts[left_term] -= 1
+                if counts[left_term] == 0:
+                    covered -= 1
+                left += 1
+        proximity = len(matched) / best
+    
+    return coverage + 0.5 * proximity + (1.0 if exact else 0.0)
+
+
+def proximity_rerank(query: str, candidates: List[Tuple[int, str]]) -> List[Tuple[int, float]]:
+    """
+    로컬 경량 재정렬기 (모델/네트워크 호출 없음)
+    
+    - 질의 토큰 포함 비율
+    - 질의 토큰들이 모여 있는 최소 구간 길이 (가까울수록 높은 점수)
+    - 질의 문자열 전체 일치 보너스
+    
+    Args:
+        query: 사용자 질문
+        candidates: [(chunk_id, chunk_text), ...]
+    
+    Returns:
+        [(chunk_id, score), ...] 점수 내림차순
+    """
+    query_terms = set(tokenize(query))
+    query_lower = query.lower().strip()
+    if not query_terms:
+        return [(chunk_id, 0.0) for chunk_id, _ in candidates]
+    
+    reranked = []
+    for chunk_id, text in candidates:
+        hits = [(position, token) for position, token in enumerate(tokenize(text)) if token in query_terms]
+        reranked.append((chunk_id, _proximity_score(query_terms, hits, query_lower in text.lower())))
+    
+    reranked.sort(key=lambda item: item[1], reverse=True)
+    return reranked
+
+
+def parse_document(filename: str, file_bytes: bytes) -> Tuple[Optional[str], Optional[str]]:
+    """
+    파일 확장자에 따라 텍스트 추출
+    
+    Returns:
+        (텍스트, 에러 메시지)
+    """
+    if filename.lower().endswith('.pdf'):
+        text = parse_pdf(file_bytes)
+    elif filename.lower().endswith(('.txt', '.md')):
+        text = parse_text(file_bytes)
+    else:
+        return None, UNSUPPORTED_FORMAT_MESSAGE
+    
+    if text.startswith("Error"):
+        return None, text
+    return text, None
+
+
+class BaseDocumentStore(ABC):
+    """
+    문서 저장소 공통 인터페이스와 검색 기능
+    
+    하위 클래스는 문서 추가/삭제/조회와 lexical_search, get_chunk를 구현하고,
+    vector_search와 get_chunk_source는 지원할 때만 재정의합니다.
+    """
+    @abstractmethod
+    def add_document(self, filename: str, file_bytes: bytes,
+                     progress: ProgressCallback = None) -> Tuple[bool, str]:
+        """문서 추가 - (성공여부, 메시지)"""
+    
+    @abstractmethod
+    def remove_document(self, filename: str) -> bool:
+        """문서 제거"""
+    
+    @abstractmethod
+    def get_document_text(self, filename: str) -> Optional[str]:
+        """문서 전체 텍스트 (없으면 None)"""
+    
+    @abstractmethod
+    def get_document_list(self) -> List[Dict]:
+        """문서 목록 [{filename, chunk_count}]"""
+    
+    @abstractmethod
+    def clear(self):
+        """모든 문서 삭제"""
+    
+    @abstractmethod
+    def lexical_search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """키워드 검색 - [(chunk_id, score), ...]"""
+    
+    def vector_search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """임베딩 검색 - [(chunk_id, score), ...]"""
+        return []
+    
+    @abstractmethod
+    def get_chunk(self, chunk_id: int) -> str:
+        """청크 ID로 청크 텍스트 반환"""
+    
+    @abstractmethod
+    def get_chunk_count(self) -> int:
+        """전체 청크 수"""
+    
+    @abstractmethod
+    def get_all_chunks(self, limit: int = None) -> List[str]:
+        """모든 문서의 청크 반환 (limit 지정 시 앞에서부터 limit개)"""
+    
+    def get_chunk_source(self, chunk_id: int) -> Optional[Dict]:
+        """청크 출처 {filename, page} (알 수 없으면 None)"""
+        return None
+    
+    def search(self, query: str, top_k: int = 5) -> List[str]:
+        """
+        모든 문서에서 검색 (hybrid_search와 같은 경로: BM25/임베딩 후보 + 재정렬)
+        
+        BM25 점수만으로는 질의어가 한 문장에 모여 있는지 반영하지 못해, 여러 사실이 섞인
+        청크에서 정답 청크를 놓치기 쉬우므로 후보를 넓게 뽑아 재정렬합니다.
+        """
+        return [self.get_chunk(chunk_id) for chunk_id, _ in self.hybrid_search(query, top_k=top_k)]
+    
+    def rerank_candidates(self, query: str, chunk_ids: List[int]) -> List[Tuple[int, float]]:
+        """후보 청크 재정렬 - [(chunk_id, score), ...] 점수 내림차순 (기본: 청크 텍스트로 proximity_rerank)"""
+        return proximity_rerank(query, [(chunk_id, self.get_chunk(chunk_id)) for chunk_id in chunk_ids])
+    
+    def semantic_search(self, query: str, top_k: int = 5) -> List[str]:
+        """임베딩 유사도 기반 검색 결과 청크 텍스트 반환"""
+        return [self.get_chunk(chunk_id) for chunk_id, _ in self.vector_search(query, top_k)]
+    
+    def hybrid_search(self, query: str, top_k: int = None, candidate_pool: int = None,
+                      rerank: bool = None, reranker=None, rrf_k: int = 60) -> List[Tuple[int, float]]:
+        """
+        하이브리드 검색 - 키워드(BM25)와 임베딩 후보를 RRF로 결합한 뒤 선택적으로 재정렬
+        
+        재정렬기는 질의 토큰 일치도로 점수를 매기므로 키워드 후보끼리만 재정렬해 그 후보들이
+        차지하던 순위에 다시 배치합니다. 임베딩으로만 찾은 청크(표현이 다른 질문)는 융합 순위를 유지합니다.
+        
+        Args:
+            query: 사용자 질문
+            top_k: 최종 반환 개수 (기본: config.RAG_TOP_K)
+            candidate_pool: 검색기별 후보 수 (클수록 정확도↑, 지연↑, 기본: config.RAG_CANDIDATE_POOL)
+            rerank: 상위 후보 재정렬 여부 (기본: config.RAG_RERANK)
+            reranker: (query, [(chunk_id, text)]) -> [(chunk_id, score)] 재정렬 함수 (기본: rerank_candidates)
+            rrf_k: RRF 상수
+        
+        Returns:
+            [(chunk_id, score), ...] 점수 내림차순 (점수는 해당 순위의 RRF 점수)
+        """
+        top_k = top_k or config.RAG_TOP_K
+        candidate_pool = max(candidate_pool or config.RAG_CANDIDATE_POOL, top_k)
+        rerank = config.RAG_RERANK if rerank is None else rerank
+        
+        rankings = [[chunk_id for chunk_id, _ in self.lexical_search(query, candidate_pool)]]
+        vector_hits = self.vector_search(query, candidate_pool)
+        if vector_hits:
+            rankings.append([chunk_id for chunk_id, _ in vector_hits])
+        
+        fused = reciprocal_rank_fusion(rankings, k=rrf_k)[:candidate_pool]
+        if rerank and fused:
+            lexical_ids = set(rankings[0])
+            chunk_ids = [chunk_id for chunk_id, _ in fused if chunk_id in lexical_ids]
+            if reranker is None:
+                reranked = self.rerank_candidates(query, chunk_ids)
+            else:
+                reranked = reranker(query, [(chunk_id, self.get_chunk(chunk_id)) for chunk_id in chunk_ids])
+            reranked_ids = iter([chunk_id for chunk_id, _ in reranked])
+            merged = []
+            for chunk_id, score in fused:
+                if chunk_id in lexical_ids:
+                    chunk_id = next(reranked_ids, None)
+                    if chunk_id is None:  # 재정렬 중 삭제된 청크
+                        continue
+                merged.append((chunk_id, score))
+            fused = merged
+        return fused[:top_k]
+
+
+class DocumentStore(BaseDocumentStore):
+    """
+    문서 저장소 클래스 - RAG를 위한 문서 관리 (세션 메모리)
+    
+    문서 추가는 백그라운드 스레드에서 실행될 수 있으므로 색인 변경과 검색, 청크/문서 조회는 _lock으로 직렬화합니다.
+    """
+    def __init__(self, use_embeddings: Optional[bool] = None, storage: str = None):
+        """
+        Args:
+            use_embeddings: 임베딩 벡터 색인 사용 여부 (None이면 numpy와 API 키가 있을 때 사용)
+            storage: 문서 텍스트 보관 방식 - "memory" 또는 "mmap" (기본: config.RAG_STORAGE)
+                "mmap"은 문서별 텍스트 파일을 config.RAG_MMAP_DIR에 쓰고 메모리 맵으로 읽습니다.
+        """
+        self.storage = storage or config.RAG_STORAGE
+        self.documents: Dict[str, Dict] = {}  # filename -> {buffer, spans, chunk_ids, chunk_count}
+        self.index = BM25Index()
+        self.use_embeddings = embeddings_available() if use_embeddings is None else use_embeddings
+        self.vector_index = VectorIndex() if self.use_embeddings else None
+        self._chunk_lookup: Dict[int, Tuple[str, int]] = {}  # chunk_id -> (filename, 청크 순번)
+        self._next_chunk_id = 0
+        self._lock = threading.RLock()
+    
+    def add_document(self, filename: str, file_bytes: bytes,
+                     progress: ProgressCallback = None) -> Tuple[bool, str]:
         """
         문서 추가 (PDF 또는 텍스트 파일)
         
+        페이지를 추출하는 대로 청킹/색인하므로 처리 중에도 앞쪽 청크는 바로 검색됩니다.
+        
         Args:
             filename: 파일명
             file_bytes: 파일 바이트 데이터
+            progress: 진행 상황 콜백 (처리한 페이지 수, 전체 페이지 수)
         
         Returns:
             (성공여부, 메시지)
         """
         try:
-            # 파일 확장자에 따라 파싱
-            if filename.lower().endswith('.pdf'):
-                text = parse_pdf(file_bytes)
-            elif filename.lower().endswith(('.txt', '.md')):
-                text = parse_text(file_bytes)
-            else:
-                return False, "지원하지 않는 파일 형식입니다. (PDF, TXT, MD 지원)"
-            
-            if text.startswith("Error"):
-                return False, text
-            
-            # 텍스트 청킹
-            chunks = chunk_text(text, chunk_size=800, overlap=100)
-            
-            # 저장
-            self.documents[filename] = {
-                "text": text,
-                "chunks": chunks,
-                "chunk_count": len(chunks)
-            }
+            pages = iter_document_pages(filename, file_bytes, progress)
+        except ValueError as e:
+            return False, str(e)
+        except Exception as e:
+            return False, f"문서 처리 중 오류: {str(e)}"
+        
+        # 같은 이름의 문서는 교체
+        self.remove_document(filename)
+        # 청크는 텍스트 버퍼의 오프셋으로만 보관 (부분 문자열을 복사하지 않음)
+        doc = {"buffer": self._new_buffer(), "spans": [], "chunk_ids": [], "chunk_count": 0}
+        with self._lock:
+            self.documents[filename] = doc
+        
+        try:
+            pending = 0  # 아직 임베딩하지 않은 청크 수
+            for span in iter_structured_chunks(pages, doc["buffer"]):
+                text = doc["buffer"].chunk_text(span)
+                with self._lock:
+                    chunk_id = self._next_chunk_id
+                    self._next_chunk_id += 1
+                    self.index.add(chunk_id, text)
+                    doc["spans"].append(span)
+                    doc["chunk_ids"].append(chunk_id)
+                    doc["chunk_count"] = len(doc["spans"])
+                    self._chunk_lookup[chunk_id] = (filename, len(doc["spans"]) - 1)
+                pending += 1
+                if pending >= EMBEDDING_BATCH_SIZE:
+                    self._embed_tail(filename, pending)
+                    pending = 0
+            self._embed_tail(filename, pending)
+            doc["buffer"].close()
+            if not doc["chunk_count"]:
+                self.remove_document(filename)
+                return False, NO_TEXT_MESSAGE
             
-            return True, f"'{filename}' 문서가 추가되었습니다. ({len(chunks)}개 청크)"
+            return True, f"'{filename}' 문서가 추가되었습니다. ({doc['chunk_count']}개 청크)"
         
         except Exception as e:
+            self.remove_document(filename)
             return False, f"문서 처리 중 오류: {str(e)}"
     
+    def _new_buffer(self) -> TextBuffer:
+        """저장 방식에 맞는 문서 텍스트 버퍼 생성"""
+        if self.storage == "mmap":
+            os.makedirs(config.RAG_MMAP_DIR, exist_ok=True)
+            return MappedTextBuffer(os.path.join(config.RAG_MMAP_DIR, f"{uuid.uuid4().hex}.txt"))
+        return TextBuffer()
+    
+    def _embed_tail(self, filename: str, count: int):
+        """문서의 마지막 count개 청크를 임베딩 색인에 추가 (실패해도 키워드 검색은 사용 가능)"""
+        if self.vector_index is None or count <= 0:
+            return
+        chunk_ids = self.documents[filename]["chunk_ids"][-count:]
+        try:
+            vectors = embed_texts([self.get_chunk(chunk_id) for chunk_id in chunk_ids])
+            with self._lock:
+                self.vector_index.add(chunk_ids, vectors)
+        except Exception as e:
+            print(f"임베딩 생성 실패 ({filename}): {str(e)}")
+    
     def remove_document(self, filename: str) -> bool:
         """문서 제거"""
-        if filename in self.documents:
-            del self.documents[filename]
+        with self._lock:
+            if filename not in self.documents:
+                return False
+            chunk_ids = self.documents[filename]["chunk_ids"]
+            for chunk_id in chunk_ids:
+                self.index.remove(chunk_id)
+                del self._chunk_lookup[chunk_id]
+            if self.vector_index is not None:
+                self.vector_index.remove(chunk_ids)
+            self.documents.pop(filename)["buffer"].release()
             return True
-        return False
     
-    def get_all_chunks(self) -> List[str]:
-        """모든 문서의 청크 반환"""
+    def get_all_chunks(self, limit: int = None) -> List[str]:
+        """모든 문서의 청크 반환 (limit 지정 시 앞에서부터 limit개)"""
         all_chunks = []
-        for doc in self.documents.values():
-            all_chunks.extend(doc["chunks"])
+        with self._lock:
+            for doc in self.documents.values():
+                for span in doc["spans"]:
+                    if limit is not None and len(all_chunks) >= limit:
+                        return all_chunks
+                    all_chunks.append(doc["buffer"].chunk_text(span))
         return all_chunks
     
-    def search(self, query: str, top_k: int = 5) -> List[str]:
-        """모든 문서에서 검색"""
-        all_chunks = self.get_all_chunks()
-        if not all_chunks:
+    def get_chunk(self, chunk_id: int) -> str:
+        """청크 ID로 청크 텍스트 반환 (버퍼에서 잘라냄)"""
+        with self._lock:
+            filename, i = self._chunk_lookup[chunk_id]
+            doc = self.documents[filename]
+            return doc["buffer"].chunk_text(doc["spans"][i])
+    
+    def get_chunk_span(self, chunk_id: int) -> Tuple[str, ChunkSpan]:
+        """청크 ID로 (파일명, 위치 정보) 반환"""
+        with self._lock:
+            filename, i = self._chunk_lookup[chunk_id]
+            return filename, self.documents[filename]["spans"][i]
+    
+    def get_chunk_source(self, chunk_id: int) -> Optional[Dict]:
+        """청크 출처 {filename, page}"""
+        filename, span = self.get_chunk_span(chunk_id)
+        return {"filename": filename, "page": span.page}
+    
+    def get_chunk_count(self) -> int:
+        """전체 청크 수"""
+        return len(self._chunk_lookup)
+    
+    def get_document_text(self, filename: str) -> Optional[str]:
+        """문서 전체 텍스트 반환 (없으면 None)"""
+        with self._lock:
+            doc = self.documents.get(filename)
+            return doc["buffer"].text() if doc else None
+    
+    def lexical_search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """BM25 역색인 검색"""
+        with self._lock:
+            return self.index.search(query, top_k)
+    
+    def rerank_candidates(self, query: str, chunk_ids: List[int]) -> List[Tuple[int, float]]:
+        """
+        proximity_rerank와 같은 점수를 BM25 색인의 토큰 위치로 계산
+        
+        후보 청크를 다시 토큰화하지 않으므로 재정렬 비용이 BM25 검색과 비슷한 수준입니다.
+        """
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return [(chunk_id, 0.0) for chunk_id in chunk_ids]
+        query_lower = query.lower().strip()
+        with self._lock:
+            reranked = [
+                (chunk_id, _proximity_score(
+                    query_terms,
+                    self.index.term_positions(chunk_id, query_terms),
+                    query_lower in self.get_chunk(chunk_id).lower()
+                ))
+                for chunk_id in chunk_ids if chunk_id in self._chunk_lookup  # 그 사이 삭제된 청크 제외
+            ]
+        reranked.sort(key=lambda item: item[1], reverse=True)
+        return reranked
+    
+    def vector_search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """
+        임베딩 유사도 검색 (표현이 달라도 의미가 비슷한 청크를 찾음)
+        
+        Returns:
+            [(chunk_id, score), ...] - 벡터 색인이 없으면 빈 리스트
+        """
+        if self.vector_index is None or not len(self.vector_index):
+            return []
+        try:
+            query_vector = embed_texts([query])[0]
+        except Exception as e:
+            print(f"질의 임베딩 실패: {str(e)}")
             return []
-        return simple_retrieval(query, all_chunks, top_k)
+        with self._lock:
+            return self.vector_index.search(query_vector, top_k)
     
     def get_document_list(self) -> List[Dict]:
         """문서 목록 반환"""
-        return [
-            {"filename": fname, "chunk_count": doc["chunk_count"]}
-            for fname, doc in self.documents.items()
-        ]
+        with self._lock:
+            return [
+                {"filename": fname, "chunk_count": doc["chunk_count"]}
+                for fname, doc in self.documents.items()
+            ]
     
     def clear(self):
         """모든 문서 삭제"""
-        self.documents.clear()
+        with self._lock:
+            for doc in self.documents.values():
+                doc["buffer"].release()
+            self.documents.clear()
+            self.index.clear()
+            self._chunk_lookup.clear()
+            if self.vector_index is not None:
+                self.vector_index.clear()
 
 
-def answer_with_rag(query: str, document_store: DocumentStore, chat_history: List[Dict] = None) -> str:
+def build_context(chunks: List[str], max_chars: int = None) -> str:
+    """
+    검색된 청크로 프롬프트 컨텍스트 구성 (순위 순서대로 글자 수 예산 내에서)
+    
+    Args:
+        chunks: 순위순 청크 텍스트
+        max_chars: 컨텍스트 최대 글자 수 (기본: config.RAG_MAX_CONTEXT_CHARS)
+    """
+    max_chars = max_chars or config.RAG_MAX_CONTEXT_CHARS
+    selected = []
+    used = 0
+    for chunk in chunks:
+        remaining = max_chars - used
+        if remaining <= 0:
+            break
+        selected.append(chunk[:remaining])
+        used += len(selected[-1])
+    return "\n\n---\n\n".join(selected)
+
+
+def cite_chunk(document_store: BaseDocumentStore, chunk_id: int) -> str:
+    """청크 텍스트 앞에 [파일명 p.페이지] 출처 표기"""
+    text = document_store.get_chunk(chunk_id)
+    source = document_store.get_chunk_source(chunk_id)
+    if not source:
+        return text
+    return f"[{source['filename']} p.{source['page']}]\n{text}"
+
+
+def answer_with_rag(query: str, document_store: BaseDocumentStore, chat_history: List[Dict] = None) -> str:
     """
     RAG를 사용하여 문서 기반 질의응답
     
@@ -194,35 +1262,62 @@ def answer_with_rag(query: str, document_store: DocumentStore, chat_history: Lis
     Returns:
         AI 응답
     """
+    response_generator, _ = answer_with_rag_streaming(query, document_store, chat_history)
+    return "".join(response_generator)
+
+
+def answer_with_rag_streaming(query: str, document_store: BaseDocumentStore,
+                              chat_history: List[Dict] = None) -> tuple:
+    """
+    RAG 문서 기반 질의응답 (스트리밍 지원)
+    
+    검색과 프롬프트 구성은 호출 시 바로 수행하고, 답변은 토큰이 도착하는 대로 생성합니다.
+    
+    Args:
+        query: 사용자 질문
+        document_store: 문서 저장소
+        chat_history: 이전 대화 기록
+    
+    Returns:
+        (스트리밍 제너레이터, 검색 정보)
+        검색 정보: {"chunk_ids", "sources", "retrieval_ms", "prompt_ms", "ttft_ms", "total_ms"}
+        prompt_ms, ttft_ms(LLM 요청 → 첫 토큰), total_ms는 제너레이터를 소비하면서 채워집니다.
+    """
+    info = {"chunk_ids": [], "sources": [], "retrieval_ms": None, "prompt_ms": None, "ttft_ms": None, "total_ms": None}
+    
+    def message_gen(message: str):
+        yield message
+    
     if not config.OPENAI_API_KEY or config.OPENAI_API_KEY == "your_openai_api_key_here":
-        return "⚠️ OpenAI API 키가 설정되지 않았습니다."
+        return message_gen("⚠️ OpenAI API 키가 설정되지 않았습니다."), info
     
-    # 관련 문서 검색
-    relevant_chunks = document_store.search(query, top_k=5)
+    started = time.perf_counter()
+    
+    # 관련 문서 검색 (하이브리드 검색 + 재정렬), 출처(파일명/페이지)를 함께 표기
+    chunk_ids = [chunk_id for chunk_id, _ in document_store.hybrid_search(query)]
+    relevant_chunks = [cite_chunk(document_store, chunk_id) for chunk_id in chunk_ids]
     
     # 검색 결과가 없으면 전체 문서 청크 사용 (Fallback)
     if not relevant_chunks:
-        all_chunks = document_store.get_all_chunks()
-        if not all_chunks:
-            return "📚 업로드된 문서가 없습니다. 먼저 문서를 업로드해주세요."
         # 전체 문서의 앞부분 청크들 사용
-        relevant_chunks = all_chunks[:5]
+        relevant_chunks = document_store.get_all_chunks(limit=config.RAG_TOP_K)
+        if not relevant_chunks:
+            return message_gen("📚 업로드된 문서가 없습니다. 먼저 문서를 업로드해주세요."), info
     
-    # 컨텍스트 구성
-    context = "\n\n---\n\n".join(relevant_chunks)
+    info["chunk_ids"] = chunk_ids
+    info["sources"] = [source for source in map(document_store.get_chunk_source, chunk_ids) if source]
+    info["retrieval_ms"] = round((time.perf_counter() - started) * 1000, 1)
     
-    try:
-        from langchain_openai import ChatOpenAI
-        from langchain_core.prompts import ChatPromptTemplate
-        from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-        
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.3,
-            api_key=config.OPENAI_API_KEY
-        )
-        
-        system_prompt = f"""당신은 투자 문서 분석 전문가입니다. 
+    def generate():
+        try:
+            from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+            
+            prompt_started = time.perf_counter()
+            
+            # 컨텍스트 구성
+            context = build_context(relevant_chunks)
+            
+            system_prompt = f"""당신은 투자 문서 분석 전문가입니다. 
 사용자가 업로드한 문서의 내용을 기반으로 질문에 답변해주세요.
 
 **참고 문서 내용:**
@@ -232,30 +1327,167 @@ def answer_with_rag(query: str, document_store: DocumentStore, chat_history: Lis
 1. 반드시 제공된 문서 내용을 기반으로 답변하세요.
 2. 문서에 없는 내용은 "문서에서 해당 정보를 찾을 수 없습니다"라고 답변하세요.
 3. 답변은 명확하고 구체적으로 작성하세요.
-4. 관련 인용구가 있다면 함께 언급하세요."""
-        
-        messages = [SystemMessage(content=system_prompt)]
-        
-        # 이전 대화 기록 추가
-        if chat_history:
-            for msg in chat_history[-4:]:
-                if msg["role"] == "user":
-                    messages.append(HumanMessage(content=msg["content"]))
-                elif msg["role"] == "assistant":
-                    messages.append(AIMessage(content=msg["content"]))
-        
-        messages.append(HumanMessage(content=query))
-        
-        response = llm.invoke(messages)
-        return response.content
-        
-    except Exception as e:
-        return f"❌ 오류가 발생했습니다: {str(e)}"
+4. 관련 인용구가 있다면 함께 언급하세요.
+5. 참고 문서의 [파일명 p.페이지] 표기를 사용해 답변의 출처를 밝혀주세요."""
+            
+            messages = [SystemMessage(content=system_prompt)]
+            
+            # 이전 대화 기록 추가
+            if chat_history:
+                for msg in chat_history[-4:]:
+                    if msg["role"] == "user":
+                        messages.append(HumanMessage(content=msg["content"]))
+                    elif msg["role"] == "assistant":
+                        messages.append(AIMessage(content=msg["content"]))
+            
+            messages.append(HumanMessage(content=query))
+            info["prompt_ms"] = round((time.perf_counter() - prompt_started) * 1000, 1)
+            
+            llm = get_chat_model("gpt-4o-mini", temperature=0.3)
+            
+            request_started = time.perf_counter()
+            for chunk in llm.stream(messages):
+                if chunk.content:
+                    if info["ttft_ms"] is None:
+                        info["ttft_ms"] = round((time.perf_counter() - request_started) * 1000, 1)
+                    yield chunk.content
+            
+        except Exception as e:
+            yield f"❌ 오류가 발생했습니다: {str(e)}"
+        finally:
+            info["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    
+    return generate(), info
 
 
-def summarize_document(document_store: DocumentStore, filename: str = None) -> str:
+# 요약 단계별 프롬프트 (map: 청크 묶음 요약, reduce: 부분 요약 통합, final: 최종 핵심 포인트)
+_SUMMARY_PROMPTS = {
+    "map": "다음은 투자 문서의 일부입니다. 수치, 실적, 리스크, 전망 등 핵심 사실 위주로 간결하게 요약해주세요.",
+    "reduce": "다음은 같은 문서(들)의 부분 요약입니다. 중복을 없애고 중요한 수치와 사실을 유지해 하나의 요약으로 통합해주세요.",
+    "final": "당신은 문서 요약 전문가입니다. 투자 관련 문서를 핵심 내용 위주로 요약해주세요.",
+}
+_SUMMARY_FINAL_REQUEST = "다음 문서를 3-5개의 핵심 포인트로 요약해주세요:\n\n"
+
+_summary_cache = LRUCache(config.SUMMARY_CACHE_SIZE)  # (단계, 입력 텍스트) 해시 -> 요약 (세션 간 공유, 문서별 통합 요약 포함)
+_summary_cache_lock = threading.Lock()
+
+
+def _cached_summaries(llm, kind: str, texts: List[str]) -> List[str]:
     """
-    문서 요약 생성
+    단계별 프롬프트로 여러 텍스트를 병렬 요약 (이미 요약한 텍스트는 캐시 사용)
+    
+    동시 호출 수는 config.SUMMARY_MAX_CONCURRENCY로 제한합니다.
+    """
+    from langchain_core.messages import HumanMessage, SystemMessage
+    
+    keys = [_text_hash(f"{kind}\0{text}") for text in texts]
+    with _summary_cache_lock:
+        summaries = {key: _summary_cache.get(key) for key in keys}
+    missing = {key: text for key, text in zip(keys, texts) if summaries[key] is None}
+    
+    if missing:
+        request = _SUMMARY_FINAL_REQUEST if kind == "final" else ""
+        responses = llm.batch(
+            [
+                [SystemMessage(content=_SUMMARY_PROMPTS[kind]), HumanMessage(content=request + text)]
+                for text in missing.values()
+            ],
+            config={"max_concurrency": config.SUMMARY_MAX_CONCURRENCY}
+        )
+        with _summary_cache_lock:
+            for key, response in zip(missing, responses):
+                _summary_cache[key] = summaries[key] = response.content
+    
+    return [summaries[key] for key in keys]
+
+
+def _group_summaries(summaries: List[str], max_tokens: int) -> List[str]:
+    """예산 안에서 이웃한 요약끼리 묶음 (한 묶음에 최소 2개를 넣어 단계마다 개수가 줄도록)"""
+    groups, group, group_tokens = [], [], 0
+    for summary in summaries:
+        tokens = count_tokens(summary)
+        if len(group) >= 2 and group_tokens + tokens > max_tokens:
+            groups.append(group)
+            group, group_tokens = [], 0
+        group.append(summary)
+        group_tokens += tokens
+    if group:
+        groups.append(group)
+    return ["\n\n".join(group) for group in groups]
+
+
+def _reduce_summaries(llm, summaries: List[str], max_tokens: int, max_levels: int = 5) -> List[str]:
+    """
+    부분 요약의 합이 max_tokens 안에 들어올 때까지 묶음 단위로 계층적으로 통합
+    """
+    for _ in range(max_levels):
+        if len(summaries) <= 1 or sum(count_tokens(summary) for summary in summaries) <= max_tokens:
+            break
+        summaries = _cached_summaries(llm, "reduce", _group_summaries(summaries, max_tokens))
+    return summaries
+
+
+def _summary_groups(text: str) -> List[str]:
+    """문서를 map 단계 묶음(config.SUMMARY_CHUNK_TOKENS)으로 나눔"""
+    buffer = TextBuffer()
+    spans = iter_structured_chunks([text], buffer, max_tokens=config.SUMMARY_CHUNK_TOKENS, overlap_tokens=0)
+    return [buffer.slice(span.start, span.end) for span in spans]
+
+
+def _document_summaries(llm, texts: List[str], max_tokens: int, max_levels: int = 5) -> List[str]:
+    """
+    문서마다 통합 요약 하나를 만듦 (문서 내용 해시로 캐시)
+    
+    - 짧은 문서(묶음 1개)는 원문을 그대로 사용
+    - 캐시에 없는 문서들의 묶음을 한 번에 병렬 요약(map)하고, reduce도 단계마다 모든 문서의 호출을 한 번에 보냄
+      (동시 호출 수는 config.SUMMARY_MAX_CONCURRENCY로 제한)
+    """
+    keys = [_text_hash(f"document\0{text}") for text in texts]
+    results: List[Optional[str]] = [None] * len(texts)
+    parts: Dict[int, List[str]] = {}  # 아직 통합 요약이 없는 문서 -> 부분 요약
+    with _summary_cache_lock:
+        for i, key in enumerate(keys):
+            results[i] = _summary_cache.get(key)
+    for i, text in enumerate(texts):
+        if results[i] is None:
+            groups = _summary_groups(text)
+            if len(groups) <= 1:
+                results[i] = text
+            else:
+                parts[i] = groups
+    
+    # map: 모든 문서의 묶음을 한 번에 요약
+    flat = [group for groups in parts.values() for group in groups]
+    summaries = iter(_cached_summaries(llm, "map", flat)) if flat else iter(())
+    parts = {i: [next(summaries) for _ in groups] for i, groups in parts.items()}
+    
+    # reduce: 문서마다 하나가 될 때까지 (예산 안이면 전부 한 번에 통합)
+    for _ in range(max_levels):
+        pending = {i: doc_parts for i, doc_parts in parts.items() if len(doc_parts) > 1}
+        if not pending:
+            break
+        requests = {
+            i: (["\n\n".join(doc_parts)] if sum(count_tokens(part) for part in doc_parts) <= max_tokens
+                else _group_summaries(doc_parts, max_tokens))
+            for i, doc_parts in pending.items()
+        }
+        reduced = iter(_cached_summaries(llm, "reduce", [text for texts in requests.values() for text in texts]))
+        for i, texts in requests.items():
+            parts[i] = [next(reduced) for _ in texts]
+    
+    with _summary_cache_lock:
+        for i, doc_parts in parts.items():
+            results[i] = _summary_cache[keys[i]] = "\n\n".join(doc_parts)
+    return results
+
+
+def summarize_document(document_store: BaseDocumentStore, filename: str = None) -> str:
+    """
+    문서 요약 생성 (map-reduce)
+    
+    모든 문서의 청크 묶음을 한 번에 병렬 요약(map)하고, 문서마다 하나로 통합(reduce)한 뒤
+    문서 간 통합과 최종 요약을 합니다. 문서별 통합 요약은 내용 해시로 캐시하므로
+    문서를 하나 추가한 뒤 다시 요약하면 새 문서만 map/reduce 합니다.
     
     Args:
         document_store: 문서 저장소
@@ -268,33 +1500,29 @@ def summarize_document(document_store: DocumentStore, filename: str = None) -> s
         return "⚠️ OpenAI API 키가 설정되지 않았습니다."
     
     if filename:
-        if filename not in document_store.documents:
+        text = document_store.get_document_text(filename)
+        if text is None:
             return f"'{filename}' 문서를 찾을 수 없습니다."
-        text = document_store.documents[filename]["text"][:4000]  # 토큰 제한
+        documents = [(filename, text)]
     else:
-        all_text = " ".join([doc["text"][:2000] for doc in document_store.documents.values()])
-        text = all_text[:4000]
+        documents = [
+            (doc["filename"], document_store.get_document_text(doc["filename"]))
+            for doc in document_store.get_document_list()
+        ]
+    documents = [(name, text) for name, text in documents if text and text.strip()]
     
-    if not text.strip():
+    if not documents:
         return "요약할 문서가 없습니다."
     
     try:
-        from langchain_openai import ChatOpenAI
-        from langchain_core.prompts import ChatPromptTemplate
-        
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.3,
-            api_key=config.OPENAI_API_KEY
-        )
+        llm = get_chat_model("gpt-4o-mini", temperature=0.3)
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "당신은 문서 요약 전문가입니다. 투자 관련 문서를 핵심 내용 위주로 요약해주세요."),
-            ("human", f"다음 문서를 3-5개의 핵심 포인트로 요약해주세요:\n\n{text}")
-        ])
+        parts = _document_summaries(llm, [text for _, text in documents], config.SUMMARY_REDUCE_TOKENS)
+        if len(documents) > 1:
+            parts = [f"### {name}\n{part}" for (name, _), part in zip(documents, parts)]
         
-        response = llm.invoke(prompt.format_messages())
-        return response.content
+        parts = _reduce_summaries(llm, parts, config.SUMMARY_REDUCE_TOKENS)
+        return _cached_summaries(llm, "final", ["\n\n".join(parts)])[0]
         
     except Exception as e:
         return f"❌ 요약 중 오류가 발생했습니다: {str(e)}"
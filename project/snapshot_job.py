@@ -0,0 +1,116 @@
+"""
+일별 포트폴리오 평가 스냅샷 작업
+모든 사용자의 보유 종목 현재가를 한 번의 요청(get_quotes)으로 조회해
+사용자별 평가금액과 종목별 종가를 기록합니다. 같은 날 다시 실행하면 덮어씁니다.
+기준일은 DB의 다른 시각(거래 시각 등)과 같이 UTC 날짜를 사용합니다.
+
+사용법:
+    python snapshot_job.py              # 오늘(UTC) 스냅샷 저장 (cron 등에서 하루 한 번)
+    python snapshot_job.py --user-id 1  # 특정 사용자만
+"""
+import argparse
+import sys
+import threading
+import time
+from datetime import date, datetime
+
+import config
+from database import DBManager
+from tools import get_currency, get_quotes
+
+_scheduler_thread = None
+_scheduler_lock = threading.Lock()
+
+
+def utc_today() -> date:
+    """스냅샷 기준일 (UTC 날짜 - database의 utcnow 시각과 같은 기준)"""
+    return datetime.utcnow().date()
+
+
+def take_snapshot(db: DBManager = None, user_ids=None, snapshot_date: date = None) -> dict:
+    """
+    보유 종목 평가 스냅샷 저장
+    
+    현재가를 가져오지 못한 종목은 가장 최근 스냅샷 종가로, 그것도 없으면 평균 단가로 평가합니다.
+    
+    Returns:
+        {"snapshot_date", "users", "positions", "missing": [현재가 조회 실패 종목]}
+    """
+    db = db or DBManager()
+    snapshot_date = snapshot_date or utc_today()
+    
+    items = db.get_all_positions()
+    if user_ids is not None:
+        user_ids = set(user_ids)
+        items = [item for item in items if item.user_id in user_ids]
+    
+    tickers = sorted({item.ticker for item in items})
+    quotes = get_quotes(tickers)
+    missing = [ticker for ticker in tickers if ticker not in quotes]
+    fallback_prices = db.get_last_snapshot_prices(missing)
+    
+    positions = []
+    for item in items:
+        quote = quotes.get(item.ticker)
+        price = quote["price"] if quote else fallback_prices.get(item.ticker, item.avg_price or 0.0)
+        positions.append({
+            "user_id": item.user_id,
+            "ticker": item.ticker,
+            "shares": item.shares,
+            "price": price,
+            "avg_price": item.avg_price or 0.0,
+            "currency": quote["currency"] if quote else get_currency(item.ticker),
+        })
+    
+    db.save_snapshots(snapshot_date, positions, user_ids=user_ids)
+    return {
+        "snapshot_date": snapshot_date,
+        "users": len({position["user_id"] for position in positions}),
+        "positions": len(positions),
+        "missing": missing,
+    }
+
+
+def _run_scheduler(interval_minutes: int):
+    db = DBManager()
+    while True:
+        try:
+            if db.get_latest_snapshot_date() != utc_today():
+                result = take_snapshot(db)
+                print(f"📸 포트폴리오 스냅샷 저장: {result['snapshot_date']} "
+                      f"(사용자 {result['users']}명, 종목 {result['positions']}개)")
+        except Exception as e:
+            print(f"⚠️ 포트폴리오 스냅샷 실패: {e}")
+        time.sleep(interval_minutes * 60)
+
+
+def start_snapshot_scheduler(interval_minutes: int = config.SNAPSHOT_CHECK_MINUTES):
+    """
+    백그라운드 스냅샷 스케줄러 시작 (프로세스당 한 번, 여러 번 호출해도 안전)
+    interval_minutes마다 오늘 스냅샷이 있는지 확인하고 없으면 저장합니다.
+    """
+    global _scheduler_thread
+    with _scheduler_lock:
+        if _scheduler_thread is None:
+            _scheduler_thread = threading.Thread(
+                target=_run_scheduler, args=(interval_minutes,), name="portfolio-snapshot", daemon=True
+            )
+            _scheduler_thread.start()
+    return _scheduler_thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finsearcher 일별 포트폴리오 스냅샷")
+    parser.add_argument("--user-id", type=int, action="append", help="특정 사용자만 (여러 번 지정 가능)")
+    parser.add_argument("--date", type=date.fromisoformat, help="기준일 (YYYY-MM-DD, 기본: 오늘 UTC)")
+    args = parser.parse_args()
+    
+    result = take_snapshot(user_ids=args.user_id, snapshot_date=args.date)
+    print(f"✅ {result['snapshot_date']} 스냅샷 저장: 사용자 {result['users']}명, 종목 {result['positions']}개")
+    if result["missing"]:
+        print(f"⚠️ 현재가 조회 실패 (이전 종가/평균 단가로 평가): {', '.join(result['missing'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
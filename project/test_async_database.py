@@ -0,0 +1,112 @@
+"""
+비동기 DB 계층 테스트 (conftest.py가 지정한 임시 SQLite DB, aiosqlite)
+
+실행: python -m pytest test_async_database.py -q
+"""
+import asyncio
+import uuid
+
+import pytest
+
+import async_database
+import database
+from async_database import AsyncDBManager
+from database import ChatLogWriter, Portfolio, Trade, session_scope
+
+
+def run(coro_fn):
+    """테스트마다 새 이벤트 루프와 엔진으로 코루틴 실행"""
+    async def main():
+        db = AsyncDBManager()
+        try:
+            return await coro_fn(db)
+        finally:
+            await db.close()
+    return asyncio.run(main())
+
+
+def new_username():
+    return f"user_{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    """백그라운드 스레드 없이 flush를 직접 호출하는 채팅 로그 큐 (동기/비동기 계층이 함께 사용)"""
+    writer = ChatLogWriter()
+    monkeypatch.setattr(writer, "_start", lambda: None)
+    monkeypatch.setattr(database, "chat_log_writer", writer)
+    monkeypatch.setattr(async_database, "chat_log_writer", writer)
+    return writer
+
+
+def test_create_and_login_user():
+    username = new_username()
+    
+    async def scenario(db):
+        user, error = await db.create_user(username, "password", "aggressive")
+        duplicate, duplicate_error = await db.create_user(username, "other")
+        return (
+            user, error, duplicate, duplicate_error,
+            await db.login_user(username, "password"), await db.login_user(username, "wrong"),
+            await db.login_user(new_username(), "password")
+        )
+    
+    user, error, duplicate, duplicate_error, logged_in, wrong, missing = run(scenario)
+    assert error is None and user.settings == {"profile": "aggressive"}
+    assert duplicate is None and duplicate_error
+    assert logged_in.id == user.id
+    assert wrong is None and missing is None
+
+
+def test_buy_and_sell_update_position():
+    async def scenario(db):
+        user, _ = await db.create_user(new_username(), "password")
+        await db.record_trade(user.id, "AAPL", 10, 100)
+        await db.record_trade(user.id, "AAPL", 10, 200)
+        bought = [(item.shares, item.avg_price) for item in await db.get_portfolio(user.id)]
+        await db.record_trade(user.id, "AAPL", -5, 300)
+        partly_sold = [(item.shares, item.avg_price) for item in await db.get_portfolio(user.id)]
+        await db.record_trade(user.id, "AAPL", -15, 300)
+        return bought, partly_sold, await db.get_portfolio(user.id), await db.get_trades(user.id)
+    
+    bought, partly_sold, sold_out, trades = run(scenario)
+    # 매수는 같은 행에 합치며 평균 단가 갱신, 매도는 평균 단가 유지, 전량 매도하면 행 삭제
+    assert bought == [(20, 150)]
+    assert partly_sold == [(15, 150)]
+    assert sold_out == []
+    assert [trade.quantity for trade in trades] == [-15, -5, 10, 10]
+
+
+def test_oversell_is_rolled_back():
+    async def scenario(db):
+        user, _ = await db.create_user(new_username(), "password")
+        await db.record_trade(user.id, "005930.KS", 3, 70000)
+        with pytest.raises(ValueError):
+            await db.record_trade(user.id, "005930.KS", -5, 71000)
+        return user.id, [(item.shares, item.avg_price) for item in await db.get_portfolio(user.id)]
+    
+    user_id, holdings = run(scenario)
+    assert holdings == [(3, 70000)]
+    # 실패한 매도의 거래 기록도 함께 롤백됨
+    with session_scope() as session:
+        assert session.query(Trade).filter_by(user_id=user_id).count() == 1
+        assert session.query(Portfolio).filter_by(user_id=user_id).count() == 1
+
+
+def test_chat_page_includes_messages_waiting_in_the_sync_queue(writer):
+    async def scenario(db):
+        user, _ = await db.create_user(new_username(), "password")
+        await db.add_chat_message(user.id, "user", "삼성전자 어때?")
+        # 동기 DBManager가 큐에 넣고 아직 저장하지 않은 메시지
+        writer.add(user.id, "assistant", "반도체 업황이 개선되고 있습니다.")
+        before_flush = await db.get_chat_page(user.id)
+        writer.flush()
+        after_flush = await db.get_chat_page(user.id)
+        return before_flush, after_flush
+    
+    (messages, cursor), (flushed, _) = run(scenario)
+    expected = [("user", "삼성전자 어때?"), ("assistant", "반도체 업황이 개선되고 있습니다.")]
+    assert [(message.role, message.content) for message in messages] == expected
+    assert cursor is None
+    # 저장된 뒤에도 한 번씩만 보임
+    assert [(message.role, message.content) for message in flushed] == expected
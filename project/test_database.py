@@ -0,0 +1,157 @@
+"""
+DB 계층 테스트 (conftest.py가 지정한 임시 SQLite DB)
+
+실행: python -m pytest test_database.py -q
+"""
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import database
+from database import ChatArchive, ChatLog, ChatLogWriter, DBManager, session_scope
+
+
+@pytest.fixture
+def db():
+    return DBManager()
+
+
+@pytest.fixture
+def user(db):
+    created, error = db.create_user(f"user_{uuid.uuid4().hex[:8]}", "password")
+    assert error is None
+    return created
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    """백그라운드 스레드 없이 flush를 직접 호출하는 채팅 로그 큐"""
+    writer = ChatLogWriter()
+    monkeypatch.setattr(writer, "_start", lambda: None)
+    monkeypatch.setattr(database, "chat_log_writer", writer)
+    return writer
+
+
+def test_chat_page_is_not_blocked_by_a_flush_in_progress(db, user, writer, monkeypatch):
+    committed, release = threading.Event(), threading.Event()
+    write = writer._write
+    
+    def slow_write(rows):
+        # 커밋까지 마친 뒤 저장 중 목록에서 빠지기 전에 멈춤
+        write(rows)
+        committed.set()
+        release.wait(5)
+    
+    monkeypatch.setattr(writer, "_write", slow_write)
+    db.add_chat_message(user.id, "user", "안녕하세요")
+    flusher = threading.Thread(target=writer.flush)
+    flusher.start()
+    try:
+        assert committed.wait(5)
+        # flush가 DB 쓰기 중이어도 조회가 막히지 않고, DB와 저장 중 목록에 모두 있는 메시지는 한 번만 보임
+        result = []
+        reader = threading.Thread(target=lambda: result.append(db.get_chat_page(user.id)))
+        reader.start()
+        reader.join(2)
+        assert not reader.is_alive()
+        messages, cursor = result[0]
+        assert [message.content for message in messages] == ["안녕하세요"]
+        assert cursor is None
+    finally:
+        release.set()
+        flusher.join(5)
+    
+    assert [message.content for message in db.get_chat_history(user.id)] == ["안녕하세요"]
+    assert writer.pending_for(user.id) == []
+
+
+def test_failed_flush_keeps_messages_for_retry(db, user, writer, monkeypatch):
+    def failing_write(rows):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+    
+    db.add_chat_message(user.id, "user", "첫 질문")
+    monkeypatch.setattr(writer, "_write", failing_write)
+    with pytest.raises(OperationalError):
+        writer.flush()
+    assert [message.content for message in db.get_chat_history(user.id)] == ["첫 질문"]
+    
+    monkeypatch.delattr(writer, "_write")
+    writer.flush()
+    assert [message.content for message in db.get_chat_history(user.id)] == ["첫 질문"]
+    assert writer.pending_for(user.id) == []
+
+
+def test_holdings_as_of_resets_cost_basis_after_closing_a_position(db, user):
+    trades = [
+        ("AAPL", 10, 100.0, datetime(2024, 1, 2)),
+        ("AAPL", -10, 120.0, datetime(2024, 1, 3)),
+        ("AAPL", 10, 200.0, datetime(2024, 1, 4)),
+        # 일부 매도는 단가를 바꾸지 않음: (5 * 100 + 5 * 200) / 10 = 150
+        ("MSFT", 10, 100.0, datetime(2024, 1, 2)),
+        ("MSFT", -5, 130.0, datetime(2024, 1, 3)),
+        ("MSFT", 5, 200.0, datetime(2024, 1, 4)),
+    ]
+    for ticker, shares, price, traded_at in trades:
+        db.record_trade(user.id, ticker, shares, price, traded_at=traded_at)
+    
+    holdings = db.get_holdings_as_of(user.id, datetime(2024, 1, 4).date())
+    assert holdings == [
+        {"ticker": "AAPL", "shares": 10, "avg_price": pytest.approx(200.0)},
+        {"ticker": "MSFT", "shares": 10, "avg_price": pytest.approx(150.0)},
+    ]
+    portfolio = {item.ticker: (item.shares, item.avg_price) for item in db.get_portfolio(user.id)}
+    assert portfolio == {holding["ticker"]: (holding["shares"], holding["avg_price"]) for holding in holdings}
+    
+    assert db.get_holdings_as_of(user.id, datetime(2024, 1, 3).date()) == [
+        {"ticker": "MSFT", "shares": 5, "avg_price": pytest.approx(100.0)},
+    ]
+
+
+@pytest.mark.parametrize("codec", ["zlib", None])
+def test_archived_chat_logs_are_read_back_transparently(db, user, codec):
+    now = datetime.utcnow()
+    # 오래된 메시지 두 달치(보관 대상) + 최근 메시지
+    timestamps = [now - timedelta(days=days, minutes=i) for days in (150, 120) for i in range(3)]
+    timestamps += [now - timedelta(days=1, minutes=i) for i in range(2)]
+    with session_scope() as session:
+        session.add_all([
+            ChatLog(user_id=user.id, role="user" if i % 2 else "assistant",
+                    content=f"메시지 {i} " + "긴 마크다운 답변 " * 50, timestamp=timestamp)
+            for i, timestamp in enumerate(sorted(timestamps))
+        ])
+    expected = [message.content for message in db.get_chat_history(user.id, limit=100)]
+    assert len(expected) == 8
+    
+    stats = db.archive_chat_logs(older_than_days=90, codec=codec)
+    assert stats["messages"] == 6 and stats["archives"] == 2
+    assert stats["compressed_bytes"] < stats["raw_bytes"]
+    with session_scope() as session:
+        assert session.query(ChatLog).filter_by(user_id=user.id).count() == 2
+        assert session.query(ChatArchive).filter_by(user_id=user.id).count() == 2
+    
+    assert [message.content for message in db.get_chat_history(user.id, limit=100)] == expected
+    # 페이지를 이어 읽어도 보관본 경계에서 빠지거나 겹치는 메시지가 없음
+    pages, cursor = [], None
+    while True:
+        messages, cursor = db.get_chat_page(user.id, limit=3, before=cursor)
+        pages = messages + pages
+        if cursor is None:
+            break
+    assert [message.content for message in pages] == expected
+    
+    db.clear_chat_history(user.id)
+    assert db.get_chat_history(user.id) == []
+
+
+def test_last_snapshot_time_changes_when_snapshots_are_saved(db, user):
+    assert db.get_last_snapshot_at(user.id) is None
+    position = {"user_id": user.id, "ticker": "AAPL", "shares": 10, "price": 200.0, "avg_price": 150.0,
+                "currency": "USD"}
+    db.save_snapshots(datetime(2024, 1, 2).date(), [position])
+    first = db.get_last_snapshot_at(user.id)
+    db.save_snapshots(datetime(2024, 1, 2).date(), [dict(position, price=210.0)])
+    assert first is not None and db.get_last_snapshot_at(user.id) > first
+    assert [snapshot.total_value for snapshot in db.get_equity_curve(user.id)] == [2100.0]
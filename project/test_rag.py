@@ -0,0 +1,177 @@
+"""
+RAG 검색 테스트 (오프라인, 임베딩 없음)
+
+실행: python -m pytest test_rag.py -q
+"""
+import random
+from types import SimpleNamespace
+
+import config
+import rag_utils
+from bench_rag import build_corpus, run_queries
+from rag_utils import (
+    BM25Index, DocumentStore, NO_TEXT_MESSAGE, TextBuffer, count_tokens, iter_structured_chunks, proximity_rerank,
+    simple_retrieval, summarize_document, tokenize
+)
+
+
+def make_store(documents):
+    store = DocumentStore(use_embeddings=False, storage="memory")
+    for filename, text in documents:
+        store.add_document(filename, text.encode("utf-8"))
+    return store
+
+
+def test_tokenize_matches_korean_particles():
+    tokens = tokenize("삼성전자의 2023년 매출")
+    assert "삼성전자의" in tokens and "삼성" in tokens and "전자" in tokens
+    assert "2023" in tokens and "매출" in tokens
+
+
+def test_bm25_ranks_matching_chunk_first_and_supports_removal():
+    index = BM25Index()
+    index.add(1, "애플 매출은 증가했다. 아이폰 판매 호조.")
+    index.add(2, "테슬라 영업이익은 감소했다.")
+    index.add(3, "삼성전자 배당금 확대.")
+    
+    assert index.search("테슬라 영업이익")[0][0] == 2
+    index.remove(2)
+    assert all(chunk_id != 2 for chunk_id, _ in index.search("테슬라 영업이익"))
+    assert len(index) == 2
+
+
+def test_search_recall_is_not_worse_than_simple_retrieval():
+    documents, facts = build_corpus(30)
+    queries = random.Random(7).sample(facts, 40)
+    store = make_store(documents)
+    
+    simple_chunks = [store.get_chunk(chunk_id) for chunk_id in range(store.get_chunk_count())]
+    _, simple_recall = run_queries(lambda q, k: simple_retrieval(q, simple_chunks, top_k=k), queries, 3)
+    _, search_recall = run_queries(lambda q, k: store.search(q, k), queries, 3)
+    
+    assert search_recall >= simple_recall
+    assert search_recall >= 0.7
+
+
+def test_index_rerank_matches_text_rerank():
+    documents, facts = build_corpus(10)
+    store = make_store(documents)
+    
+    for fact in random.Random(3).sample(facts, 20):
+        # 색인의 토큰 위치로 계산한 재정렬이 청크를 다시 토큰화한 결과와 같아야 함
+        assert store.hybrid_search(fact["query"], top_k=5) == \
+            store.hybrid_search(fact["query"], top_k=5, reranker=proximity_rerank)
+
+
+def test_rerank_keeps_vector_only_hit_at_its_fused_rank():
+    store = make_store([
+        ("a.txt", "테슬라 매출 발표 일정이 공개되었다."),
+        ("b.txt", "테슬라 공장 증설 계획."),
+        ("c.txt", "매출 채권 회전율 설명."),
+        ("paraphrase.txt", "전기차 업체의 판매 실적이 크게 증가했다."),
+    ])
+    paraphrase_id = store.documents["paraphrase.txt"]["chunk_ids"][0]
+    # 질의 토큰이 하나도 없는 청크를 임베딩 검색이 1위로 찾은 상황
+    store.vector_search = lambda query, top_k=5: [(paraphrase_id, 0.9)]
+    
+    results = [chunk_id for chunk_id, _ in store.hybrid_search("테슬라 매출 늘었나?", top_k=2, rerank=True)]
+    
+    assert paraphrase_id in results
+    assert store.get_chunk(results[0]).startswith("테슬라 매출")
+
+
+def test_search_finds_fact_in_its_document():
+    store = make_store([
+        ("a.txt", "애플의 2021년 매출은 3,658억달러였다.\n\n테슬라의 2021년 영업이익은 65억달러였다."),
+        ("b.txt", "삼성전자의 2021년 매출은 279조원이었다. 반도체 호황이 이어졌다."),
+    ])
+    
+    assert "279조원" in store.search("삼성전자 2021년 매출 얼마야?", top_k=1)[0]
+
+
+def test_structured_chunks_of_empty_input():
+    assert list(iter_structured_chunks([], TextBuffer())) == []
+    assert list(iter_structured_chunks(["", "  \n"], TextBuffer())) == []
+    ok, message = DocumentStore(use_embeddings=False).add_document("empty.txt", b"")
+    assert (ok, message) == (False, NO_TEXT_MESSAGE)
+
+
+def test_structured_chunks_stay_within_token_budget():
+    # 짧은 문장 사이의 빈 줄도 토큰이므로 문장별 토큰 합만으로는 예산을 넘김
+    rng = random.Random(1)
+    text = "".join(f"항목 {i}: 매출 {rng.randint(1, 999)}억원.\n\n" for i in range(400))
+    buffer = TextBuffer()
+    spans = list(iter_structured_chunks([text[i:i + 500] for i in range(0, len(text), 500)], buffer,
+                                        max_tokens=300, overlap_tokens=50))
+    assert len(spans) > 1
+    assert all(count_tokens(buffer.chunk_text(span)) <= 300 for span in spans)
+    assert spans[0].start == 0 and spans[-1].end == len(text.rstrip())
+
+
+class FakeSummaryLLM:
+    """요약 호출을 (단계, 입력) 단위로 기록하는 가짜 LLM"""
+    def __init__(self):
+        self.batches = []
+    
+    def batch(self, requests, config=None):
+        kinds = {prompt: kind for kind, prompt in rag_utils._SUMMARY_PROMPTS.items()}
+        self.batches.append([(kinds[system.content], human.content) for system, human in requests])
+        return [SimpleNamespace(content=f"요약{len(human.content)}") for _, human in requests]
+
+
+def test_summary_maps_all_documents_at_once_and_caches_each_document(monkeypatch):
+    llm = FakeSummaryLLM()
+    monkeypatch.setattr(rag_utils, "get_chat_model", lambda *args, **kwargs: llm)
+    monkeypatch.setattr(rag_utils, "_summary_cache", rag_utils.LRUCache(100))
+    monkeypatch.setattr(config, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(config, "SUMMARY_CHUNK_TOKENS", 60)
+    documents, _ = build_corpus(3, facts_per_doc=6)
+    store = make_store(documents[:2])
+    
+    summarize_document(store)
+    # map은 두 문서의 묶음을 한 번에, reduce는 문서별로 한 번씩 한 배치로
+    assert [{kind for kind, _ in batch} for batch in llm.batches] == [{"map"}, {"reduce"}, {"final"}]
+    assert len(llm.batches[1]) == 2
+    
+    llm.batches.clear()
+    store.add_document(documents[2][0], documents[2][1].encode("utf-8"))
+    summarize_document(store)
+    # 새 문서만 map/reduce 하고 기존 문서는 캐시된 통합 요약을 사용
+    map_inputs = [text for kind, text in llm.batches[0]]
+    assert all(text in documents[2][1] for text in map_inputs)
+    assert sum(kind == "reduce" for batch in llm.batches for kind, _ in batch) == 1
+
+
+
+def test_summary_cache_is_bounded(monkeypatch):
+    llm = FakeSummaryLLM()
+    monkeypatch.setattr(rag_utils, "_summary_cache", rag_utils.LRUCache(1))
+    
+    # 캐시보다 많은 텍스트를 한 번에 요약해도 모든 결과를 돌려줌
+    assert rag_utils._cached_summaries(llm, "map", ["가", "나나", "다다다"]) == ["요약1", "요약2", "요약3"]
+    assert len(rag_utils._summary_cache) == 1
+
+class FakeEmbeddings:
+    """텍스트 길이로 2차원 벡터를 만들고 호출한 텍스트를 기록하는 가짜 임베딩 클라이언트"""
+    def __init__(self):
+        self.calls = []
+    
+    def embed_documents(self, texts):
+        self.calls.extend(texts)
+        return [[len(text), 1.0] for text in texts]
+
+
+def test_embedding_cache_is_bounded(monkeypatch):
+    client = FakeEmbeddings()
+    monkeypatch.setattr(rag_utils, "_embeddings_client", client)
+    monkeypatch.setattr(rag_utils, "_embedding_cache", rag_utils.LRUCache(2))
+    
+    # 캐시보다 많은 텍스트를 한 번에 임베딩해도 모든 행이 채워짐
+    vectors = rag_utils.embed_texts(["a", "bb", "ccc"])
+    assert vectors.shape == (3, 2) and len(rag_utils._embedding_cache) == 2
+    
+    client.calls.clear()
+    rag_utils.embed_texts(["ccc", "bb"])
+    assert client.calls == []  # 최근 항목은 캐시 사용
+    rag_utils.embed_texts(["a"])
+    assert client.calls == ["a"]  # 밀려난 항목은 다시 임베딩
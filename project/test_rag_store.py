@@ -0,0 +1,132 @@
+"""
+영구 문서 저장소 테스트 (임시 SQLite 파일, 임베딩 없음)
+
+실행: python -m pytest test_rag_store.py -q
+"""
+
+import pytest
+
+import config
+import rag_store
+from rag_store import PersistentDocumentStore
+from rag_utils import BaseDocumentStore, DocumentStore
+
+PAGES = [
+    "삼성전자의 2023년 매출은 258조원이었다. 반도체 업황이 부진했다.\n",
+    "애플의 2023년 영업이익은 1,143억달러였다. 서비스 매출이 늘었다.\n",
+    "테슬라의 2023년 순이익은 150억달러였다. 가격 인하가 이어졌다.\n",
+]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # 여러 페이지 문서처럼 처리되도록 페이지 목록을 그대로 전달
+    monkeypatch.setattr(rag_store, "iter_document_pages", lambda filename, file_bytes, progress=None: iter(PAGES))
+    return PersistentDocumentStore(1, db_path=str(tmp_path / "documents.db"), use_embeddings=False)
+
+
+def test_base_document_store_is_abstract():
+    with pytest.raises(TypeError):
+        BaseDocumentStore()
+    assert isinstance(DocumentStore(use_embeddings=False), BaseDocumentStore)
+
+
+def test_chunks_are_sliced_from_a_single_copy_of_the_text(store):
+    ok, _ = store.add_document("report.pdf", b"report")
+    assert ok
+    
+    full_text = "".join(PAGES)
+    assert store.get_document_text("report.pdf") == full_text
+    chunk_ids = [row[0] for row in store.conn.execute("SELECT id FROM chunks ORDER BY idx")]
+    assert [store.get_chunk(chunk_id) for chunk_id in chunk_ids] == store.get_all_chunks()
+    assert all(chunk in full_text for chunk in store.get_all_chunks())
+    assert "258조원" in store.search("삼성전자 매출", top_k=1)[0]
+    
+    # 본문은 document_pages에만 저장 (documents/chunks에는 텍스트 컬럼이 없음)
+    stored_chars = store.conn.execute("SELECT SUM(LENGTH(text)) FROM document_pages").fetchone()[0]
+    assert stored_chars == len(full_text)
+    assert "content" not in {row[1] for row in store.conn.execute("PRAGMA table_info(chunks)")}
+    assert "text" not in {row[1] for row in store.conn.execute("PRAGMA table_info(documents)")}
+
+
+def test_same_file_is_shared_between_users_and_removed_with_last_reference(store, tmp_path):
+    other = PersistentDocumentStore(2, db_path=str(tmp_path / "documents.db"), use_embeddings=False)
+    store.add_document("report.pdf", b"report")
+    ok, message = other.add_document("copy.pdf", b"report")
+    assert ok and "재사용" in message
+    assert store.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0] == 1
+    
+    store.remove_document("report.pdf")
+    assert other.get_document_text("copy.pdf") == "".join(PAGES)
+    other.remove_document("copy.pdf")
+    assert store.conn.execute("SELECT COUNT(*) FROM document_pages").fetchone()[0] == 0
+    assert store.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0] == 0
+
+
+def test_chunks_are_committed_while_the_document_is_being_read(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DOCUMENT_COMMIT_CHUNKS", 1)
+    reader = PersistentDocumentStore(2, db_path=str(tmp_path / "documents.db"), use_embeddings=False)
+    seen = []
+    
+    def pages(filename, file_bytes, progress=None):
+        for page in PAGES * 2:
+            # 지금까지 커밋된 청크 수와 완료 여부 확인 (청크 예산을 넘기도록 페이지를 길게 만듦)
+            seen.append(store.conn.execute("SELECT chunk_count, complete FROM documents").fetchone())
+            yield page * 20
+    
+    monkeypatch.setattr(rag_store, "iter_document_pages", pages)
+    ok, _ = store.add_document("report.pdf", b"report")
+    assert ok
+    assert seen[0] == (0, 0)
+    assert seen[-1][0] > 0 and seen[-1][1] == 0
+    assert store.search("삼성전자 매출", top_k=1)
+    assert store.conn.execute("SELECT complete FROM documents").fetchone()[0] == 1
+    assert reader.get_chunk_count() == 0
+
+
+def test_failed_ingest_removes_partial_document(store, monkeypatch):
+    monkeypatch.setattr(config, "DOCUMENT_COMMIT_CHUNKS", 1)
+    
+    def pages(filename, file_bytes, progress=None):
+        yield from PAGES[:2]
+        raise RuntimeError("손상된 페이지")
+    
+    monkeypatch.setattr(rag_store, "iter_document_pages", pages)
+    ok, message = store.add_document("broken.pdf", b"broken")
+    assert not ok and "손상된 페이지" in message
+    assert store.get_document_list() == []
+    for table in ("documents", "document_pages", "chunks", "chunk_fts"):
+        assert store.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0
+
+
+def test_document_without_text_is_rejected(store, monkeypatch):
+    monkeypatch.setattr(rag_store, "iter_document_pages", lambda filename, file_bytes, progress=None: iter([]))
+    ok, message = store.add_document("scan.pdf", b"scan")
+    assert not ok and message == rag_store.NO_TEXT_MESSAGE
+    assert store.get_document_list() == []
+    assert store.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0] == 0
+
+
+def test_interrupted_ingest_is_redone(store):
+    store.conn.execute("INSERT INTO documents (content_hash, chunk_count, complete) VALUES (?, 0, 0)",
+                       (rag_store.content_hash(b"report"),))
+    store.conn.commit()
+    ok, message = store.add_document("report.pdf", b"report")
+    assert ok and "재사용" not in message
+    assert store.get_document_text("report.pdf") == "".join(PAGES)
+
+
+def test_vector_index_built_during_a_change_is_not_kept(store, monkeypatch):
+    fetch = store._fetch
+    
+    def fetch_during_ingest(sql, params=()):
+        rows = fetch(sql, params)
+        store._invalidate_vector_index()  # 색인을 만드는 사이 다른 스레드가 문서를 추가한 상황
+        return rows
+    
+    monkeypatch.setattr(store, "_fetch", fetch_during_ingest)
+    assert len(store._load_vector_index()) == 0
+    assert store._vector_index is None
+    
+    monkeypatch.setattr(store, "_fetch", fetch)
+    assert store._load_vector_index() is store._vector_index
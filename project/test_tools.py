@@ -0,0 +1,104 @@
+"""
+도구 함수 테스트 (네트워크/LLM 호출 없음)
+
+실행: python -m pytest test_tools.py -q
+"""
+import importlib
+import json
+
+import pytest
+
+pytest.importorskip("pandas_ta")  # tools 모듈 임포트에 필요
+
+import numpy as np
+
+import tools
+
+
+def tickers(text):
+    return [match["ticker"] for match in tools.detect_tickers(text)]
+
+
+def test_detect_tickers_matches_names_and_codes():
+    assert tickers("삼성전자랑 apple 비교해줘") == ["005930.KS", "AAPL"]
+    assert tickers("애플은 어때? 000660.KS도") == ["AAPL", "000660.KS"]
+    assert tickers("NAVER의 실적") == ["035420.KS"]
+
+
+def test_detect_tickers_respects_word_boundaries():
+    assert tickers("pineapple juice") == []
+    assert tickers("파인애플 주스") == []
+    assert tickers("googleplex tour") == []
+    assert tickers("1005930.KS") == []
+
+
+def test_to_tool_json_emits_strict_json():
+    payload = {
+        "price": np.float64(101.5),
+        "volume": np.int64(1200),
+        "rsi": float("nan"),
+        "macd": np.float64("nan"),
+        "history": [1.0, float("inf")],
+        "news": [],
+        "per": None,
+    }
+    
+    text = tools.to_tool_json(payload)
+    # None만 빠지고 빈 리스트는 "뉴스 없음"으로 남음
+    assert json.loads(text) == {"price": 101.5, "volume": 1200, "history": [1.0, None], "news": []}
+    assert "NaN" not in text
+
+
+def test_resolved_tickers_are_bounded_and_skip_failures(monkeypatch):
+    tools._resolve_ticker_cached.cache_clear()
+    calls = []
+    
+    def fake_normalize(text):
+        calls.append(text)
+        return {"error": "not found"} if text == "없는종목" else {"ticker": "TEST", "name": text, "original": text}
+    
+    monkeypatch.setattr(tools, "normalize_ticker", fake_normalize)
+    
+    assert tools.resolve_ticker_for_chat("Test Corp")["ticker"] == "TEST"
+    assert tools.resolve_ticker_for_chat(" Test Corp ")["ticker"] == "TEST"
+    assert "error" in tools.resolve_ticker_for_chat("없는종목")
+    assert "error" in tools.resolve_ticker_for_chat("없는종목")
+    assert calls == ["Test Corp", "없는종목", "없는종목"]
+    assert tools._resolve_ticker_cached.cache_info().maxsize is not None
+
+
+def test_chat_tools_use_the_app_cache(monkeypatch):
+    pytest.importorskip("streamlit")
+    # app_cache는 import 시 챗봇 도구의 조회 함수를 캐시 버전으로 등록 (테스트 후 원래대로 복원)
+    monkeypatch.setattr(tools, "_chat_fetchers", dict(tools._chat_fetchers))
+    app_cache = importlib.import_module("app_cache")
+    assert tools._chat_fetchers["quotes"] is app_cache.get_quotes
+    app_cache._quotes.clear()
+    calls = []
+    
+    def fake_quotes(symbols):
+        calls.append(symbols)
+        return {symbol: {"price": 100.0, "change_pct": 1.0, "currency": "USD"} for symbol in symbols}
+    
+    monkeypatch.setattr(tools, "get_quotes", fake_quotes)
+    first = json.loads(tools.market_status_for_chat())
+    second = json.loads(tools.market_status_for_chat())
+    assert first == second and len(first["indices"]) == len(tools.MARKET_INDICES)
+    assert len(calls) == 1
+    
+    with pytest.raises(ValueError):
+        tools.set_chat_fetchers(unknown=print)
+
+
+def test_portfolio_analysis_errors_are_not_cached(monkeypatch):
+    pytest.importorskip("streamlit")
+    monkeypatch.setattr(tools, "_chat_fetchers", dict(tools._chat_fetchers))
+    app_cache = importlib.import_module("app_cache")
+    app_cache._portfolio_analysis.clear()
+    results = iter([{"error": "시세 조회 실패"}, {"total_value": 100.0}])
+    monkeypatch.setattr(tools, "get_portfolio_analysis", lambda portfolio: next(results))
+    
+    portfolio = [{"ticker": "AAPL", "shares": 1}]
+    assert app_cache.get_portfolio_analysis(portfolio) == {"error": "시세 조회 실패"}
+    assert app_cache.get_portfolio_analysis(portfolio) == {"total_value": 100.0}
+    assert app_cache.get_portfolio_analysis(portfolio) == {"total_value": 100.0}  # 성공 결과는 캐시
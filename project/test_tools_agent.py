@@ -0,0 +1,110 @@
+"""
+도구 호출 에이전트 테스트 (LLM 호출 없음)
+
+실행: python -m pytest test_tools_agent.py -q
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("pandas_ta")  # tools 모듈 임포트에 필요
+
+from langchain_core.messages import AIMessageChunk
+
+import tools_agent
+from tools_agent import collect_tool_results, completed_tool_calls, start_tool_call
+
+
+def stream(*deltas):
+    """(index, id, name, args 조각) 델타들을 합친 스트리밍 응답"""
+    gathered = None
+    for index, call_id, name, args in deltas:
+        chunk = AIMessageChunk(content="", tool_call_chunks=[
+            {"index": index, "id": call_id, "name": name, "args": args}
+        ])
+        gathered = chunk if gathered is None else gathered + chunk
+    return gathered
+
+
+def test_completed_tool_calls_waits_for_complete_arguments():
+    gathered = stream(
+        (0, "call_a", "get_stock_quote", '{"ticker_or_'),
+        (0, None, None, 'name": "AAPL"}'),
+        (1, "call_b", "get_stock_news", '{"ticker_or_name": "삼성'),
+    )
+    
+    assert completed_tool_calls(gathered, current_index=1) == [
+        {"name": "get_stock_quote", "args": {"ticker_or_name": "AAPL"}, "id": "call_a", "type": "tool_call"}
+    ]
+    # 아직 인자가 들어오는 중인 호출은 index가 앞서도 실행하지 않음
+    assert completed_tool_calls(gathered, current_index=2)[0]["id"] == "call_a"
+    assert len(completed_tool_calls(gathered, current_index=2)) == 1
+
+
+def test_completed_tool_calls_skips_truncated_arguments():
+    gathered = stream(
+        (0, "call_a", "get_stock_quote", '{"ticker_or_name": "AA'),
+        (1, "call_b", "get_stock_news", '{}'),
+    )
+    
+    assert completed_tool_calls(gathered, current_index=1) == []
+
+
+def slow_tools(monkeypatch, delays):
+    """도구 이름별로 지정한 시간만큼 잠든 뒤 결과를 돌려주는 가짜 도구"""
+    def fake_run_tool(tool_name, tool_args, context):
+        time.sleep(delays[tool_name])
+        return f"{tool_name} 완료"
+    monkeypatch.setattr(tools_agent, "_run_tool", fake_run_tool)
+
+
+def tool_calls(*names):
+    return [{"name": name, "args": {}, "id": f"call_{name}", "type": "tool_call"} for name in names]
+
+
+def test_tool_calls_run_concurrently(monkeypatch):
+    slow_tools(monkeypatch, {"a": 0.3, "b": 0.3, "c": 0.3})
+    calls = tool_calls("a", "b", "c")
+    
+    started = time.monotonic()
+    results = collect_tool_results(calls, [start_tool_call(call) for call in calls])
+    elapsed = time.monotonic() - started
+    
+    assert results == ["a 완료", "b 완료", "c 완료"]
+    # 순차 실행이면 0.9초, 동시 실행이면 가장 느린 도구 시간(0.3초) 근처
+    assert elapsed < 0.6
+
+
+def test_timed_out_tool_returns_error_while_others_complete(monkeypatch):
+    slow_tools(monkeypatch, {"fast": 0.05, "slow": 1.0, "other": 0.1})
+    calls = tool_calls("fast", "slow", "other")
+    
+    started = time.monotonic()
+    results = collect_tool_results(calls, [start_tool_call(call) for call in calls], timeout=0.3)
+    elapsed = time.monotonic() - started
+    
+    assert results[0] == "fast 완료"
+    error = json.loads(results[1])["error"]
+    assert "slow" in error and "초과" in error
+    assert results[2] == "other 완료"
+    # 느린 도구를 끝까지 기다리지 않음
+    assert elapsed < 0.6
+
+
+def test_prefetch_does_not_wait_behind_tool_pool(monkeypatch):
+    # 도구 풀이 다른 세션의 느린 도구로 꽉 차 있어도 미리 수집은 바로 진행되어야 함
+    tool_pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(tools_agent, "_tool_executor", tool_pool)
+    monkeypatch.setattr(tools_agent, "detect_tickers", lambda text, max_results=3: [{"ticker": "AAPL", "name": "Apple"}])
+    monkeypatch.setattr(tools_agent, "get_stock_snapshot_for_chat", lambda name: {"name": name})
+    monkeypatch.setattr(tools_agent, "format_quote_for_chat", lambda snapshot: f"{snapshot['name']} 시세")
+    tool_pool.submit(time.sleep, 1.0)
+    
+    prefetched = tools_agent.prefetch_stock_snapshots("애플 주가")
+    
+    assert prefetched["AAPL"].result(timeout=0.5) == {"name": "Apple"}
+    call = {"name": "get_stock_quote", "args": {"ticker_or_name": "AAPL"}, "id": "call_a", "type": "tool_call"}
+    context = {"prefetched": prefetched, "portfolio": []}
+    assert collect_tool_results([call], [start_tool_call(call, context)], timeout=2) == ["Apple 시세"]
@@ -0,0 +1,118 @@
+"""
+투자 분석 워크플로우 테스트 (실제 SqliteSaver 체크포인터 사용, 네트워크/LLM 호출 없음)
+
+실행: python -m pytest test_workflow.py -q
+"""
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pandas_ta")  # tools 모듈 임포트에 필요
+
+import numpy as np
+import pandas as pd
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+import config
+import tools
+import workflow
+
+
+class FakeTicker:
+    """yfinance.Ticker 대역 - 실제와 같이 numpy 값이 담긴 DataFrame을 반환"""
+    def __init__(self, ticker):
+        self.info = {"longName": "Test Corp", "marketCap": 1000, "sector": "Tech"}
+    
+    def history(self, period="1mo"):
+        return pd.DataFrame({
+            "Close": np.array([100.0, 104.5, 110.25]),
+            "High": np.array([101.0, 106.0, 111.0]),
+            "Low": np.array([99.0, 103.0, 108.0]),
+            "Volume": np.array([1000, 2000, 3000]),
+        })
+
+
+class FakeLLM:
+    """조언 생성 LLM 대역 - fail이 True면 예외"""
+    def __init__(self):
+        self.fail = False
+    
+    def invoke(self, messages):
+        if self.fail:
+            raise RuntimeError("rate limited")
+        return SimpleNamespace(content="LLM 조언")
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    conn = sqlite3.connect(str(tmp_path / "checkpoints.db"), check_same_thread=False)
+    monkeypatch.setattr(workflow, "_checkpointer", SqliteSaver(conn))
+    monkeypatch.setattr(workflow, "_compiled_workflow", None)
+    monkeypatch.setattr(config, "OPENAI_API_KEY", "")
+    monkeypatch.setattr(tools.yf, "Ticker", FakeTicker)
+    
+    calls = {"fetch": 0}
+    
+    def counted_summary(ticker, period="1mo"):
+        calls["fetch"] += 1
+        return tools.get_stock_summary(ticker, period)
+    
+    monkeypatch.setattr(workflow, "get_stock_summary", counted_summary)
+    monkeypatch.setattr(workflow, "get_technical_indicators", lambda ticker, period: {"rsi": 55.0})
+    monkeypatch.setattr(workflow, "get_fundamental_analysis", lambda ticker: {"per": 12.3})
+    monkeypatch.setattr(workflow, "get_peer_analysis", lambda ticker: [])
+    monkeypatch.setattr(workflow, "get_stock_news",
+                        lambda name, max_results=5: [{"title": "테스트 주가 상승", "link": "", "published": "", "source": ""}])
+    
+    llm = FakeLLM()
+    monkeypatch.setattr(workflow, "get_chat_model", lambda *args, **kwargs: llm)
+    
+    yield SimpleNamespace(calls=calls, llm=llm, monkeypatch=monkeypatch)
+    conn.close()
+
+
+def test_stock_summary_is_checkpoint_serializable(monkeypatch):
+    monkeypatch.setattr(tools.yf, "Ticker", FakeTicker)
+    summary = tools.get_stock_summary("TEST")
+    
+    assert all(not isinstance(value, np.generic) for value in summary.values())
+    assert summary["current_price"] == 110.25
+    JsonPlusSerializer().dumps_typed(summary)  # numpy 값이 있으면 TypeError
+
+
+def test_completed_run_is_reused(env):
+    first = workflow.analyze_stock("TEST", "1mo", "moderate")
+    second = workflow.analyze_stock("TEST", "1mo", "moderate")
+    
+    assert first["stock_data"]["current_price"] == 110.25
+    assert first["investment_advice"]
+    assert second["investment_advice"] == first["investment_advice"]
+    assert env.calls["fetch"] == 1
+    assert workflow.get_cached_analysis("TEST", "1mo")["stock_name"] == "Test Corp"
+
+
+def test_expired_run_is_fetched_again(env):
+    workflow.analyze_stock("TEST", "1mo", "moderate")
+    env.monkeypatch.setattr(config, "WORKFLOW_CACHE_MINUTES", 0)
+    
+    assert workflow.get_cached_analysis("TEST", "1mo") is None
+    workflow.analyze_stock("TEST", "1mo", "moderate")
+    assert env.calls["fetch"] == 2
+
+
+def test_advice_failure_is_not_cached(env):
+    env.monkeypatch.setattr(config, "OPENAI_API_KEY", "sk-test")
+    env.llm.fail = True
+    
+    result = workflow.analyze_stock("TEST", "1mo", "moderate")
+    assert "기본 분석" in result["investment_advice"]
+    run_config = {"configurable": {"thread_id": workflow.make_run_id("TEST", "1mo", "moderate")}}
+    assert workflow._get_workflow().get_state(run_config).next == ("advice",)
+    
+    # 다음 호출은 수집 단계 없이 조언 단계만 다시 실행
+    env.llm.fail = False
+    result = workflow.analyze_stock("TEST", "1mo", "moderate")
+    assert result["investment_advice"] == "LLM 조언"
+    assert env.calls["fetch"] == 1
@@ -1,6 +1,11 @@
 """
 LangChain Tools for Finsearcher AI Investment Advisor
 """
+import re
+import json
+import math
+from functools import lru_cache
+import numpy as np
 import yfinance as yf
 import requests
 from bs4 import BeautifulSoup
@@ -9,7 +14,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List
 import pandas as pd
 import config
-from langchain_openai import ChatOpenAI
+from llm_clients import get_chat_model
 from langchain_core.prompts import ChatPromptTemplate
 
 
@@ -47,11 +52,7 @@ def normalize_ticker(user_input: str) -> Dict[str, str]:
         return _basic_ticker_match(user_input)
     
     try:
-        llm = ChatOpenAI(
-            model="gpt-5-mini-2025-08-07",
-            temperature=0,
-            api_key=config.OPENAI_API_KEY
-        )
+        llm = get_chat_model("gpt-5-mini-2025-08-07", temperature=0)
         
         # 인기 종목 리스트를 컨텍스트로 제공
         popular_stocks_text = "\n".join([
@@ -145,6 +146,78 @@ def _verify_ticker_exists(ticker: str) -> bool:
         return False
 
 
+# 일반적인 종목명 → 종목 코드 사전 (로컬 매칭용)
+COMMON_STOCKS = {
+    "apple": "AAPL",
+    "애플": "AAPL",
+    "tesla": "TSLA",
+    "테슬라": "TSLA",
+    "microsoft": "MSFT",
+    "마이크로소프트": "MSFT",
+    "amazon": "AMZN",
+    "아마존": "AMZN",
+    "google": "GOOGL",
+    "구글": "GOOGL",
+    "nvidia": "NVDA",
+    "엔비디아": "NVDA",
+    "samsung": "005930.KS",
+    "hynix": "000660.KS",
+    "하이닉스": "000660.KS",
+}
+
+
+def _name_pattern(name: str):
+    """
+    종목명 단어 경계 패턴
+    
+    앞에 글자/숫자가 붙어 있으면 다른 단어의 일부로 보고 (pineapple, 파인애플),
+    뒤에는 라틴 문자/숫자만 막아 한국어 조사는 허용합니다 (삼성전자의, 애플은).
+    """
+    return re.compile(r'(?<![0-9a-z가-힣])' + re.escape(name.lower()) + r'(?![0-9a-z])')
+
+
+_NAME_PATTERNS = (
+    [(_name_pattern(stock['name']), stock['ticker'], stock['name']) for stock in config.POPULAR_STOCKS]
+    + [(_name_pattern(key), ticker, key) for key, ticker in COMMON_STOCKS.items()]
+)
+_KR_CODE_PATTERN = re.compile(r'(?<![0-9A-Z.])\d{6}\.(?:KS|KQ)(?![0-9A-Z])')
+
+
+def detect_tickers(text: str, max_results: int = 3) -> List[Dict[str, str]]:
+    """
+    문장에서 종목을 로컬 사전만으로 빠르게 찾습니다. (네트워크/LLM 호출 없음)
+    
+    인기 종목 이름, COMMON_STOCKS 사전, 종목 코드 패턴(005930.KS)을 단어 경계 기준으로 찾습니다.
+    
+    Args:
+        text: 사용자 메시지 또는 도구 인자
+        max_results: 최대 반환 개수
+    
+    Returns:
+        [{"ticker": "005930.KS", "name": "삼성전자"}, ...] (등장 순서)
+    """
+    text_lower = text.lower()
+    found = []  # (등장 위치, ticker, name)
+    
+    for pattern, ticker, name in _NAME_PATTERNS:
+        match = pattern.search(text_lower)
+        if match:
+            found.append((match.start(), ticker, name))
+    
+    for match in _KR_CODE_PATTERN.finditer(text.upper()):
+        found.append((match.start(), match.group(), match.group()))
+    
+    # 같은 종목은 한 번만 (예: "삼성전자"와 "samsung"), 긴 이름 우선
+    found.sort(key=lambda item: (item[0], -len(item[2])))
+    results = []
+    seen = set()
+    for _, ticker, name in found:
+        if ticker not in seen:
+            seen.add(ticker)
+            results.append({"ticker": ticker, "name": name})
+    return results[:max_results]
+
+
 def _basic_ticker_match(user_input: str) -> Dict[str, str]:
     """기본 종목명 매칭 (API 키 없을 때 사용)"""
     user_input_lower = user_input.lower().strip()
@@ -163,22 +236,7 @@ def _basic_ticker_match(user_input: str) -> Dict[str, str]:
             }
     
     # 일반적인 영어 종목명 매칭
-    common_stocks = {
-        "apple": "AAPL",
-        "애플": "AAPL",
-        "tesla": "TSLA",
-        "테슬라": "TSLA",
-        "microsoft": "MSFT",
-        "마이크로소프트": "MSFT",
-        "amazon": "AMZN",
-        "아마존": "AMZN",
-        "google": "GOOGL",
-        "구글": "GOOGL",
-        "nvidia": "NVDA",
-        "엔비디아": "NVDA",
-    }
-    
-    for key, ticker in common_stocks.items():
+    for key, ticker in COMMON_STOCKS.items():
         if key in user_input_lower:
             if _verify_ticker_exists(ticker):
                 stock = yf.Ticker(ticker)
@@ -211,8 +269,9 @@ def get_stock_summary(ticker: str, period: str = "1mo") -> Dict:
         if hist.empty:
             return {"error": f"종목 코드 {ticker}에 대한 데이터를 찾을 수 없습니다."}
         
-        current_price = hist['Close'].iloc[-1]
-        start_price = hist['Close'].iloc[0]
+        # numpy 값은 워크플로우 체크포인트(msgpack)에 저장할 수 없으므로 파이썬 숫자로 변환
+        current_price = float(hist['Close'].iloc[-1])
+        start_price = float(hist['Close'].iloc[0])
         price_change = ((current_price - start_price) / start_price) * 100
         
         summary = {
@@ -221,8 +280,8 @@ def get_stock_summary(ticker: str, period: str = "1mo") -> Dict:
             "current_price": round(current_price, 2),
             "period": period,
             "price_change_percent": round(price_change, 2),
-            "high": round(hist['High'].max(), 2),
-            "low": round(hist['Low'].min(), 2),
+            "high": round(float(hist['High'].max()), 2),
+            "low": round(float(hist['Low'].min()), 2),
             "volume_avg": int(hist['Volume'].mean()),
             "market_cap": info.get("marketCap", "N/A"),
             "sector": info.get("sector", "N/A"),
@@ -298,12 +357,12 @@ def get_technical_indicators(ticker: str, period: str = "6mo") -> Dict:
         last_row = df.iloc[-1]
         
         return {
-            "rsi": round(last_row.get('RSI_14', 0), 2),
-            "macd": round(last_row.get('MACD_12_26_9', 0), 2),
-            "macd_signal": round(last_row.get('MACDs_12_26_9', 0), 2),
-            "bb_upper": round(last_row.get('BBU_20_2.0', 0), 2),
-            "bb_lower": round(last_row.get('BBL_20_2.0', 0), 2),
-            "close": round(last_row['Close'], 2)
+            "rsi": round(float(last_row.get('RSI_14', 0)), 2),
+            "macd": round(float(last_row.get('MACD_12_26_9', 0)), 2),
+            "macd_signal": round(float(last_row.get('MACDs_12_26_9', 0)), 2),
+            "bb_upper": round(float(last_row.get('BBU_20_2.0', 0)), 2),
+            "bb_lower": round(float(last_row.get('BBL_20_2.0', 0)), 2),
+            "close": round(float(last_row['Close']), 2)
         }
     except Exception as e:
         return {"error": str(e)}
@@ -538,14 +597,10 @@ def chat_with_ai(user_message: str, chat_history: List[Dict] = None, user_profil
         return "⚠️ OpenAI API 키가 설정되지 않았습니다. .env 파일에 API 키를 설정해주세요."
     
     try:
-        from langchain_openai import ChatOpenAI
         from langchain_core.prompts import ChatPromptTemplate
         from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
         
-        llm = ChatOpenAI(
-            model="gpt-5-nano-2025-08-07",
-            api_key=config.OPENAI_API_KEY
-        )
+        llm = get_chat_model("gpt-5-nano-2025-08-07")
         
         # 투자 성향 정보
         profile_info = config.INVESTMENT_PROFILES.get(user_profile, config.INVESTMENT_PROFILES["moderate"])
@@ -600,69 +655,342 @@ def chat_with_ai(user_message: str, chat_history: List[Dict] = None, user_profil
         return f"❌ 오류가 발생했습니다: {str(e)}\n\n다시 시도해주세요."
 
 
-def analyze_stock_for_chat(ticker_or_name: str) -> str:
+# ---------------------------------------------------------------------------
+# 챗봇 도구용 함수 - 토큰을 아끼기 위해 압축된 JSON 문자열을 반환합니다.
+# ---------------------------------------------------------------------------
+
+def to_tool_json(data) -> str:
     """
-    채팅에서 종목 분석을 요청할 때 사용하는 간단한 분석 함수
+    도구 결과를 공백 없는 JSON 문자열로 변환 (None, NaN 값은 제외)
+    
+    numpy 값은 파이썬 숫자로 바꾸고, NaN/무한대는 값이 없는 것으로 처리해
+    모델이 받는 JSON이 항상 표준 JSON이 되도록 합니다 (allow_nan=False).
+    빈 리스트는 "결과 없음"이라는 정보이므로 그대로 둡니다.
+    """
+    def _compact(value):
+        if isinstance(value, dict):
+            items = ((k, _compact(v)) for k, v in value.items())
+            return {k: v for k, v in items if v is not None}
+        if isinstance(value, (list, tuple)):
+            return [_compact(v) for v in value]
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, float) and not math.isfinite(value):
+            return None
+        return value
+
+    return json.dumps(_compact(data), ensure_ascii=False, separators=(",", ":"), default=str, allow_nan=False)
+
+
+def get_currency(ticker: str) -> str:
+    """종목 코드로 거래 통화 판단"""
+    return "KRW" if ticker.endswith(".KS") or ticker.endswith(".KQ") else "USD"
+
+
+def get_quotes(tickers: List[str]) -> Dict[str, Dict]:
+    """
+    여러 종목의 현재가를 한 번의 요청으로 가져옵니다. (info 조회 없음)
+    
+    Args:
+        tickers: 종목 코드 리스트
+    
+    Returns:
+        {종목 코드: {"price", "prev_close", "change_pct", "currency"}}
+        데이터가 없는 종목은 결과에서 제외됩니다.
+    """
+    if not tickers:
+        return {}
+    try:
+        data = yf.download(tickers, period="5d", progress=False, auto_adjust=False)
+        closes = data["Close"]
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(tickers[0])
+    except Exception:
+        return {}
+    
+    quotes = {}
+    for ticker in tickers:
+        if ticker not in closes:
+            continue
+        series = closes[ticker].dropna()
+        if series.empty:
+            continue
+        price = float(series.iloc[-1])
+        prev_close = float(series.iloc[-2]) if len(series) > 1 else price
+        quotes[ticker] = {
+            "price": round(price, 2),
+            "prev_close": round(prev_close, 2),
+            "change_pct": round((price - prev_close) / prev_close * 100, 2) if prev_close else 0.0,
+            "currency": get_currency(ticker)
+        }
+    return quotes
+
+
+# 챗봇 도구(*_for_chat)가 쓰는 데이터 조회 함수 - 앱은 app_cache의 TTL 캐시 버전으로 교체
+_chat_fetchers = {
+    "summary": get_stock_summary,
+    "quotes": get_quotes,
+    "news": get_stock_news,
+    "technicals": get_technical_indicators,
+    "fundamentals": get_fundamental_analysis,
+}
+
+
+def set_chat_fetchers(**fetchers):
+    """
+    챗봇 도구의 데이터 조회 함수 교체 (summary, quotes, news, technicals, fundamentals)
+    
+    각 함수는 이 모듈의 원래 함수와 같은 인자/반환 형식이어야 합니다.
+    """
+    unknown = set(fetchers) - set(_chat_fetchers)
+    if unknown:
+        raise ValueError(f"알 수 없는 조회 함수: {', '.join(sorted(unknown))}")
+    _chat_fetchers.update(fetchers)
+
+
+class _UnresolvedTicker(Exception):
+    """변환 실패 - lru_cache는 예외로 끝난 호출을 저장하지 않으므로 실패 결과는 재사용되지 않음"""
+    def __init__(self, result: Dict[str, str]):
+        super().__init__(result.get("error"))
+        self.result = result
+
+
+def resolve_ticker_for_chat(ticker_or_name: str) -> Dict[str, str]:
+    """
+    챗봇 도구용 종목 코드 변환
+    
+    로컬 사전(detect_tickers)으로 찾을 수 있으면 네트워크/LLM 호출 없이 변환하고,
+    성공한 결과는 최근 512개까지 프로세스 내에서 재사용합니다.
+    """
+    try:
+        return dict(_resolve_ticker_cached(ticker_or_name.strip()))
+    except _UnresolvedTicker as e:
+        return e.result
+
+
+@lru_cache(maxsize=512)
+def _resolve_ticker_cached(ticker_or_name: str) -> Dict[str, str]:
+    key = ticker_or_name.lower()
+    matches = detect_tickers(ticker_or_name, max_results=1)
+    if matches and matches[0]['name'].lower() == key:
+        ticker = matches[0]['ticker']
+        popular = next((s for s in config.POPULAR_STOCKS if s['ticker'] == ticker), None)
+        normalized = {
+            "ticker": ticker,
+            "name": popular['name'] if popular else matches[0]['name'],
+            "original": ticker_or_name
+        }
+    else:
+        normalized = normalize_ticker(ticker_or_name)
+    
+    if "error" in normalized:
+        raise _UnresolvedTicker(normalized)
+    return normalized
+
+
+def get_stock_snapshot_for_chat(ticker_or_name: str) -> Dict:
+    """
+    채팅용 종목 스냅샷 수집 (주가, 최근 뉴스, 감성, 위험도)
     
     Args:
         ticker_or_name: 종목 코드 또는 이름
     
     Returns:
-        분석 결과 텍스트
+        스냅샷 딕셔너리 또는 {"error": ...}
     """
     try:
         # 종목 코드 정규화
-        normalized = normalize_ticker(ticker_or_name)
+        normalized = resolve_ticker_for_chat(ticker_or_name)
         
         if "error" in normalized:
-            return f"❌ {normalized['error']}"
+            return {"error": normalized['error']}
         
         ticker = normalized['ticker']
         name = normalized['name']
         
-        # 주가 정보 가져오기
-        stock_data = get_stock_summary(ticker, period="1mo")
+        # 종목 분석 탭에서 수집해 둔 워크플로우 체크포인트가 있으면 재사용
+        from workflow import get_cached_analysis
+        cached = get_cached_analysis(ticker, period="1mo")
         
-        if "error" in stock_data:
-            return f"❌ {stock_data['error']}"
+        if cached:
+            stock_data = cached["stock_data"]
+            news_data = cached.get("news_data") or _chat_fetchers["news"](name, 3)
+        else:
+            # 주가 정보 가져오기
+            stock_data = _chat_fetchers["summary"](ticker, "1mo")
+            
+            if "error" in stock_data:
+                return {"error": stock_data['error']}
+            
+            news_data = _chat_fetchers["news"](name, 3)
         
-        # 뉴스 및 감성 분석
-        news_data = get_stock_news(name, max_results=3)
+        # 뉴스 감성 분석 및 위험도
+        news_data = [news for news in news_data[:3] if "error" not in news]
         sentiment_data = get_sentiment_analysis(news_data)
         risk_data = calculate_risk_score(stock_data, sentiment_data)
         
-        # 결과 포맷팅
-        result = f"""
-📊 **{name}** ({ticker}) 분석 결과
-
-**현재 주가 정보:**
-- 현재가: ₩{stock_data['current_price']:,}
-- 변동률: {stock_data['price_change_percent']:+.2f}%
-- 최고가: ₩{stock_data['high']:,}
-- 최저가: ₩{stock_data['low']:,}
-
-**시장 감성:**
-- 감성: {sentiment_data['sentiment']}
-- 감성 점수: {sentiment_data['score']}/100
-- 긍정 뉴스: {sentiment_data['positive_count']}개
-- 부정 뉴스: {sentiment_data['negative_count']}개
-
-**위험도 평가:**
-- 위험 수준: {risk_data['color']} {risk_data['risk_level']}
-- 위험 점수: {risk_data['risk_score']}/100
-"""
-        
-        if risk_data['risk_factors']:
-            result += f"- 위험 요인: {', '.join(risk_data['risk_factors'])}\n"
-        
-        # 최근 뉴스 추가
-        result += "\n**최근 뉴스:**\n"
-        for i, news in enumerate(news_data[:3], 1):
-            if "error" not in news:
-                result += f"{i}. {news['title']}\n"
-        
-        return result
-        
+        return {
+            "ticker": ticker,
+            "name": name,
+            "stock_data": stock_data,
+            "news_data": news_data,
+            "sentiment_data": sentiment_data,
+            "risk_data": risk_data
+        }
     except Exception as e:
-        return f"❌ 분석 중 오류가 발생했습니다: {str(e)}"
+        return {"error": f"분석 중 오류가 발생했습니다: {str(e)}"}
+
+
+def format_quote_for_chat(snapshot: Dict) -> str:
+    """스냅샷에서 시세 부분만 JSON으로 변환"""
+    if "error" in snapshot:
+        return to_tool_json({"error": snapshot["error"]})
+    stock_data = snapshot["stock_data"]
+    return to_tool_json({
+        "ticker": snapshot["ticker"],
+        "name": snapshot["name"],
+        "currency": get_currency(snapshot["ticker"]),
+        "price": stock_data["current_price"],
+        "change_pct_1mo": stock_data["price_change_percent"],
+        "high_1mo": stock_data["high"],
+        "low_1mo": stock_data["low"]
+    })
+
+
+def format_analysis_for_chat(snapshot: Dict) -> str:
+    """스냅샷 전체를 압축된 JSON으로 변환"""
+    if "error" in snapshot:
+        return to_tool_json({"error": snapshot["error"]})
+    stock_data = snapshot["stock_data"]
+    sentiment_data = snapshot["sentiment_data"]
+    risk_data = snapshot["risk_data"]
+    return to_tool_json({
+        "ticker": snapshot["ticker"],
+        "name": snapshot["name"],
+        "currency": get_currency(snapshot["ticker"]),
+        "price": stock_data["current_price"],
+        "change_pct_1mo": stock_data["price_change_percent"],
+        "high_1mo": stock_data["high"],
+        "low_1mo": stock_data["low"],
+        "sentiment": {
+            "label": sentiment_data["sentiment"],
+            "score": sentiment_data["score"],
+            "pos": sentiment_data["positive_count"],
+            "neg": sentiment_data["negative_count"]
+        },
+        "risk": {
+            "level": risk_data["risk_level"],
+            "score": risk_data["risk_score"],
+            "factors": risk_data["risk_factors"]
+        },
+        "news": [news["title"] for news in snapshot["news_data"]]
+    })
+
 
+def analyze_stock_for_chat(ticker_or_name: str) -> str:
+    """
+    채팅에서 종목 분석을 요청할 때 사용하는 간단한 분석 함수
+    
+    Args:
+        ticker_or_name: 종목 코드 또는 이름
+    
+    Returns:
+        분석 결과 JSON 문자열 (주가, 감성, 위험도, 최근 뉴스 제목)
+    """
+    return format_analysis_for_chat(get_stock_snapshot_for_chat(ticker_or_name))
+
+
+def quote_for_chat(ticker_or_name: str) -> str:
+    """채팅용 현재가 조회 (JSON)"""
+    normalized = resolve_ticker_for_chat(ticker_or_name)
+    if "error" in normalized:
+        return to_tool_json({"error": normalized["error"]})
+    
+    quote = _chat_fetchers["quotes"]([normalized["ticker"]]).get(normalized["ticker"])
+    if not quote:
+        return to_tool_json({"error": f"{normalized['ticker']} 시세를 가져올 수 없습니다."})
+    return to_tool_json({"ticker": normalized["ticker"], "name": normalized["name"], **quote})
+
+
+def technicals_for_chat(ticker_or_name: str) -> str:
+    """채팅용 기술적 지표 조회 (JSON)"""
+    normalized = resolve_ticker_for_chat(ticker_or_name)
+    if "error" in normalized:
+        return to_tool_json({"error": normalized["error"]})
+    return to_tool_json({
+        "ticker": normalized["ticker"],
+        **_chat_fetchers["technicals"](normalized["ticker"], "6mo")
+    })
+
+
+def fundamentals_for_chat(ticker_or_name: str) -> str:
+    """채팅용 기본적 분석 지표 조회 (JSON)"""
+    normalized = resolve_ticker_for_chat(ticker_or_name)
+    if "error" in normalized:
+        return to_tool_json({"error": normalized["error"]})
+    return to_tool_json({
+        "ticker": normalized["ticker"],
+        **_chat_fetchers["fundamentals"](normalized["ticker"])
+    })
+
+
+def news_for_chat(ticker_or_name: str, max_results: int = 5) -> str:
+    """채팅용 최신 뉴스 조회 (JSON, 링크 제외)"""
+    normalized = resolve_ticker_for_chat(ticker_or_name)
+    name = normalized.get("name", ticker_or_name)
+    news_data = _chat_fetchers["news"](name, max_results)
+    return to_tool_json({
+        "query": name,
+        "news": [
+            {"title": news["title"], "source": news["source"], "published": news["published"]}
+            for news in news_data if "error" not in news
+        ]
+    })
+
+
+MARKET_INDICES = {
+    "^KS11": "KOSPI",
+    "^KQ11": "KOSDAQ",
+    "^GSPC": "S&P 500",
+    "^IXIC": "NASDAQ",
+    "KRW=X": "USD/KRW",
+}
+
+
+def market_status_for_chat() -> str:
+    """채팅용 주요 지수 현황 조회 (JSON)"""
+    quotes = _chat_fetchers["quotes"](list(MARKET_INDICES))
+    return to_tool_json({
+        "indices": [
+            {"name": name, "value": quotes[symbol]["price"], "change_pct": quotes[symbol]["change_pct"]}
+            for symbol, name in MARKET_INDICES.items() if symbol in quotes
+        ]
+    })
+
+
+def portfolio_for_chat(portfolio: List[Dict]) -> str:
+    """
+    채팅용 보유 종목 평가 (JSON)
+    
+    Args:
+        portfolio: [{"ticker": "005930.KS", "shares": 10, "avg_price": 70000}, ...]
+    """
+    if not portfolio:
+        return to_tool_json({"positions": [], "note": "보유 종목이 없습니다."})
+    
+    quotes = _chat_fetchers["quotes"]([item["ticker"] for item in portfolio])
+    positions = []
+    totals = {}
+    for item in portfolio:
+        quote = quotes.get(item["ticker"])
+        position = {"ticker": item["ticker"], "shares": item["shares"]}
+        if item.get("avg_price"):
+            position["avg_price"] = item["avg_price"]
+        if quote:
+            value = round(quote["price"] * item["shares"], 2)
+            position.update(price=quote["price"], change_pct=quote["change_pct"], value=value)
+            if item.get("avg_price"):
+                position["pnl_pct"] = round((quote["price"] / item["avg_price"] - 1) * 100, 2)
+            totals[quote["currency"]] = round(totals.get(quote["currency"], 0) + value, 2)
+        positions.append(position)
+    return to_tool_json({"positions": positions, "total_value": totals})
@@ -3,16 +3,214 @@
 AI가 자동으로 실시간 데이터 도구를 사용할 수 있도록 하는 함수들
 """
 from typing import Dict, List, Generator
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import json
+import time
 import config
-from tools import analyze_stock_for_chat, get_stock_news, get_stock_summary
+from llm_clients import get_chat_model
+from tools import (
+    detect_tickers,
+    get_stock_snapshot_for_chat,
+    format_analysis_for_chat,
+    format_quote_for_chat,
+    quote_for_chat,
+    technicals_for_chat,
+    fundamentals_for_chat,
+    news_for_chat,
+    market_status_for_chat,
+    portfolio_for_chat,
+    to_tool_json
+)
 
+# 도구 실행 설정
+TOOL_TIMEOUT_SECONDS = 20  # 도구 호출 1회당 최대 대기 시간
+MAX_TOOL_ROUNDS = 3        # 최종 답변 전 도구 호출 라운드 최대 횟수
+MAX_PREFETCH = 3           # 사용자 메시지에서 미리 분석을 시작할 최대 종목 수
 
-def chat_with_tools_streaming(user_message: str, chat_history: List[Dict] = None, user_profile: str = "moderate") -> tuple:
+# 도구 실행용 스레드 풀 (세션 간 공유)
+_tool_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="finsearcher-tool")
+# 미리 수집용 스레드 풀 - 도구가 미리 수집 결과를 기다리는 동안 도구 풀을 점유해도
+# 미리 수집 작업은 별도 워커에서 계속 진행됨
+_prefetch_executor = ThreadPoolExecutor(max_workers=MAX_PREFETCH * 2, thread_name_prefix="finsearcher-prefetch")
+
+
+def _stock_tool(name: str, description: str) -> Dict:
+    """종목 하나를 인자로 받는 도구 정의 생성"""
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "ticker_or_name": {
+                        "type": "string",
+                        "description": "종목명 또는 종목 코드 (예: '삼성전자', 'AAPL', '005930.KS')"
+                    }
+                },
+                "required": ["ticker_or_name"]
+            }
+        }
+    }
+
+
+# 도구 정의 - 결과는 모두 압축된 JSON 문자열
+TOOLS = [
+    _stock_tool("get_stock_quote", "종목의 현재가와 전일 대비 등락률만 조회합니다. 가격만 물어볼 때 사용하세요."),
+    _stock_tool("get_stock_analysis", "종목의 1개월 주가 요약, 최근 뉴스 제목, 감성 분석, 위험도 평가를 함께 제공합니다. 종목 분석이나 매수 의견을 물어볼 때 사용하세요."),
+    _stock_tool("get_technical_indicators", "종목의 RSI, MACD, 볼린저 밴드 등 기술적 지표를 조회합니다."),
+    _stock_tool("get_fundamentals", "종목의 PER, PBR, ROE, 매출성장률, 부채비율 등 기본적 분석 지표를 조회합니다."),
+    _stock_tool("get_stock_news", "종목 관련 최신 뉴스 제목/출처/날짜를 조회합니다."),
+    {
+        "type": "function",
+        "function": {
+            "name": "get_portfolio",
+            "description": "사용자가 보유한 종목, 수량, 현재가, 평가금액, 수익률을 조회합니다.",
+            "parameters": {"type": "object", "properties": {}}
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_market_status",
+            "description": "KOSPI, KOSDAQ, S&P 500, NASDAQ 지수와 원/달러 환율 현황을 조회합니다.",
+            "parameters": {"type": "object", "properties": {}}
+        }
+    },
+]
+
+
+def _run_tool(tool_name: str, tool_args: Dict, context: Dict) -> str:
+    """
+    도구 이름에 해당하는 함수 실행
+    
+    Args:
+        tool_name: 도구 이름
+        tool_args: 도구 인자
+        context: {"prefetched": {종목 코드: Future}, "portfolio": [...]}
+    """
+    ticker_or_name = tool_args.get('ticker_or_name', '')
+    
+    if tool_name in ("get_stock_analysis", "get_stock_quote"):
+        prefetched = _find_prefetched(ticker_or_name, context.get("prefetched"))
+        if prefetched is not None:
+            snapshot = prefetched.result(timeout=TOOL_TIMEOUT_SECONDS)
+            if tool_name == "get_stock_quote":
+                return format_quote_for_chat(snapshot)
+            return format_analysis_for_chat(snapshot)
+        if tool_name == "get_stock_quote":
+            return quote_for_chat(ticker_or_name)
+        return format_analysis_for_chat(get_stock_snapshot_for_chat(ticker_or_name))
+    if tool_name == "get_technical_indicators":
+        return technicals_for_chat(ticker_or_name)
+    if tool_name == "get_fundamentals":
+        return fundamentals_for_chat(ticker_or_name)
+    if tool_name == "get_stock_news":
+        return news_for_chat(ticker_or_name)
+    if tool_name == "get_portfolio":
+        return portfolio_for_chat(context.get("portfolio", []))
+    if tool_name == "get_market_status":
+        return market_status_for_chat()
+    return to_tool_json({"error": f"도구를 찾을 수 없습니다: {tool_name}"})
+
+
+def prefetch_stock_snapshots(user_message: str) -> Dict[str, Future]:
+    """
+    사용자 메시지에 언급된 종목의 데이터 수집을 미리 백그라운드에서 시작
+    
+    모델이 도구 사용 여부를 결정하는 동안 데이터 수집을 진행하여,
+    실제 도구 호출 시점에는 결과가 이미 준비되어 있도록 합니다.
+    
+    Returns:
+        {종목 코드: Future} 딕셔너리
+    """
+    return {
+        stock['ticker']: _prefetch_executor.submit(get_stock_snapshot_for_chat, stock['name'])
+        for stock in detect_tickers(user_message, max_results=MAX_PREFETCH)
+    }
+
+
+def _find_prefetched(ticker_or_name: str, prefetched: Dict[str, Future]):
+    """도구 인자에 해당하는 미리 시작된 작업 조회"""
+    if not prefetched or not ticker_or_name:
+        return None
+    if ticker_or_name.strip().upper() in prefetched:
+        return prefetched[ticker_or_name.strip().upper()]
+    matches = detect_tickers(ticker_or_name, max_results=1)
+    if matches:
+        return prefetched.get(matches[0]['ticker'])
+    return None
+
+
+def start_tool_call(tool_call: Dict, context: Dict = None) -> Future:
+    """도구 호출을 스레드 풀에서 실행 시작"""
+    return _tool_executor.submit(_run_tool, tool_call['name'], tool_call['args'], context or {})
+
+
+def completed_tool_calls(gathered, current_index: int) -> List[Dict]:
+    """
+    스트리밍 중 실행을 시작해도 되는 도구 호출
+    
+    index가 current_index보다 앞서고, 인자 문자열이 완전한 JSON 객체로 파싱되며
+    invalid_tool_calls에 없는 호출만 반환합니다. (잘린 인자로 실행되는 것 방지)
+    """
+    invalid_ids = {tool_call.get('id') for tool_call in gathered.invalid_tool_calls}
+    completed = []
+    for tool_call_chunk in gathered.tool_call_chunks:
+        call_id = tool_call_chunk.get('id')
+        if (tool_call_chunk.get('index') or 0) >= current_index or not call_id or call_id in invalid_ids:
+            continue
+        try:
+            args = json.loads(tool_call_chunk.get('args') or "{}")
+        except json.JSONDecodeError:
+            continue
+        if isinstance(args, dict) and tool_call_chunk.get('name'):
+            completed.append({"name": tool_call_chunk['name'], "args": args, "id": call_id, "type": "tool_call"})
+    return completed
+
+
+def collect_tool_results(tool_calls: List[Dict], futures: List[Future],
+                         timeout: float = TOOL_TIMEOUT_SECONDS) -> List[str]:
+    """
+    시작된 도구 호출들의 결과 수집
+    
+    Args:
+        tool_calls: LLM 응답의 tool_calls 목록
+        futures: tool_calls 순서와 같은 실행 중인 작업 목록
+        timeout: 도구 호출별 최대 대기 시간 (초)
+    
+    Returns:
+        tool_calls 순서와 같은 도구 실행 결과 목록
+    """
+    results = []
+    started = time.monotonic()
+    for tool_call, future in zip(tool_calls, futures):
+        # 모든 도구가 동시에 실행 중이므로 남은 시간만큼만 대기
+        remaining = max(0.0, timeout - (time.monotonic() - started))
+        try:
+            results.append(future.result(timeout=remaining))
+        except FutureTimeoutError:
+            results.append(to_tool_json({"error": f"'{tool_call['name']}' 도구 응답 시간이 초과되었습니다 ({timeout}초)."}))
+        except Exception as e:
+            results.append(to_tool_json({"error": f"'{tool_call['name']}' 도구 실행 중 오류: {str(e)}"}))
+    return results
+
+
+def chat_with_tools_streaming(user_message: str, chat_history: List[Dict] = None, user_profile: str = "moderate",
+                              portfolio: List[Dict] = None) -> tuple:
     """
     도구를 자동으로 사용하는 AI 챗봇 (스트리밍 지원)
     
+    Args:
+        user_message: 사용자 메시지
+        chat_history: 이전 대화 내역
+        user_profile: 사용자 투자 성향
+        portfolio: get_portfolio 도구에 제공할 보유 종목 [{"ticker", "shares", "avg_price"}, ...]
+    
     Returns:
         (스트리밍 제너레이터, 사용된 도구 목록)
+        사용된 도구 목록은 제너레이터를 끝까지 소비한 뒤에 채워집니다.
     """
     if not config.OPENAI_API_KEY or config.OPENAI_API_KEY == "your_openai_api_key_here":
         def error_gen():
@@ -20,39 +218,14 @@ def chat_with_tools_streaming(user_message: str, chat_history: List[Dict] = None
         return error_gen(), []
     
     try:
-        from langchain_openai import ChatOpenAI
-        from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+        from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
+        from langchain_core.messages import message_chunk_to_message
         
         # 투자 성향 정보
         profile_info = config.INVESTMENT_PROFILES.get(user_profile, config.INVESTMENT_PROFILES["moderate"])
         
-        # 도구 정의
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_stock_analysis",
-                    "description": "특정 종목의 실시간 주가, 뉴스, 감성 분석, 위험도 평가를 제공합니다. 사용자가 종목의 현재 가격이나 분석을 물어볼 때 반드시 사용하세요.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "ticker_or_name": {
-                                "type": "string",
-                                "description": "종목명 또는 종목 코드 (예: '삼성전자', 'AAPL', '005930.KS')"
-                            }
-                        },
-                        "required": ["ticker_or_name"]
-                    }
-                }
-            }
-        ]
-        
         # LLM 초기화
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.7,
-            api_key=config.OPENAI_API_KEY
-        )
+        llm = get_chat_model("gpt-4o-mini", temperature=0.7)
         
         # 시스템 프롬프트
         system_prompt = f"""당신은 Finsearcher, 전문적인 AI 투자 어드바이저입니다.
@@ -60,8 +233,11 @@ def chat_with_tools_streaming(user_message: str, chat_history: List[Dict] = None
 **사용자 투자 성향:** {profile_info['name']} - {profile_info['description']}
 
 **중요 규칙:**
-- 사용자가 종목의 가격, 분석, 추천 등을 물어보면 반드시 get_stock_analysis 도구를 사용하세요
+- 종목의 가격, 분석, 추천 등을 물어보면 반드시 도구를 사용하세요
+- 질문에 필요한 도구만 호출하세요 (가격만 물으면 get_stock_quote, 종합 분석/매수 의견은 get_stock_analysis)
+- 여러 종목을 비교할 때는 종목별 도구를 한 번에 함께 호출하세요
 - "실시간 데이터에 접근할 수 없다"고 절대 말하지 마세요. 도구를 사용하면 됩니다!
+- 도구 결과는 JSON입니다. currency 필드(KRW/USD)에 맞는 통화 기호로 금액을 표시하세요
 - 도구로 얻은 실제 데이터를 기반으로 구체적으로 답변하세요
 
 답변은 친근하고 전문적으로, 이모지를 적절히 사용하세요."""
@@ -79,49 +255,62 @@ def chat_with_tools_streaming(user_message: str, chat_history: List[Dict] = None
         
         messages.append(HumanMessage(content=user_message))
         
-        # 첫 번째 호출 - 도구 사용 확인
-        llm_with_tools = llm.bind(tools=tools)
-        response = llm_with_tools.invoke(messages)
+        # 모델이 도구 사용을 결정하는 동안 언급된 종목 데이터를 미리 수집
+        context = {
+            "prefetched": prefetch_stock_snapshots(user_message),
+            "portfolio": portfolio or []
+        }
         
-        used_tools = []
+        llm_with_tools = llm.bind(tools=TOOLS)
+        llm_final = llm.bind(tools=TOOLS, tool_choice="none")
+        used_tools = []  # 제너레이터가 진행되면서 채워짐
         
-        # 도구 호출 확인
-        if hasattr(response, 'tool_calls') and response.tool_calls:
-            from langchain_core.messages import ToolMessage
+        def response_generator():
+            """
+            스트리밍 한 번으로 도구 호출 여부 판단과 답변 생성을 함께 처리
             
-            # AI 응답 메시지 먼저 추가 (tool_calls 포함)
-            messages.append(response)
-            
-            # 모든 tool_call에 대해 실행하고 ToolMessage 추가
-            for tool_call in response.tool_calls:
-                tool_name = tool_call['name']
-                tool_args = tool_call['args']
-                used_tools.append(tool_name)
-                
-                # 도구 실행
-                if tool_name == "get_stock_analysis":
-                    tool_result = analyze_stock_for_chat(tool_args['ticker_or_name'])
-                else:
-                    tool_result = "도구를 찾을 수 없습니다."
-                
-                # 각 도구 호출에 대한 ToolMessage 추가
-                messages.append(ToolMessage(content=tool_result, tool_call_id=tool_call['id']))
-            
-            # 최종 응답 생성 (스트리밍)
-            def response_generator():
-                for chunk in llm.stream(messages):
-                    if hasattr(chunk, 'content') and chunk.content:
-                        yield chunk.content
-            
-            return response_generator(), used_tools
-        else:
-            # 도구 없이 직접 응답 (스트리밍)
-            def response_generator():
-                for chunk in llm.stream(messages):
-                    if hasattr(chunk, 'content') and chunk.content:
-                        yield chunk.content
-            
-            return response_generator(), used_tools
+            일반 답변은 첫 토큰부터 바로 출력하고, 도구 호출 델타가 오면
+            인자가 완성된 도구부터 즉시 실행한 뒤 후속 스트림으로 답변합니다.
+            """
+            try:
+                for round_index in range(MAX_TOOL_ROUNDS + 1):
+                    # 마지막 라운드는 도구 없이 답변하도록 강제
+                    model = llm_with_tools if round_index < MAX_TOOL_ROUNDS else llm_final
+                    
+                    gathered = None
+                    futures_by_id = {}
+                    for chunk in model.stream(messages):
+                        gathered = chunk if gathered is None else gathered + chunk
+                        if chunk.content:
+                            yield chunk.content
+                        
+                        # 새 도구 호출 델타가 시작되면 이전 도구 호출의 인자는 완성된 상태 (JSON으로 확인)
+                        if chunk.tool_call_chunks:
+                            current_index = max(tc.get('index') or 0 for tc in chunk.tool_call_chunks)
+                            for tool_call in completed_tool_calls(gathered, current_index):
+                                if tool_call['id'] not in futures_by_id:
+                                    futures_by_id[tool_call['id']] = start_tool_call(tool_call, context)
+                    
+                    if gathered is None or not gathered.tool_calls:
+                        return
+                    
+                    # AI 응답 메시지 먼저 추가 (tool_calls 포함)
+                    tool_calls = gathered.tool_calls
+                    messages.append(message_chunk_to_message(gathered))
+                    used_tools.extend(tool_call['name'] for tool_call in tool_calls)
+                    
+                    # 아직 시작하지 않은 도구 실행 후 결과 수집
+                    futures = [
+                        futures_by_id.get(tool_call['id']) or start_tool_call(tool_call, context)
+                        for tool_call in tool_calls
+                    ]
+                    tool_results = collect_tool_results(tool_calls, futures)
+                    for tool_call, tool_result in zip(tool_calls, tool_results):
+                        messages.append(ToolMessage(content=tool_result, tool_call_id=tool_call['id']))
+            except Exception as e:
+                yield f"❌ 오류: {str(e)}"
+        
+        return response_generator(), used_tools
         
     except Exception as e:
         def error_gen():
@@ -9,6 +9,7 @@ import os
 from typing import Optional, Tuple
 from gtts import gTTS
 import config
+from llm_clients import get_openai_client
 
 
 def text_to_speech(text: str, lang: str = "ko") -> Tuple[Optional[bytes], Optional[str]]:
@@ -89,9 +90,7 @@ def speech_to_text_whisper(audio_bytes: bytes) -> Tuple[Optional[str], Optional[
         return None, "OpenAI API 키가 설정되지 않았습니다."
     
     try:
-        from openai import OpenAI
-        
-        client = OpenAI(api_key=config.OPENAI_API_KEY)
+        client = get_openai_client()
         
         # 임시 파일로 저장 (Whisper API는 파일 경로 필요)
         with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
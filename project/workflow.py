@@ -2,9 +2,12 @@
 LangGraph Workflow for Finsearcher AI Investment Advisor
 뉴스 요약 → 감성 분석 → 투자 조언 순서의 그래프 워크플로우
 """
-from typing import TypedDict, Annotated, List, Dict
+from typing import TypedDict, Annotated, List, Dict, Optional
+import sqlite3
+import threading
+import time
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
+from llm_clients import get_chat_model
 from langchain_core.prompts import ChatPromptTemplate
 import config
 from tools import (
@@ -34,6 +37,11 @@ class InvestmentState(TypedDict):
     risk_assessment: Dict
     investment_advice: str
     error: str
+    fetched_at: float  # 데이터 수집 시각 (체크포인트 만료 판단용)
+
+
+class AdviceUnavailableError(RuntimeError):
+    """LLM 투자 조언 생성 실패 - 실행을 완료로 저장하지 않아 다음 호출에서 advice 노드부터 다시 시도"""
 
 
 def fetch_stock_data(state: InvestmentState) -> InvestmentState:
@@ -52,6 +60,7 @@ def fetch_stock_data(state: InvestmentState) -> InvestmentState:
     
     state["stock_data"] = stock_data
     state["stock_name"] = stock_data.get("name", ticker)
+    state["fetched_at"] = time.time()
     
     # 기술적 지표
     state["technical_indicators"] = get_technical_indicators(ticker, period)
@@ -85,11 +94,7 @@ def summarize_news(state: InvestmentState) -> InvestmentState:
         return state
     
     try:
-        llm = ChatOpenAI(
-            model="gpt-3.5-turbo",
-            temperature=0.3,
-            api_key=config.OPENAI_API_KEY
-        )
+        llm = get_chat_model("gpt-3.5-turbo", temperature=0.3)
         
         news_list = state["news_data"]
         news_text = "\n".join([f"- {news['title']}" for news in news_list if "error" not in news])
@@ -167,11 +172,7 @@ def generate_investment_advice(state: InvestmentState) -> InvestmentState:
         return state
     
     try:
-        llm = ChatOpenAI(
-            model="gpt-3.5-turbo",
-            temperature=0.7,
-            api_key=config.OPENAI_API_KEY
-        )
+        llm = get_chat_model("gpt-3.5-turbo", temperature=0.7)
         
         stock_data = state["stock_data"]
         risk_data = state["risk_assessment"]
@@ -218,22 +219,23 @@ def generate_investment_advice(state: InvestmentState) -> InvestmentState:
         state["investment_advice"] = response.content
         
     except Exception as e:
-        # LLM 호출 실패 시 기본 조언
-        risk_level = state["risk_assessment"]["risk_level"]
-        sentiment = state["sentiment_data"]["sentiment"]
-        
-        advice = f"""
+        # 기본 조언은 analyze_stock이 반환만 하고 체크포인트에는 남기지 않음
+        raise AdviceUnavailableError(str(e)) from e
+    
+    return state
+
+
+def fallback_advice(state: InvestmentState) -> str:
+    """LLM 호출 실패 시 기본 조언"""
+    return f"""
 ### 투자 조언
 
-**위험도**: {risk_level}
-**시장 감성**: {sentiment}
+**위험도**: {state["risk_assessment"]["risk_level"]}
+**시장 감성**: {state["sentiment_data"]["sentiment"]}
 
 현재 수집된 데이터를 기반으로 한 기본 분석입니다.
 더 상세한 분석을 위해서는 OpenAI API 키 설정이 필요합니다.
 """
-        state["investment_advice"] = advice
-    
-    return state
 
 
 def check_error(state: InvestmentState) -> str:
@@ -243,9 +245,41 @@ def check_error(state: InvestmentState) -> str:
     return "continue"
 
 
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+_compiled_workflow = None
+_workflow_lock = threading.Lock()
+
+
+def get_checkpointer():
+    """
+    워크플로우 체크포인터 반환 (프로세스 내 싱글톤)
+    
+    langgraph-checkpoint-sqlite가 설치되어 있으면 SQLite 파일에 저장하여
+    Streamlit 재실행이나 프로세스 재시작 후에도 이어서 실행할 수 있습니다.
+    설치되어 있지 않으면 메모리 체크포인터를 사용합니다.
+    """
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            try:
+                from langgraph.checkpoint.sqlite import SqliteSaver
+                conn = sqlite3.connect(config.CHECKPOINT_DB, check_same_thread=False)
+                _checkpointer = SqliteSaver(conn)
+            except ImportError:
+                from langgraph.checkpoint.memory import MemorySaver
+                _checkpointer = MemorySaver()
+        return _checkpointer
+
+
 # LangGraph 워크플로우 생성
-def create_investment_workflow():
-    """투자 분석 워크플로우 생성"""
+def create_investment_workflow(checkpointer=None):
+    """
+    투자 분석 워크플로우 생성
+    
+    Args:
+        checkpointer: LangGraph 체크포인터 (지정하면 노드 단위로 상태가 저장됨)
+    """
     workflow = StateGraph(InvestmentState)
     
     # 노드 추가
@@ -270,23 +304,85 @@ def create_investment_workflow():
     workflow.add_edge("risk", "advice")
     workflow.add_edge("advice", END)
     
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def _get_workflow():
+    """체크포인터가 연결된 워크플로우 반환 (한 번만 컴파일)"""
+    global _compiled_workflow
+    with _workflow_lock:
+        if _compiled_workflow is None:
+            _compiled_workflow = create_investment_workflow(checkpointer=get_checkpointer())
+        return _compiled_workflow
+
+
+def make_run_id(ticker: str, period: str = "1mo", user_profile: str = "moderate") -> str:
+    """
+    분석 실행 ID 생성
+    
+    같은 종목/기간/투자 성향은 항상 같은 ID를 가지므로, 재실행 시 저장된 체크포인트에서
+    이어서 실행하거나 결과를 재사용합니다. 만료는 _is_fresh가 수집 시각으로 따로 판단합니다.
+    """
+    return f"{ticker}|{period}|{user_profile}"
+
+
+def _is_fresh(values: Dict) -> bool:
+    """데이터 수집 후 WORKFLOW_CACHE_MINUTES가 지나지 않았는지 여부"""
+    fetched_at = values.get("fetched_at")
+    return bool(fetched_at) and time.time() - fetched_at < config.WORKFLOW_CACHE_MINUTES * 60
+
+
+def get_cached_analysis(ticker: str, period: str = "1mo") -> Optional[Dict]:
+    """
+    체크포인트에 저장된 최근 분석 상태 조회 (채팅 도구 등에서 재사용)
+    
+    완료되지 않은 실행이라도 fetch_data 노드가 끝났다면 수집된 데이터를 반환합니다.
+    
+    Returns:
+        저장된 상태 딕셔너리 또는 None
+    """
+    workflow = _get_workflow()
+    for user_profile in config.INVESTMENT_PROFILES:
+        run_config = {"configurable": {"thread_id": make_run_id(ticker, period, user_profile)}}
+        values = workflow.get_state(run_config).values
+        if values and values.get("stock_data") and not values.get("error") and _is_fresh(values):
+            return values
+    return None
 
 
 # 간편한 분석 함수
-def analyze_stock(ticker: str, period: str = "1mo", user_profile: str = "moderate") -> InvestmentState:
+def analyze_stock(ticker: str, period: str = "1mo", user_profile: str = "moderate",
+                  run_id: str = None) -> InvestmentState:
     """
     주식을 분석하는 메인 함수
     
+    같은 run_id로 다시 호출하면 마지막으로 완료된 노드부터 이어서 실행하고,
+    이미 완료된 실행이면 저장된 결과를 그대로 반환합니다.
+    수집한 데이터가 WORKFLOW_CACHE_MINUTES보다 오래됐거나 실패한 실행은 이력을 지우고 새로 실행합니다.
+    
     Args:
         ticker: 종목 코드
         period: 분석 기간
         user_profile: 사용자 투자 성향
+        run_id: 실행 ID (None이면 make_run_id로 생성)
     
     Returns:
         분석 결과 상태
     """
-    workflow = create_investment_workflow()
+    workflow = _get_workflow()
+    thread_id = run_id or make_run_id(ticker, period, user_profile)
+    run_config = {"configurable": {"thread_id": thread_id}}
+    
+    snapshot = workflow.get_state(run_config)
+    if snapshot.values and _is_fresh(snapshot.values) and not snapshot.values.get("error"):
+        if snapshot.next:
+            # 중단된 실행 재개
+            return _invoke(workflow, None, run_config)
+        # 완료된 실행 결과 재사용
+        return snapshot.values
+    if snapshot.values:
+        # 만료되었거나 실패한 실행은 이력을 지우고 처음부터 실행
+        workflow.checkpointer.delete_thread(thread_id)
     
     initial_state = {
         "ticker": ticker,
@@ -302,8 +398,18 @@ def analyze_stock(ticker: str, period: str = "1mo", user_profile: str = "moderat
         "sentiment_data": {},
         "risk_assessment": {},
         "investment_advice": "",
-        "error": ""
+        "error": "",
+        "fetched_at": 0.0
     }
     
-    result = workflow.invoke(initial_state)
-    return result
+    return _invoke(workflow, initial_state, run_config)
+
+
+def _invoke(workflow, input_state, run_config) -> InvestmentState:
+    """워크플로우 실행 - 조언 생성만 실패하면 기본 조언으로 채워 반환 (체크포인트는 advice 이전 상태로 유지)"""
+    try:
+        return workflow.invoke(input_state, run_config)
+    except AdviceUnavailableError:
+        values = dict(workflow.get_state(run_config).values)
+        values["investment_advice"] = fallback_advice(values)
+        return values